@@ -6,6 +6,9 @@ import bpy
 from . import panel
 from . import operators
 from . import data
+from . import batch
+from . import benchmark
+from . import parallel
 import logging
 import pathlib
 
@@ -44,6 +47,7 @@ classes = (
     panel.ACA_PT_rafter,
     panel.ACA_PT_tiles,
     panel.ACA_PT_yardwall_props,
+    panel.ACA_PT_trace,
     
     # 操作逻辑类  
     operators.ACA_OT_LINK_ASSETS,
@@ -51,6 +55,7 @@ classes = (
     operators.ACA_OT_test,
     operators.ACA_OT_add_building,
     operators.ACA_OT_update_building,
+    operators.ACA_OT_build_full,
     operators.ACA_OT_del_building,
     operators.ACA_OT_reset_wall_layout,
     operators.ACA_OT_build_dougong,
@@ -75,6 +80,8 @@ classes = (
     operators.ACA_OT_PROFILE,
     operators.ACA_OT_EXPORT_FBX,
     operators.ACA_OT_EXPORT_GLB,
+    operators.ACA_OT_EXPORT_TRACE,
+    operators.ACA_OT_CLEAR_MESH_CACHE,
     operators.ACA_OT_JOIN,
     operators.ACA_UL_Template_Items,
     operators.ACA_OT_SELECT_TEMPLATE_DIALOG,
@@ -88,6 +95,14 @@ def register():
     # 注册自定义属性
     data.initprop()
 
+    # 打开文件、撤销/重做后，清空构件索引和根节点缓存
+    from . import utils
+    for handlers in (bpy.app.handlers.load_post,
+                     bpy.app.handlers.undo_post,
+                     bpy.app.handlers.redo_post):
+        if utils.clearAcaCache not in handlers:
+            handlers.append(utils.clearAcaCache)
+
     # 初始化日志记录器
     initLogger()
 
@@ -99,6 +114,21 @@ def register():
     return
     
 def unregister():
+    # 取消等待中的参数刷新、空闲营造计时器
+    from . import scheduler
+    from . import draft
+    scheduler.cancel()
+    draft.cancelFull()
+
+    # 移除缓存清理的回调
+    from . import utils
+    for handlers in (bpy.app.handlers.load_post,
+                     bpy.app.handlers.undo_post,
+                     bpy.app.handlers.redo_post):
+        if utils.clearAcaCache in handlers:
+            handlers.remove(utils.clearAcaCache)
+    utils.clearAcaCache()
+
     # 销毁类
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
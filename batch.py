@@ -0,0 +1,245 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   后台批量营造，不依赖界面操作
+#   用法：
+#   blender -b -P batch.py -- --templates 模板1 模板2 --out 输出目录
+#   blender -b -P batch.py -- --manifest manifest.json --out 输出目录
+#   manifest为json列表，每项格式如下：
+#   {"template":"模板名称","name":"导出名称(可选)","overrides":{"x_1":4.5}}
+#   任务中可以用"aca_type"指定模板类型，如组合模板的子模板
+import bpy
+import os
+import sys
+import json
+import time
+import argparse
+from functools import partial
+
+# 插件的模块名称，即插件目录名称
+ADDON_NAME = 'ACA Builder'
+
+# 解析命令行参数，仅处理'--'之后的部分
+def parseArgs(argv=None):
+    if argv == None:
+        argv = sys.argv
+        if '--' in argv:
+            argv = argv[argv.index('--')+1:]
+        else:
+            argv = []
+    parser = argparse.ArgumentParser(
+        prog='blender -b -P batch.py --',
+        description='ACA Builder批量营造')
+    parser.add_argument('--templates', nargs='*', default=[],
+        help='模板名称列表')
+    parser.add_argument('--manifest', default=None,
+        help='参数清单json文件')
+    parser.add_argument('--out', default=None,
+        help='输出目录，默认为当前目录')
+    parser.add_argument('--format', default='glb',
+        choices=('glb','fbx','blend','none'),
+        help='导出格式')
+    parser.add_argument('--report', default=None,
+        help='计时报告的json文件路径，默认为输出目录下的batch_report.json')
+    parser.add_argument('--addon', default=ADDON_NAME,
+        help='插件模块名称')
+    return parser.parse_args(argv)
+
+# 组装待营造的任务列表
+def getJobs(templates=(),manifest=None):
+    jobs = []
+    for templateName in templates:
+        jobs.append({
+            'template' : templateName,
+            'name' : templateName,
+            'overrides' : {},
+        })
+    if manifest != None:
+        with open(manifest,encoding='utf-8') as f:
+            items = json.load(f)
+        for item in items:
+            job = {
+                'template' : item['template'],
+                'name' : item.get('name',item['template']),
+                'overrides' : item.get('overrides',{}),
+            }
+            # 可选的模板类型，以及多进程营造时的摆放偏移
+            for key in ('aca_type','offset'):
+                if key in item:
+                    job[key] = item[key]
+            jobs.append(job)
+    return jobs
+
+# 查找场景中所有的建筑根节点
+def __getBuildingRoots():
+    from .const import ACA_Consts as con
+    roots = set()
+    for obj in bpy.data.objects:
+        if obj.ACA_data.aca_type in (
+                con.ACA_TYPE_BUILDING,
+                con.ACA_TYPE_YARDWALL):
+            roots.add(obj.name)
+    return roots
+
+# 营造单体建筑
+def __buildSingle(acaType,templateName,overrides):
+    from .const import ACA_Consts as con
+    from . import buildFloor
+    from . import buildYardWall
+    if acaType == con.ACA_TYPE_BUILDING:
+        buildFloor.buildFloor(None,templateName,
+                              overrides=overrides)
+    elif acaType == con.ACA_TYPE_YARDWALL:
+        buildYardWall.buildYardWall(None,templateName,
+                                    overrides=overrides)
+    else:
+        raise Exception("无法创建该类型的建筑：" + templateName)
+    return
+
+# 营造一个任务，组合建筑依次营造所有子模板
+def __buildJob(job):
+    from .const import ACA_Consts as con
+    from . import template
+    templateName = job['template']
+    # 250402 组合模板的子模板不在模板列表的根层次，需要指定类型
+    acaType = job.get('aca_type')
+    if acaType == None:
+        acaType = template.getBuildingType(templateName)
+    if acaType != con.ACA_TYPE_COMBO:
+        __buildSingle(acaType,templateName,job['overrides'])
+    else:
+        for child in template.getTemplateChild(templateName):
+            __buildSingle(child['acaType'],
+                          child['templateName'],
+                          job['overrides'])
+    return {'FINISHED'}
+
+# 选中建筑及其所有子对象，以便导出
+def __selectBuildings(buildingNames):
+    bpy.ops.object.select_all(action='DESELECT')
+    for name in buildingNames:
+        buildingObj = bpy.data.objects[name]
+        for obj in [buildingObj] + list(buildingObj.children_recursive):
+            try:
+                obj.select_set(True)
+            except RuntimeError:
+                # 不在当前view layer中的对象无法选中
+                continue
+    return
+
+# 导出营造结果
+def __export(buildingNames,filepath,format):
+    from . import utils
+    if format == 'none':
+        return None
+    if format == 'blend':
+        bpy.ops.wm.save_as_mainfile(filepath=filepath,copy=True)
+        return filepath
+    __selectBuildings(buildingNames)
+    if format == 'glb':
+        utils.exportGLB(filepath)
+    elif format == 'fbx':
+        utils.exportFBX(filepath)
+    return filepath
+
+# 清空场景中的建筑，避免批量营造时越来越慢
+def __clearBuildings(buildingNames):
+    from . import utils
+    for name in buildingNames:
+        buildingObj = bpy.data.objects.get(name)
+        if buildingObj == None: continue
+        coll = buildingObj.users_collection[0]
+        utils.deleteHierarchy(buildingObj,del_parent=True)
+        if len(coll.all_objects) == 0:
+            bpy.data.collections.remove(coll)
+    utils.delOrphan()
+    return
+
+# 批量营造
+# jobs：任务列表，见getJobs
+# 返回计时报告
+def runBatch(jobs,outDir=None,format='glb',clear=True):
+    from . import utils
+    from . import tracer
+    from . import data
+    if outDir == None:
+        outDir = os.getcwd()
+    os.makedirs(outDir,exist_ok=True)
+
+    # 关闭界面刷新和视角跟随
+    scnData:data.ACA_data_scene = bpy.context.scene.ACA_data
+    scnData['is_auto_redraw'] = False
+    scnData['is_auto_viewall'] = False
+    # 与build.build一致，禁用新建数据的翻译，避免UV名称异常
+    bpy.context.preferences.view.use_translate_new_dataname = False
+
+    report = {
+        'format' : format,
+        'jobs' : [],
+    }
+    batchStart = time.time()
+    for job in jobs:
+        utils.outputMsg("批量营造：" + job['name'])
+        before = __getBuildingRoots()
+        jobStart = time.time()
+        result = utils.fastRun(partial(__buildJob,job))
+        buildTime = time.time() - jobStart
+        # 各阶段耗时取自本次营造的追踪记录
+        trace = tracer.getLastBuild()
+        stages = trace['children'] if trace != None else []
+        buildingNames = sorted(__getBuildingRoots() - before)
+
+        jobReport = {
+            'name' : job['name'],
+            'template' : job['template'],
+            'overrides' : job['overrides'],
+            'buildings' : buildingNames,
+            # 建筑所在的目录，便于从导出的blend文件中链接
+            'collections' : [
+                bpy.data.objects[name].users_collection[0].name
+                for name in buildingNames],
+            'build_seconds' : round(buildTime,4),
+            'stages' : stages,
+        }
+        if 'CANCELLED' in result:
+            jobReport['error'] = str(result['CANCELLED'])
+        else:
+            exportStart = time.time()
+            ext = 'blend' if format == 'blend' else format
+            filepath = os.path.join(outDir, job['name'] + '.' + ext)
+            jobReport['file'] = __export(buildingNames,filepath,format)
+            jobReport['export_seconds'] = round(
+                time.time() - exportStart,4)
+        report['jobs'].append(jobReport)
+
+        if clear:
+            __clearBuildings(buildingNames)
+
+    report['total_seconds'] = round(time.time() - batchStart,4)
+    return report
+
+# 命令行入口
+def main(argv=None):
+    args = parseArgs(argv)
+    jobs = getJobs(args.templates,args.manifest)
+    if len(jobs) == 0:
+        print("ACA batch: 没有待营造的模板，请使用--templates或--manifest")
+        return None
+    outDir = args.out if args.out != None else os.getcwd()
+    report = runBatch(jobs,outDir=outDir,format=args.format)
+
+    reportPath = args.report
+    if reportPath == None:
+        reportPath = os.path.join(outDir,'batch_report.json')
+    with open(reportPath,'w',encoding='utf-8') as f:
+        json.dump(report,f,ensure_ascii=False,indent=2)
+    print("ACA batch: 计时报告已保存到 " + reportPath)
+    return report
+
+# 以blender -b -P batch.py方式运行时，本文件不在插件包内
+# 需要先启用插件，再调用插件包中的batch模块
+if __name__ == '__main__':
+    import addon_utils
+    args = parseArgs()
+    addon_utils.enable(args.addon,default_set=True)
+    sys.modules[args.addon].batch.main()
@@ -0,0 +1,338 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   模板性能基准测试
+#   逐个营造template.xml中的所有模板（包括组合模板的子模板）
+#   每个模板在独立的后台blender进程中营造，记录各阶段耗时、峰值内存、对象数量、顶点数量
+#   与基准json比较，超出阈值时返回非0退出码
+#   用法（在blender外，以普通python运行）：
+#   python benchmark.py --blender blender路径 --update       生成/更新基准
+#   python benchmark.py --blender blender路径                与基准比较
+#   可选：--templates 模板1 模板2，仅测试指定模板
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+
+# 插件的模块名称，即插件目录名称
+ADDON_NAME = 'ACA Builder'
+# 组合模板的类型值，与con.ACA_TYPE_COMBO一致
+# 本文件在blender外运行，不导入插件模块
+ACA_TYPE_COMBO = 'combo'
+ACA_TYPE_BUILDING = 'building'
+
+# 各指标允许的增长比例
+THRESHOLDS = {
+    'seconds' : 0.2,
+    'peak_memory_mb' : 0.1,
+    'objects' : 0.0,
+    'verts' : 0.0,
+}
+# 耗时的噪声下限，增长量小于该值时不视为退化
+MIN_SECONDS = 0.05
+
+# 解析命令行参数，仅处理'--'之后的部分（在blender中运行时）
+def parseArgs(argv=None):
+    if argv == None:
+        argv = sys.argv[1:]
+        if '--' in sys.argv:
+            argv = sys.argv[sys.argv.index('--')+1:]
+    parser = argparse.ArgumentParser(
+        prog='python benchmark.py',
+        description='ACA Builder模板性能基准测试')
+    parser.add_argument('--blender', default='blender',
+        help='blender可执行文件路径')
+    parser.add_argument('--baseline', default=None,
+        help='基准json文件，默认为本文件所在目录下的benchmark_baseline.json')
+    parser.add_argument('--output', default=None,
+        help='本次测试结果的json文件路径，可选')
+    parser.add_argument('--update', action='store_true',
+        help='将本次测试结果写入基准')
+    parser.add_argument('--templates', nargs='*', default=[],
+        help='仅测试指定的模板，默认测试全部模板')
+    parser.add_argument('--threshold', type=float, default=None,
+        help='耗时允许的增长比例，默认' + str(THRESHOLDS['seconds']))
+    parser.add_argument('--timeout', type=float, default=600,
+        help='单个模板的超时时间(秒)')
+    parser.add_argument('--addon', default=ADDON_NAME,
+        help='插件模块名称')
+    # 以下参数由父进程传给blender子进程
+    parser.add_argument('--worker', action='store_true',
+        help=argparse.SUPPRESS)
+    parser.add_argument('--template', default=None,
+        help=argparse.SUPPRESS)
+    parser.add_argument('--type', default=ACA_TYPE_BUILDING,
+        help=argparse.SUPPRESS)
+    parser.add_argument('--result', default=None,
+        help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+# 从template.xml中列出所有待测试的模板
+# 组合模板不单独测试，而是逐个测试其子模板，名称为“组合模板/子模板”
+# 返回[{'key','template','aca_type'},...]
+def listTemplates(xmlPath=None):
+    if xmlPath == None:
+        xmlPath = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'template','template.xml')
+    root = ET.parse(xmlPath).getroot()
+    items = []
+    for template in root.findall('template'):
+        tname = template.find('template_name')
+        if tname == None: continue
+        tType = template.find('aca_type')
+        acaType = tType.text if tType != None else ACA_TYPE_BUILDING
+        if acaType != ACA_TYPE_COMBO:
+            items.append({
+                'key' : tname.text,
+                'template' : tname.text,
+                'aca_type' : acaType,
+            })
+            continue
+        for child in template.findall('template'):
+            cname = child.find('template_name')
+            if cname == None: continue
+            cType = child.find('aca_type')
+            items.append({
+                'key' : tname.text + '/' + cname.text,
+                'template' : cname.text,
+                'aca_type' : (cType.text if cType != None
+                              else ACA_TYPE_BUILDING),
+            })
+    return items
+
+# 获取当前进程的峰值内存(MB)
+def __getPeakMemory():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS为字节，Linux为KB
+        if sys.platform == 'darwin':
+            return round(peak/1024/1024,2)
+        return round(peak/1024,2)
+    except ImportError:
+        pass
+    # Windows
+    import ctypes
+    from ctypes import wintypes
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb',wintypes.DWORD),
+            ('PageFaultCount',wintypes.DWORD),
+            ('PeakWorkingSetSize',ctypes.c_size_t),
+            ('WorkingSetSize',ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage',ctypes.c_size_t),
+            ('QuotaPagedPoolUsage',ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage',ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage',ctypes.c_size_t),
+            ('PagefileUsage',ctypes.c_size_t),
+            ('PeakPagefileUsage',ctypes.c_size_t),
+        ]
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    ctypes.windll.psapi.GetProcessMemoryInfo(
+        ctypes.windll.kernel32.GetCurrentProcess(),
+        ctypes.byref(counters),counters.cb)
+    return round(counters.PeakWorkingSetSize/1024/1024,2)
+
+# 将营造记录的阶段树展开为{阶段路径:指标}
+# 同名的兄弟阶段（如组合建筑中的多个子建筑）累加
+def __flattenStages(spans,prefix=''):
+    stages = {}
+    for span in spans:
+        path = prefix + span['name']
+        stage = stages.setdefault(path,{
+            'seconds' : 0.0,
+            'objects' : 0,
+            'verts' : 0,
+        })
+        stage['seconds'] = round(stage['seconds'] + span['seconds'],4)
+        stage['objects'] += span['objects']
+        stage['verts'] += span['verts']
+        stages.update(__flattenStages(span['children'],path + '/'))
+    return stages
+
+# 在blender子进程中营造一个模板，并记录指标
+def runWorker(args):
+    import bpy
+    from . import batch
+    from . import tracer
+    job = {
+        'template' : args.template,
+        'name' : args.template,
+        'aca_type' : args.type,
+        'overrides' : {},
+    }
+    report = batch.runBatch([job],format='none',clear=False)
+    jobReport = report['jobs'][0]
+    trace = tracer.getLastBuild()
+    result = {
+        'template' : args.template,
+        'aca_type' : args.type,
+        'blender' : bpy.app.version_string,
+        'seconds' : jobReport['build_seconds'],
+        'peak_memory_mb' : __getPeakMemory(),
+        'objects' : len(bpy.data.objects),
+        'verts' : sum(len(mesh.vertices) for mesh in bpy.data.meshes),
+        'stages' : __flattenStages(
+            trace['children'] if trace != None else []),
+    }
+    if 'error' in jobReport:
+        result['error'] = jobReport['error']
+    with open(args.result,'w',encoding='utf-8') as f:
+        json.dump(result,f,ensure_ascii=False,indent=2)
+    return result
+
+# 启动后台blender，营造一个模板
+def __runTemplate(item,args):
+    fd,resultPath = tempfile.mkstemp(suffix='.json',prefix='aca_bench_')
+    os.close(fd)
+    cmd = [args.blender,'-b','-P',os.path.abspath(__file__),'--',
+           '--worker',
+           '--template',item['template'],
+           '--type',item['aca_type'],
+           '--result',resultPath,
+           '--addon',args.addon]
+    try:
+        proc = subprocess.run(cmd,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              timeout=args.timeout)
+        if os.path.getsize(resultPath) == 0:
+            tail = proc.stdout.decode('utf-8','replace')[-2000:]
+            return {'error' : 'blender未输出结果：\n' + tail}
+        with open(resultPath,encoding='utf-8') as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        return {'error' : '超时：' + str(args.timeout) + '秒'}
+    finally:
+        os.remove(resultPath)
+
+# 判断单个指标是否退化
+def __isRegressed(metric,base,current,thresholds):
+    if base == None or current == None:
+        return False
+    limit = base * (1 + thresholds[metric])
+    if metric == 'seconds':
+        return current > limit and current - base > MIN_SECONDS
+    return current > limit
+
+# 与基准比较，返回退化的描述列表
+def compare(baseline,results,thresholds=THRESHOLDS):
+    regressions = []
+    baseTemplates = baseline.get('templates',{})
+    for key,result in results.items():
+        if 'error' in result:
+            regressions.append(key + '：营造失败，' + result['error'])
+            continue
+        base = baseTemplates.get(key)
+        if base == None:
+            # 新增的模板，没有基准可比较
+            continue
+        for metric in ('seconds','peak_memory_mb','objects','verts'):
+            if __isRegressed(metric,base.get(metric),
+                             result.get(metric),thresholds):
+                regressions.append('%s：%s %s -> %s' % (
+                    key,metric,base[metric],result[metric]))
+        baseStages = base.get('stages',{})
+        for path,stage in result.get('stages',{}).items():
+            baseStage = baseStages.get(path)
+            if baseStage == None: continue
+            for metric in ('seconds','objects','verts'):
+                if __isRegressed(metric,baseStage.get(metric),
+                                 stage.get(metric),thresholds):
+                    regressions.append('%s：阶段%s %s %s -> %s' % (
+                        key,path,metric,
+                        baseStage[metric],stage[metric]))
+    return regressions
+
+# 运行基准测试
+# 返回进程退出码，0为通过，1为存在退化
+def main(argv=None):
+    args = parseArgs(argv)
+    baselinePath = args.baseline
+    if baselinePath == None:
+        baselinePath = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'benchmark_baseline.json')
+    thresholds = dict(THRESHOLDS)
+    if args.threshold != None:
+        thresholds['seconds'] = args.threshold
+
+    items = listTemplates()
+    if len(args.templates) > 0:
+        items = [item for item in items
+                 if item['key'] in args.templates
+                 or item['template'] in args.templates]
+    if len(items) == 0:
+        print("ACA benchmark: 没有待测试的模板")
+        return 1
+
+    results = {}
+    benchStart = time.time()
+    for item in items:
+        print("ACA benchmark: " + item['key'] + " ...",flush=True)
+        result = __runTemplate(item,args)
+        results[item['key']] = result
+        if 'error' in result:
+            print("  失败：" + result['error'])
+        else:
+            print("  %.2fs, %.0fMB, %d objects, %d verts" % (
+                result['seconds'],result['peak_memory_mb'],
+                result['objects'],result['verts']))
+    print("ACA benchmark: 总耗时%.1f秒" % (time.time() - benchStart))
+
+    current = {
+        'created' : time.strftime('%Y-%m-%d %H:%M:%S'),
+        'templates' : results,
+    }
+    if args.output != None:
+        with open(args.output,'w',encoding='utf-8') as f:
+            json.dump(current,f,ensure_ascii=False,indent=2)
+
+    if args.update:
+        # 仅更新本次测试的模板，保留其他模板的基准
+        baseline = {'templates':{}}
+        if os.path.exists(baselinePath):
+            with open(baselinePath,encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline['created'] = current['created']
+        baseline['templates'].update(
+            {key:result for key,result in results.items()
+             if 'error' not in result})
+        with open(baselinePath,'w',encoding='utf-8') as f:
+            json.dump(baseline,f,ensure_ascii=False,indent=2)
+        print("ACA benchmark: 基准已保存到 " + baselinePath)
+        failed = [key for key,result in results.items()
+                  if 'error' in result]
+        return 1 if len(failed) > 0 else 0
+
+    if not os.path.exists(baselinePath):
+        print("ACA benchmark: 基准文件不存在，请先使用--update生成："
+              + baselinePath)
+        return 1
+    with open(baselinePath,encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(baseline,results,thresholds)
+    if len(regressions) > 0:
+        print("ACA benchmark: 发现%d项性能退化" % len(regressions))
+        for line in regressions:
+            print("  " + line)
+        return 1
+    print("ACA benchmark: 通过")
+    return 0
+
+# 以python benchmark.py运行时，为父进程，调度各模板的blender子进程
+# 以blender -b -P benchmark.py -- --worker运行时，为子进程
+# 子进程需要先启用插件，再调用插件包中的benchmark模块
+if __name__ == '__main__':
+    args = parseArgs()
+    if args.worker:
+        import addon_utils
+        addon_utils.enable(args.addon,default_set=True)
+        sys.modules[args.addon].benchmark.runWorker(args)
+    else:
+        sys.exit(main())
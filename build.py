@@ -11,6 +11,8 @@ from . import template
 from . import buildFloor
 from . import buildYardWall
 from . import buildRoof
+from . import buildGraph
+from . import draft
 
 isFinished = True
 buildStatus = ''
@@ -125,8 +127,16 @@ def updateBuilding(buildingObj:bpy.types.Object,
 
     # 根据模板类型调用不同的入口
     if bData.aca_type == con.ACA_TYPE_BUILDING:
-        buildFloor.buildFloor(buildingObj,
+        if reloadAssets:
+            buildFloor.buildFloor(buildingObj,
                     reloadAssets=reloadAssets)
+        else:
+            # 250402 仅重建参数有变化的阶段
+            # 开启草图模式时，先以草图营造，空闲后补做完整营造
+            quality = None
+            if bpy.context.scene.ACA_data.use_draft:
+                quality = draft.QUALITY_DRAFT
+            buildGraph.rebuild(buildingObj,quality=quality)
     elif bData.aca_type == con.ACA_TYPE_YARDWALL:
         buildYardWall.buildYardWall(buildingObj,
                     reloadAssets=reloadAssets)
@@ -139,12 +149,37 @@ def updateBuilding(buildingObj:bpy.types.Object,
 
     return {'FINISHED'}
 
+# 补做完整营造，仅重建以草图营造的阶段
+def buildFull(buildingObj:bpy.types.Object):
+    # 创建或锁定根目录（ACA筑韵古建）
+    rootColl = utils.setCollection(con.ROOT_COLL_NAME,
+                        isRoot=True,colorTag=2)
+
+    # 调用进度条
+    global isFinished,progress
+    isFinished = False
+    progress = 0
+    # 暂时排除目录下的其他建筑，以加快执行速度
+    __excludeOther(rootColl,True,buildingObj)
+
+    draft.buildFull(buildingObj)
+
+    isFinished = True
+    # 取消排除目录下的其他建筑
+    __excludeOther(rootColl,False,buildingObj)
+    return {'FINISHED'}
+
 # 删除建筑
 def delBuilding(buildingObj:bpy.types.Object):
     # 找到对应的目录
     buildingColl = buildingObj.users_collection[0]
     # 从“ACA筑韵古建”目录查找
     rootcoll = bpy.context.scene.collection.children[con.ROOT_COLL_NAME]
+    # 删除目录中的对象，同时登记其数据，以便定向清理
+    for obj in list(buildingColl.all_objects):
+        utils.delObject(obj)
+    for coll in list(buildingColl.children_recursive):
+        bpy.data.collections.remove(coll)
     # 删除该目录
     rootcoll.children.unlink(buildingColl)
     bpy.data.collections.remove(buildingColl)
@@ -186,6 +221,7 @@ def resetRoof(buildingObj:bpy.types.Object):
     __excludeOther(rootColl,True,buildingObj)
 
     buildRoof.buildRoof(buildingObj)
+    buildGraph.recordStages(buildingObj,buildGraph.ROOF_STAGES)
 
     isFinished = True
     # 取消排除目录下的其他建筑
@@ -12,6 +12,8 @@ from .data import ACA_data_obj as acaData
 from .data import ACA_data_template as tmpData
 from . import utils
 from . import buildFloor
+from . import kernel
+from . import meshCache
 from . import texture as mat
 
 # 设置“梁架”根节点
@@ -55,6 +57,7 @@ def __addBeamRoot(buildingObj:bpy.types.Object)->bpy.types.Object:
     )
     beamRootObj.ACA_data['aca_obj'] = True
     beamRootObj.ACA_data['aca_type'] = con.ACA_TYPE_BEAM_ROOT
+    utils.registerAcaChild(buildingObj,beamRootObj)
 
     return beamRootObj
 
@@ -68,164 +71,19 @@ def __addBeamRoot(buildingObj:bpy.types.Object)->bpy.types.Object:
 def getPurlinPos(buildingObj:bpy.types.Object):
     # 载入数据
     bData : acaData = buildingObj.ACA_data
-    dk = bData.DK
-    pd = con.PILLER_D_EAVE * dk
-    # 屋顶样式，1-庑殿，2-歇山，3-悬山，4-硬山
-    roofStyle = bData.roof_style
-    # 三组举折系数，可供选择
-    lift_ratio = []
-    if bData.juzhe == '0':
-        lift_ratio = con.LIFT_RATIO_DEFAULT
-    if bData.juzhe == '1':
-        lift_ratio = con.LIFT_RATIO_BIG
-    if bData.juzhe == '2':
-        lift_ratio = con.LIFT_RATIO_SMALL
-
-    # 开始构造槫子数据
-    purlin_pos = []
-
-    # 0、槫子布局起点
-    purlinWidth = bData.x_total/2
-    purlinDeepth = bData.y_total/2
-    # 屋顶起点root在挑檐枋下皮，所以初始即上移半桁
-    purlinHeight = con.HENG_TIAOYAN_D/2*dk
-    # 硬山桁檩：做到梁的外皮
-    if roofStyle in (
-            con.ROOF_YINGSHAN,
-            con.ROOF_YINGSHAN_JUANPENG):
-        purlinWidth += con.BEAM_DEPTH*pd/2
-    # 悬山（卷棚）：从山柱中加檐出（14斗口）
-    if roofStyle in (
-            con.ROOF_XUANSHAN,
-            con.ROOF_XUANSHAN_JUANPENG):
-        purlinWidth += con.YANCHUAN_EX*dk
-
-    # 1、构造挑檐桁
-    if (bData.use_dg                # 不使用斗栱的不用挑檐桁
-        and bData.dg_extend > 0     # 一斗三升这种无出跳的，不用挑檐桁
-        ):
-        # 为了不改动起始点，另用变量计算挑檐桁
-        purlinWidth_dg = purlinWidth
-        # 庑殿、歇山、盝顶，做两山斗栱出跳
-        if roofStyle in (
-                con.ROOF_WUDIAN,
-                con.ROOF_XIESHAN,
-                con.ROOF_XIESHAN_JUANPENG,
-                con.ROOF_LUDING):
-            purlinWidth_dg = purlinWidth + bData.dg_extend
-        # 插入挑檐桁等位点
-        purlin_pos.append(Vector((
-            purlinWidth_dg,
-            purlinDeepth+bData.dg_extend,
-            purlinHeight)))  
-        # 补偿正心桁的抬升挑檐桁举折
-        purlinHeight += bData.dg_extend*lift_ratio[0]
-
-    # 2、构造正心桁
-    purlin_pos.append(Vector((
-            purlinWidth,
-            purlinDeepth,
-            purlinHeight,
-        )))
-
-    # 3、构造下金桁、上金桁、脊桁
-    # 房屋总进深
-    roomDepth = bData.y_total
-    # 步架数量
-    rafterCount = bData.rafter_count
-    # 获取开间、进深数据
-    net_x,net_y = buildFloor.getFloorDate(buildingObj)
-    # 卷棚顶：顶层桁檩间距3椽径，要从进深中减去后，平分椽架
-    if roofStyle in (
-            con.ROOF_XUANSHAN_JUANPENG,
-            con.ROOF_YINGSHAN_JUANPENG,
-            con.ROOF_XIESHAN_JUANPENG,
-        ):
-        # 卷棚椽架排除“顶步架”，如果为奇数，自动扣除一步架
-        roomDepth -= con.JUANPENG_SPAN*dk
-        if rafterCount%2 != 0:
-            rafterCount -= 1
-            # 正常的奇变偶，不输出提示
-    else:
-        if rafterCount%2 != 0:
-            rafterCount -= 1
-            # 异常的奇变偶，给出提出
-            utils.outputMsg("请留意：一般屋顶椽架数量应该为偶数（卷棚为奇数），所以，椽架数量自动减少了一椽架")
-    for n in range(int(rafterCount/2)):
-        # 1、计算每层步架的进深----------------
-        # 20241123 根据尖山、卷棚、盝顶、是否做廊步架等计算每个步架长度
-        # 判断是否做廊步架(至少4步架才能做廊步架，否则忽略)
-        if bData.use_hallway and rafterCount>=4:
-            if n==0 :
-                # 廊步架宽度 = 柱网的廊间进深
-                rafterSpan = abs(net_y[1]-net_y[0])
-                rafterSpan0 = rafterSpan    # 檐步架宽度，后续使用
-                roomDepth -= rafterSpan*2 # 从通进深扣除前后的两个廊步架
-            else:
-                # 其他步架平分
-                rafterSpan = roomDepth/(rafterCount-2)
-        else:
-            # 不做廊步架，则所有步架平分
-            rafterSpan = roomDepth/rafterCount
-            rafterSpan0 = rafterSpan    # 檐步架宽度，后续使用
-        # 盝顶：直接采用用户设置的参数
-        if roofStyle == con.ROOF_LUDING:
-            rafterSpan = bData.luding_rafterspan
-            
-        # 2、计算每根槫子的长度，包括推山做法、收山做法的影响--------------
-        # 2.a、硬山、悬山（卷棚）不推
-        if roofStyle in (con.ROOF_YINGSHAN,
-                         con.ROOF_YINGSHAN_JUANPENG,
-                         con.ROOF_XUANSHAN,
-                         con.ROOF_XUANSHAN_JUANPENG):
-            pass
-        # 2.b、歇山，面阔方向，下金桁以上按收山法则
-        elif (roofStyle in (
-                    con.ROOF_XIESHAN,
-                    con.ROOF_XIESHAN_JUANPENG,)
-                and n>0):
-                # 收山系统的选择，推荐一桁径以上，一步架以下
-                # 当超出限制值时，自动设置为限制值
-                # 注意：这里必须按照檐步架计算
-                # 而且在廊间举架做法中，檐步架与其他步架宽度不同
-                shoushanLimit = (
-                    rafterSpan0                 # 檐步架
-                    - con.BOFENG_WIDTH*dk       # 博缝板
-                    - con.XYB_WIDTH*dk          # 山花板
-                    - con.BEAM_DEPTH*pd/2       # 梁架中线
-                    )
-                if bData.shoushan > shoushanLimit:
-                    bData['shoushan'] = shoushanLimit
-                # 推山从山面檐檩中，向内一檩径，作为山花板外皮（博缝板内皮）
-                purlinWidth = (bData.x_total/2
-                        - bData.shoushan         # 用户自定义推山尺寸
-                    )
-        # 2.c、庑殿，下金桁以上，应用推山做法
-        # 见马炳坚书p25，Xn= 0.9**n * X
-        elif (roofStyle == con.ROOF_WUDIAN
-            and n>0): 
-            purlinWidth -= bData.tuishan**n*rafterSpan
-        # 2.4、盝顶仅做到下金桁
-        elif roofStyle== con.ROOF_LUDING and n >0:
-            continue
-        else:
-            # 面阔、进深，每次推一个步架
-            purlinWidth -= rafterSpan
-
-        # 3. 计算每根槫子的举折
-        # 3.a、进深Y方向的举折
-        purlinDeepth -= rafterSpan
-        # 3.b、举折：举架高度 = 步架 * 举架系数
-        purlinHeight += rafterSpan*lift_ratio[n]
-
-        # 4、存入槫子参数集合
-        purlin_pos.append(Vector((
-            purlinWidth,
-            purlinDeepth,
-            purlinHeight)))
+    # 获取开间、进深数据，同时更新通面阔、通进深
+    net = buildFloor.getFloorDate(buildingObj)
+    # 250402 桁檩计算移至kernel，以便在blender外复用
+    result = kernel.getPurlinPos(kernel.getParams(bData),net)
+    # 歇山收山尺寸超出限制值时，回写修正后的值
+    if result['shoushan'] != bData.shoushan:
+        bData['shoushan'] = result['shoushan']
+    if result['rafter_adjusted']:
+        # 异常的奇变偶，给出提出
+        utils.outputMsg("请留意：一般屋顶椽架数量应该为偶数（卷棚为奇数），所以，椽架数量自动减少了一椽架")
 
     # 返回桁檩定位数据集
-    return purlin_pos
+    return [Vector(pos) for pos in result['purlin_pos']]
 
 # 营造桁檩
 # 包括檐面和山面
@@ -1381,6 +1239,13 @@ def __drawBeam(
     else:  
         board_h = con.BOARD_JINHENG_H
 
+    # 250402 相同尺寸的梁直接从缓存重建
+    cacheKey = meshCache.getKey('beam',dk,dimension,board_h)
+    beamObj = meshCache.load(cacheKey,name)
+    if beamObj != None:
+        beamObj.location = location
+        return beamObj
+
     # 几何中心的Z=梁头上皮，即可直接与桁檩取相同的Z坐标
     # 梁头与横梁中线齐平
     p1 = Vector((0,bLength/2,0))
@@ -1454,6 +1319,7 @@ def __drawBeam(
     beamObj = bpy.data.objects.new(name, mesh)
     bpy.context.collection.objects.link(beamObj) 
     beamObj.location = location
+    meshCache.save(cacheKey,beamObj)
 
     return beamObj
 
@@ -11,6 +11,7 @@ from .data import ACA_data_obj as acaData
 from .data import ACA_data_template as tmpData
 from . import texture as mat
 from . import utils
+from . import meshCache
 
 # 构建扇心
 # 包括在槛框中嵌入的横披窗扇心
@@ -51,6 +52,7 @@ def __buildShanxin(parent,scale:Vector,location:Vector):
     # apply scale
     utils.applyTransfrom(zibianObj,use_rotation=True,use_scale=True)
     # 转换为Curve
+    utils.trackObjectData(zibianObj)
     bpy.ops.object.convert(target='CURVE')
     # 旋转所有的点45度，形成四边形
     bpy.ops.object.editmode_toggle()
@@ -61,6 +63,7 @@ def __buildShanxin(parent,scale:Vector,location:Vector):
     zibianObj.data.bevel_mode = 'PROFILE'        
     zibianObj.data.bevel_depth = con.ZIBIAN_WIDTH/2  # 仔边宽度
     # 转为mesh
+    utils.trackObjectData(zibianObj)
     bpy.ops.object.convert(target='MESH')
     zibianObj = bpy.context.object
     # 仔边刷红漆
@@ -719,6 +722,24 @@ def __buildGeshan(name,wallproxy,scale,location,dir='L'):
     pd = con.PILLER_D_EAVE * dk
     # 隔扇导角大小
     geshan_bevel = con.BEVEL_LOW
+    # 隔扇子对象合并后的名称
+    if bData.use_KanWall:
+        newName = '隔扇窗'
+    else:
+        newName = '隔扇门'
+
+    # 250402 相同尺寸的隔扇直接从缓存重建
+    cacheKey = meshCache.getKey('geshan',
+        dk,scale,wData.gap_num,wData.use_KanWall,bData.use_KanWall,dir,
+        aData.lingxin_source,aData.mat_red,
+        aData.mat_paint_door,aData.mat_paint_doorring)
+    geshanObj = meshCache.load(cacheKey,newName,wallproxy)
+    if geshanObj != None:
+        windowsillZ = meshCache.getExtra(cacheKey,'windowsillZ')
+        geshanObj.location += location
+        geshanObj.lock_rotation = (True,True,False)
+        utils.addModifierBevel(geshanObj,geshan_bevel)
+        return geshanObj,windowsillZ
 
     # 1、隔扇根对象
     geshan_root = utils.addEmpty(
@@ -780,17 +801,15 @@ def __buildGeshan(name,wallproxy,scale,location,dir='L'):
         mat.setMat(partObj,partMat)
             
     # 隔扇子对象合并
-    if bData.use_KanWall:
-        newName = '隔扇窗'
-    else:
-        newName = '隔扇门'
     geshanObj = utils.joinObjects(
         geshan_root.children,
         newName=newName,
         baseObj=menzhouObj)
+    # 以隔扇根对象为参照保存，重建时再叠加隔扇位置
+    meshCache.save(cacheKey,geshanObj,windowsillZ=windowsillZ)
     geshanObj.parent = wallproxy
     geshanObj.location += geshan_root.location
-    bpy.data.objects.remove(geshan_root)
+    utils.delObject(geshan_root)
 
     # 锁定旋转，仅允许Z轴开窗、开门
     geshanObj.lock_rotation = (True,True,False)
@@ -4,7 +4,8 @@
 #   斗栱的营造
 import bpy
 import math
-from mathutils import Vector
+from mathutils import Vector,Matrix,Euler
+import itertools
 
 from .const import ACA_Consts as con
 from .data import ACA_data_obj as acaData
@@ -12,6 +13,7 @@ from .data import ACA_data_template as tmpData
 from . import utils
 from . import buildFloor
 from . import texture as mat
+from . import draft
 
 # 添加斗栱根节点
 def __addDougongRoot(buildingObj:bpy.types.Object):
@@ -32,6 +34,7 @@ def __addDougongRoot(buildingObj:bpy.types.Object):
             parent=roofRootObj)
         dgrootObj.ACA_data['aca_obj'] = True
         dgrootObj.ACA_data['aca_type'] = con.ACA_TYPE_DG_ROOT
+        utils.registerAcaChild(buildingObj,dgrootObj)
     else:
         # 清空根节点
         utils.deleteHierarchy(dgrootObj)
@@ -349,6 +352,38 @@ def __buildDGFangbyRoom(
             
     return
 
+# 250402 以链接复制的方式摆放斗栱，所有副本共用源对象的mesh
+# 镜像直接计算为负缩放的副本，不再为每攒斗栱添加Mirror修改器
+# matrix：相对parent的局部矩阵
+# mirror：镜像轴，同Mirror修改器的use_axis，镜像相对于parent
+# withOrigin：是否生成原位的副本，源对象本身已在原位时传入False
+def __addLinkedDG(sourceObj:bpy.types.Object,
+                  name,
+                  matrix:Matrix,
+                  parent:bpy.types.Object,
+                  mirror=(False,False,False),
+                  withOrigin=True):
+    # 各镜像轴的组合，如(False,True,False)生成原位和Y向镜像两个副本
+    axisOptions = [(1,-1) if use else (1,) for use in mirror]
+    objList = []
+    for sx,sy,sz in itertools.product(*axisOptions):
+        if (sx,sy,sz) == (1,1,1) and not withOrigin:
+            continue
+        dgCopy:bpy.types.Object = utils.copySimplyObject(
+            sourceObj = sourceObj,
+            name = name,
+            parentObj = parent,
+        )
+        dgCopy.matrix_basis = Matrix.Diagonal((sx,sy,sz,1)) @ matrix
+        objList.append(dgCopy)
+    return objList
+
+# 计算斗栱的摆放矩阵
+def __getDGMatrix(location,rotation,scale):
+    return (Matrix.Translation(location)
+            @ Euler(rotation,'XYZ').to_matrix().to_4x4()
+            @ Matrix.Diagonal(tuple(scale)+(1,)))
+
 # 放置柱头斗栱
 def __buildPillerDG(name = '柱头斗栱',
                     location = (0,0,0),
@@ -356,10 +391,38 @@ def __buildPillerDG(name = '柱头斗栱',
                     rotation = (0,0,0),
                     parent = None,
                     mirror = (False,False,False),
-                    tailExtend = 0
+                    tailExtend = 0,
+                    templates:dict = None,
                     ):
     # 数据准备
     aData:tmpData = bpy.context.scene.ACA_temp
+
+    # 250402 链接复制模式，相同桃尖梁长度的柱头斗栱共用一个mesh
+    if templates != None:
+        key = round(tailExtend,4)
+        if key not in templates:
+            # 首次生成，应用修改器后作为模板
+            templateObj = __buildPillerDG(
+                name=name,
+                location=location,
+                scale=scale,
+                rotation=rotation,
+                parent=parent,
+                tailExtend=tailExtend,
+            )
+            utils.applyAllModifer(templateObj)
+            templates[key] = templateObj
+            # 模板本身即为原位的斗栱，仅补充镜像副本
+            dgList = [templateObj] + __addLinkedDG(
+                templateObj,name,
+                templateObj.matrix_basis.copy(),
+                parent,mirror,withOrigin=False)
+        else:
+            dgList = __addLinkedDG(
+                templates[key],name,
+                __getDGMatrix(location,rotation,scale),
+                parent,mirror)
+        return dgList[0]
     
     # 复制对象
     dgPillerCopy:bpy.types.Object = utils.copySimplyObject(
@@ -384,11 +447,12 @@ def __buildPillerDG(name = '柱头斗栱',
     mat.UvUnwrap(dgPillerCopy,type=mat.uvType.CUBE)
     
     # 镜像
-    utils.addModifierMirror(
-        object=dgPillerCopy,
-        mirrorObj=parent,
-        use_axis=mirror
-    )
+    if any(mirror):
+        utils.addModifierMirror(
+            object=dgPillerCopy,
+            mirrorObj=parent,
+            use_axis=mirror
+        )
     return dgPillerCopy
 
 # 排布斗栱
@@ -435,10 +499,14 @@ def __buildDougong(dgrootObj:bpy.types.Object):
                 location = dgCornerArray[n],
                 parentObj = dgrootObj,
                 scale= bData.dg_scale,
-                singleUser=True
+                # 链接复制模式下，四角共用一个mesh
+                singleUser=not con.USE_DG_INSTANCE
             )
             dgCornerCopy.rotation_euler.z = math.radians(n * 90)
 
+    # 链接复制模式下，记录柱头斗栱的模板
+    pillerTemplates = {} if con.USE_DG_INSTANCE else None
+
     # 柱头斗栱
     if aData.dg_piller_source != None:
         # 前后坡的柱头斗栱
@@ -470,7 +538,8 @@ def __buildDougong(dgrootObj:bpy.types.Object):
                 rotation=(0,0,0),
                 parent=dgrootObj,
                 mirror=(False,True,False),
-                tailExtend=taojianLength
+                tailExtend=taojianLength,
+                templates=pillerTemplates,
             )
         
         # 两山的柱头斗栱，仅庑殿/歇山做两山的斗栱
@@ -490,7 +559,8 @@ def __buildDougong(dgrootObj:bpy.types.Object):
                     rotation=(0,0,math.radians(90)),
                     parent=dgrootObj,
                     mirror=(True,False,False),
-                    tailExtend=taojianLength
+                    tailExtend=taojianLength,
+                    templates=pillerTemplates,
                 )
     
     # 补间斗栱/平身科
@@ -530,11 +600,21 @@ def __buildDougong(dgrootObj:bpy.types.Object):
                     else:
                         dgFillSource = aData.dg_fillgap_alt_source
                 # 摆放斗栱
+                dgLoc = (net_x[n] + dougong_span * m,
+                         net_y[-1],dgZ)
+                if con.USE_DG_INSTANCE:
+                    __addLinkedDG(
+                        dgFillSource,"补间斗栱",
+                        __getDGMatrix(dgLoc,
+                            (0,0,math.radians(180)),
+                            bData.dg_scale),
+                        dgrootObj,
+                        mirror=(False,True,False))
+                    continue
                 dgFillCopy:bpy.types.Object = utils.copySimplyObject(
                     sourceObj = dgFillSource,
                     name = "补间斗栱",
-                    location=(net_x[n] + dougong_span * m,
-                                net_y[-1],dgZ),
+                    location=dgLoc,
                     scale= bData.dg_scale,            
                     parentObj = dgrootObj,
                     singleUser=True
@@ -573,11 +653,21 @@ def __buildDougong(dgrootObj:bpy.types.Object):
                     else:
                         dgFillSource = aData.dg_fillgap_source
 
+                    dgLoc = (net_x[0],
+                             net_y[n] + dougong_span * m,dgZ)
+                    if con.USE_DG_INSTANCE:
+                        __addLinkedDG(
+                            dgFillSource,"补间斗栱",
+                            __getDGMatrix(dgLoc,
+                                (0,0,math.radians(270)),
+                                bData.dg_scale),
+                            dgrootObj,
+                            mirror=(True,False,False))
+                        continue
                     dgFillCopy:bpy.types.Object = utils.copySimplyObject(
                         sourceObj = dgFillSource,
                         name = "补间斗栱",
-                        location=(net_x[0],
-                            net_y[n] + dougong_span * m,dgZ),
+                        location=dgLoc,
                         scale= bData.dg_scale,
                         parentObj = dgrootObj,
                         singleUser=True
@@ -591,6 +681,85 @@ def __buildDougong(dgrootObj:bpy.types.Object):
     
     return
 
+# 250402 草图营造的斗栱层
+# 每面以一个包围盒代替整排斗栱，尺寸取自补间斗栱（或柱头斗栱）资源的包围盒
+def __buildDraftDougong(dgrootObj:bpy.types.Object):
+    # 载入数据
+    buildingObj = utils.getAcaParent(
+        dgrootObj,con.ACA_TYPE_BUILDING)
+    bData : acaData = buildingObj.ACA_data
+    aData:tmpData = bpy.context.scene.ACA_temp
+    dk = bData.DK
+
+    # 初始化斗栱数据，避免跨建筑时公用的aData干扰
+    from . import template
+    template.updateDougongData(buildingObj)
+
+    sourceObj = aData.dg_fillgap_source
+    if sourceObj == None:
+        sourceObj = aData.dg_piller_source
+    if sourceObj == None:
+        return
+
+    # 获取开间、进深数据
+    net_x,net_y = buildFloor.getFloorDate(buildingObj)
+
+    # 斗栱高度，考虑平板枋的抬升
+    dgZ = 0
+    if bData.use_pingbanfang:
+        dgZ = con.PINGBANFANG_H * dk
+
+    # 资源的包围盒，按斗口缩放
+    scale = bData.dg_scale
+    corners = [Vector(corner) for corner in sourceObj.bound_box]
+    minX = min(c.x for c in corners) * scale[0]
+    maxX = max(c.x for c in corners) * scale[0]
+    minY = min(c.y for c in corners) * scale[1]
+    maxY = max(c.y for c in corners) * scale[1]
+    minZ = min(c.z for c in corners) * scale[2]
+    maxZ = max(c.z for c in corners) * scale[2]
+    # 斗栱以-Y向外出跳
+    outer = -minY
+    inner = maxY
+    depth = outer + inner
+    height = maxZ - minZ
+    blockZ = dgZ + (minZ + maxZ)/2
+
+    # 庑殿、歇山、盝顶四面做斗栱，前后檐延伸到转角
+    isAround = bData.roof_style in (
+                con.ROOF_WUDIAN,
+                con.ROOF_XIESHAN,
+                con.ROOF_XIESHAN_JUANPENG,
+                con.ROOF_LUDING,)
+    if isAround:
+        extend = outer
+    else:
+        extend = (maxX - minX)/2
+
+    blockList = []
+    # 前后檐
+    length = net_x[-1] - net_x[0] + extend*2
+    for y,side in ((net_y[0],-1),(net_y[-1],1)):
+        blockList.append(utils.addCube(
+            name='斗栱',
+            location=(0,y + side*(outer-inner)/2,blockZ),
+            dimension=(length,depth,height),
+            parent=dgrootObj,
+        ))
+    # 两山
+    if isAround:
+        length = max(net_y[-1] - net_y[0] - inner*2,0.01)
+        for x,side in ((net_x[0],-1),(net_x[-1],1)):
+            blockList.append(utils.addCube(
+                name='斗栱',
+                location=(x + side*(outer-inner)/2,0,blockZ),
+                dimension=(depth,length,height),
+                parent=dgrootObj,
+            ))
+    for blockObj in blockList:
+        mat.setMat(blockObj,aData.mat_wood)
+    return
+
 # 排布斗栱层
 def buildDougong(buildingObj:bpy.types.Object): 
     # 载入数据
@@ -610,6 +779,12 @@ def buildDougong(buildingObj:bpy.types.Object):
     if bData.use_pingbanfang:
         __buildPingbanFang(dgrootObj)
 
+    # 250402 草图营造，以包围盒代替斗栱和斗栱间的枋子
+    if draft.isDraft():
+        __buildDraftDougong(dgrootObj)
+        utils.focusObj(buildingObj)
+        return {'FINISHED'}
+
     # 2、布置斗栱/铺作======================================================
     # 排布斗栱
     __buildDougong(dgrootObj)
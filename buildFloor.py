@@ -3,7 +3,7 @@
 # 功能概述：
 #   柱子的营造
 import bpy
-from mathutils import Vector
+from mathutils import Vector,Matrix
 from functools import partial
 import math
 from typing import List
@@ -17,6 +17,9 @@ from . import template
 from . import buildWall
 from . import buildPlatform
 from . import buildRoof
+from . import tracer
+from . import kernel
+from . import draft
 
 # 添加建筑empty根节点，并绑定设计模板
 # 返回建筑empty根节点对象
@@ -42,96 +45,11 @@ def __addBuildingRoot(templateName):
 def getFloorDate(buildingObj:bpy.types.Object):
     # 载入设计参数
     bData:acaData = buildingObj.ACA_data
+    # 250402 柱网计算移至kernel，以便在blender外复用
+    net_x,net_y = kernel.getFloorNet(kernel.getParams(bData))
 
-    # 构造柱网X坐标序列
-    x_rooms = bData.x_rooms   # 面阔几间
-    y_rooms = bData.y_rooms   # 进深几间
-
-    net_x = []  # 重新计算    
-    # 排布规律：明间+多个次间+梢间
-    # 明间有且只有1间
-    offset = bData.x_1 / 2
-    net_x.append(offset)
-    net_x.insert(0, -offset)
-    # 次间可能有多间
-    if x_rooms > 5:
-        # -1明间-2梢间-2尽间
-        cijianNum = x_rooms - 5
-    elif x_rooms > 3:
-        # -1明间-2梢间
-        cijianNum = x_rooms - 3
-    else:
-        # -1明间
-        cijianNum = x_rooms - 1
-    for n in range(1,int(cijianNum/2)+1):
-        offset = (bData.x_1/2 + bData.x_2*n)
-        net_x.append(offset)
-        net_x.insert(0, -offset) 
-    # 梢间，5间以上配置一间
-    if x_rooms >= 5 :
-        offset += bData.x_3 
-        net_x.append(offset)
-        net_x.insert(0, -offset) 
-    # 尽间，7间以上配置一间
-    if x_rooms >= 7 :
-        offset += bData.x_4 
-        net_x.append(offset)
-        net_x.insert(0, -offset) 
-
-    # 构造柱网Y坐标序列
-    # 进深可以为奇数（山柱分两侧），也可以为偶数（山柱居中）
-    net_y=[]    # 重新计算
-    if y_rooms%2 == 1: # 奇数间
-        # 明间，有且只有1间
-        offset = bData.y_1 / 2
-        net_y.append(offset)
-        net_y.insert(0, -offset)
-        # 计算次间数量
-        if y_rooms > 3:
-            # 1间明间，2间梢间
-            cijianNum = y_rooms - 3
-        else:
-            # 仅1间明间，不做梢间
-            cijianNum = y_rooms -1
-        # 循环计算次间柱位
-        for n in range(1,int(cijianNum/2)+1):
-            offset = (bData.y_1/2 + bData.y_2*n)
-            net_y.append(offset)
-            net_y.insert(0, -offset) 
-        # 梢间
-        if y_rooms > 3:
-            offset += bData.y_3 
-            net_y.append(offset)
-            net_y.insert(0, -offset)
-    else:   #偶数间
-        # 偶数间进深，有默认的山柱，位置Y=0
-        net_y.append(0)
-        # 明间，分做2间
-        offset = bData.y_1
-        net_y.append(offset)
-        net_y.insert(0, -offset)
-        # 计算次间数量
-        if y_rooms > 4:
-            # 2间明间，2间梢间
-            cijianNum = y_rooms - 4
-        else:
-            # 仅2间明间，无梢间
-            cijianNum = y_rooms - 2
-        # 循环计算次间柱位
-        for n in range(1,int(cijianNum/2)+1):
-            offset = (bData.y_1 + bData.y_2*n)
-            net_y.append(offset)
-            net_y.insert(0, -offset) 
-        # 梢间
-        if y_rooms > 4:
-            offset += bData.y_3 
-            net_y.append(offset)
-            net_y.insert(0, -offset)
-    
-    # 保存通面阔计算结果，以便其他函数中复用
-    bData.x_total = net_x[-1]-net_x[0]
-    # 保存通进深计算结果，以便其他函数中复用
-    bData.y_total = net_y[-1]-net_y[0]
+    # 保存通面阔、通进深计算结果，以便其他函数中复用
+    bData.x_total,bData.y_total = kernel.getNetTotal(net_x,net_y)
 
     return net_x,net_y
 
@@ -908,6 +826,24 @@ def getPillerHeight(buildingObj,pillerID):
 
     return pillerHeight
 
+# 草图营造的方柱，原点在柱脚，与柱资源一致
+def __addDraftPiller(name,location,dimensions,parentObj):
+    pillerObj = utils.addCube(
+        name=name,
+        location=location,
+        dimension=dimensions,
+        parent=parentObj,
+    )
+    # 将原点移到柱脚
+    pillerObj.data.transform(
+        Matrix.Translation((0,0,dimensions[2]/2)))
+    pillerObj.ACA_data['aca_obj'] = True
+    pillerObj.ACA_data['aca_type'] = con.ACA_TYPE_PILLER
+    # 柱身刷红漆
+    aData:tmpData = bpy.context.scene.ACA_temp
+    mat.setMat(pillerObj,aData.mat_red)
+    return pillerObj
+
 # 根据柱网数组，排布柱子
 # 1. 第一次按照模板生成，柱网下没有柱，一切从0开始；
 # 2. 用户调整柱网的开间、进深，需要保持柱子的高、径、样式
@@ -944,6 +880,7 @@ def buildPillers(buildingObj:bpy.types.Object):
         )
         floorRootObj.ACA_data['aca_obj'] = True
         floorRootObj.ACA_data['aca_type'] = con.ACA_TYPE_FLOOR_ROOT
+        utils.registerAcaChild(buildingObj,floorRootObj)
     else:
         # 清空地盘下所有的柱子、柱础
         utils.deleteHierarchy(floorRootObj)
@@ -974,6 +911,10 @@ def buildPillers(buildingObj:bpy.types.Object):
     x_rooms = bData.x_rooms   # 面阔几间
     y_rooms = bData.y_rooms   # 进深几间
     piller_source = aData.piller_source
+    # 250402 同一高度的柱子共用一个mesh
+    # 每种柱高仅做一次拉伸和柱头贴图，其他柱子链接该mesh
+    # {柱高:已完成贴图的柱子}
+    pillerTemplates = {}
     for y in range(y_rooms + 1):
         for x in range(x_rooms + 1):
             # 统一命名为“柱.x/y”，以免更换不同柱形时，减柱设置失效
@@ -986,27 +927,53 @@ def buildPillers(buildingObj:bpy.types.Object):
                         and piller_list_str != "" :
                     continue    # 结束本次循环
 
-            # 复制柱子，仅instance，包含modifier
-            pillerObj = utils.copyObject(
-                sourceObj = piller_source,
-                name = '柱子.'+pillerID,
-                location=(net_x[x],net_y[y],0),
-                dimensions=(pd,pd,ph),
-                parentObj = floorRootObj,
-                singleUser=True # 内外柱不等高，为避免打架，全部
-            )
-            pillerObj.ACA_data['aca_obj'] = True
-            pillerObj.ACA_data['aca_type'] = con.ACA_TYPE_PILLER
-            pillerObj.ACA_data['pillerID'] = pillerID
             # 250212 金柱的升高处理（包含廊间举架）
-            pillerObj.dimensions.z = getPillerHeight(
-                    buildingObj,pillerID)
-            # 应用拉伸
-            utils.applyTransfrom(pillerObj,use_scale=True)
-
-            # 柱头贴图，注意此方法会破坏原有柱对象，并返回新对象
-            newPillerObj = mat.setMat(pillerObj,aData.mat_paint_pillerhead,
-                       override=True)
+            pillerHeight = getPillerHeight(buildingObj,pillerID)
+            heightKey = round(pillerHeight,4)
+            if heightKey in pillerTemplates:
+                # 已有同高的柱子，链接其mesh
+                newPillerObj = utils.copySimplyObject(
+                    sourceObj = pillerTemplates[heightKey],
+                    name = '柱子.'+pillerID,
+                    location=(net_x[x],net_y[y],0),
+                    parentObj = floorRootObj,
+                )
+                newPillerObj.ACA_data['pillerID'] = pillerID
+            elif draft.isDraft():
+                # 250402 草图营造，以方柱代替
+                newPillerObj = __addDraftPiller(
+                    name = '柱子.'+pillerID,
+                    location=(net_x[x],net_y[y],0),
+                    dimensions=(pd,pd,pillerHeight),
+                    parentObj = floorRootObj,
+                )
+                newPillerObj.ACA_data['pillerID'] = pillerID
+                pillerTemplates[heightKey] = newPillerObj
+            else:
+                # 复制柱子，仅instance，包含modifier
+                pillerObj = utils.copyObject(
+                    sourceObj = piller_source,
+                    name = '柱子.'+pillerID,
+                    location=(net_x[x],net_y[y],0),
+                    dimensions=(pd,pd,ph),
+                    parentObj = floorRootObj,
+                    singleUser=True # 内外柱不等高，为避免打架，全部
+                )
+                pillerObj.ACA_data['aca_obj'] = True
+                pillerObj.ACA_data['aca_type'] = con.ACA_TYPE_PILLER
+                pillerObj.ACA_data['pillerID'] = pillerID
+                pillerObj.dimensions.z = pillerHeight
+                # 应用拉伸
+                utils.applyTransfrom(pillerObj,use_scale=True)
+
+                # 柱头贴图，注意此方法会破坏原有柱对象，并返回新对象
+                newPillerObj = mat.setMat(pillerObj,aData.mat_paint_pillerhead,
+                        override=True)
+                pillerTemplates[heightKey] = newPillerObj
+
+            # 草图营造不做柱础、柱顶石
+            if draft.isDraft():
+                continue
 
             # 复制柱础
             pillerbase_basemesh:bpy.types.Object = utils.copySimplyObject(
@@ -1029,7 +996,7 @@ def buildPillers(buildingObj:bpy.types.Object):
             )
 
     # 移除柱顶石模板    
-    bpy.data.objects.remove(pillerBottom_basemesh)
+    utils.delObject(pillerBottom_basemesh)
 
     # 重新生成柱网配置
     floorChildren:List[bpy.types.Object] = floorRootObj.children
@@ -1052,6 +1019,10 @@ def buildPillers(buildingObj:bpy.types.Object):
     # 250302 添加金柱间的金枋
     __buildJinFang(buildingObj)
 
+    # 记录柱网阶段的输入，以便后续增量更新
+    from . import buildGraph
+    buildGraph.recordStages(buildingObj,['pillers'])
+
     # 重新聚焦建筑根节点
     utils.focusObj(buildingObj)
     
@@ -1123,6 +1094,10 @@ def resizePiller(buildingObj:bpy.types.Object):
     funproxy = partial(buildWall.buildWallLayout,buildingObj=buildingObj)
     utils.fastRun(funproxy)
 
+    # 记录柱网、装修阶段的输入，以便后续增量更新
+    from . import buildGraph
+    buildGraph.recordStages(buildingObj,['pillers','walls'])
+
     # 重新聚焦建筑根节点
     utils.focusObj(buildingObj)
     utils.outputMsg("Piller resized")
@@ -1155,9 +1130,13 @@ def resetFloor(buildingObj:bpy.types.Object):
 
 # 执行营造整体过程
 # 输入buildingObj，自带设计参数集，且做为其他构件绑定的父节点
+# overrides：覆盖模板中的参数，用于批量营造
+# quality：营造质量，见draft模块，None时沿用当前的质量
 def buildFloor(buildingObj:bpy.types.Object,
                templateName = None,
-               reloadAssets = False):
+               reloadAssets = False,
+               overrides:dict = None,
+               quality = None):
     # 定位到collection，如果没有则新建
     utils.setCollection(con.ROOT_COLL_NAME,
                         isRoot=True,colorTag=2)
@@ -1176,6 +1155,9 @@ def buildFloor(buildingObj:bpy.types.Object,
         buildingObj = __addBuildingRoot(templateName)
         # 在buldingObj上绑定模板bData和资产库aData
         template.loadTemplate(buildingObj)
+        # 覆盖模板参数
+        if overrides:
+            template.applyOverrides(buildingObj,overrides)
     else:
         utils.outputMsg("更新建筑...")
         # 简单粗暴的全部删除
@@ -1187,23 +1169,33 @@ def buildFloor(buildingObj:bpy.types.Object,
     # 载入数据
     bData:acaData = buildingObj.ACA_data
 
-    # 生成柱网
-    if bData.is_showPillers:
-        utils.outputMsg("Building Pillers...")
-        buildPillers(buildingObj)
+    # 250402 草图营造时，柱子、斗栱、瓦作做简化处理，且不展UV
+    with draft.quality(quality):
+        # 生成柱网
+        if bData.is_showPillers:
+            utils.outputMsg("Building Pillers...")
+            with tracer.span('pillers'):
+                buildPillers(buildingObj)
     
-    # 生成台基
-    if bData.is_showPlatform:
-        utils.outputMsg("Building Platform...")
-        buildPlatform.buildPlatform(buildingObj)
+        # 生成台基
+        if bData.is_showPlatform:
+            utils.outputMsg("Building Platform...")
+            with tracer.span('platform'):
+                buildPlatform.buildPlatform(buildingObj)
     
-    # 生成墙体
-    if bData.is_showWalls:
-        utils.outputMsg("Building Wall...")
-        buildWall.buildWallLayout(buildingObj)
+        # 生成墙体
+        if bData.is_showWalls:
+            utils.outputMsg("Building Wall...")
+            with tracer.span('walls'):
+                buildWall.buildWallLayout(buildingObj)
     
-    # 生成屋顶
-    buildRoof.buildRoof(buildingObj)
+        # 生成屋顶
+        with tracer.span('roof'):
+            buildRoof.buildRoof(buildingObj)
+
+        # 记录各阶段的输入，以便后续增量更新
+        from . import buildGraph
+        buildGraph.recordStages(buildingObj)
 
     # 重新聚焦回根节点
     utils.focusObj(buildingObj)
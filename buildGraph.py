@@ -0,0 +1,306 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   营造阶段的依赖关系，用于增量式更新
+#   每个阶段记录其输入参数的哈希，参数修改后仅重建受影响的阶段
+#   柱网(含额枋) -> 装修
+#   屋顶层 -> 斗栱 -> 梁架 -> 椽望 -> 瓦作
+import bpy
+import hashlib
+
+from .const import ACA_Consts as con
+from .data import ACA_data_obj as acaData
+from . import utils
+from . import tracer
+from . import draft
+
+# bData属性分组，用于声明各阶段不关心的参数
+# 显示开关，各阶段仅关心自己的开关
+GROUP_SHOW = (
+    'is_showPlatform','is_showPillers','is_showWalls',
+    'is_showDougong','is_showBeam','is_showRafter','is_showTiles',
+)
+# 营造中自动计算的派生参数，或与几何无关的参数
+GROUP_DERIVED = (
+    'aca_obj','aca_type','template_name',
+    'x_total','y_total','dg_scale',
+    'tile_width_real','roof_qiao_point',
+)
+# 院墙参数
+GROUP_YARD = (
+    'is_4_sides','yard_width','yard_depth',
+    'yardwall_height','yardwall_depth','yardwall_angle',
+)
+# 台基专属参数
+GROUP_PLATFORM = ('platform_extend','step_net',)
+# 装修专属参数
+GROUP_WALL = (
+    'wall_net','wall_layout','wall_style','wall_depth','wall_span',
+    'door_num','gap_num','use_topwin','door_height','use_KanWall',
+)
+# 斗栱专属参数（斗栱的高度、出跳通过dg_height/dg_extend影响其他阶段）
+GROUP_DOUGONG = ('dg_style','dg_gap',)
+# 屋顶专属参数
+GROUP_ROOF = (
+    'rafter_count','use_flyrafter','use_wangban','qiqiao','chong',
+    'use_pie','shengqi','liangtou','tuishan','shoushan',
+    'luding_rafterspan',
+)
+# 瓦作专属参数
+GROUP_TILE = (
+    'tile_color','tile_alt_color','tile_width','tile_length',
+    'paoshou_count',
+)
+
+# 营造阶段定义，按营造顺序排列
+# name：阶段名称
+# root：阶段根节点的aca_type，重建时整体删除
+# show：阶段的显示开关，None表示无开关
+# inputs：阶段使用的bData属性，None表示除ignore以外的所有属性
+# ignore：阶段不关心的bData属性
+# depends：上游阶段，上游重建后本阶段也需要重建
+STAGES = (
+    {
+        'name' : 'pillers',
+        'root' : con.ACA_TYPE_FLOOR_ROOT,
+        'show' : 'is_showPillers',
+        'inputs' : None,
+        'ignore' : (GROUP_PLATFORM + GROUP_WALL + GROUP_DOUGONG
+                    + GROUP_ROOF + GROUP_TILE),
+        'depends' : (),
+    },
+    {
+        'name' : 'platform',
+        'root' : con.ACA_TYPE_BASE_ROOT,
+        'show' : 'is_showPlatform',
+        'inputs' : (
+            'DK','platform_height','platform_extend','step_net',
+            'x_rooms','x_1','x_2','x_3','x_4',
+            'y_rooms','y_1','y_2','y_3',
+            'piller_height','piller_diameter',
+            'use_dg','use_pingbanfang','dg_height',
+        ),
+        'ignore' : (),
+        'depends' : (),
+    },
+    {
+        'name' : 'walls',
+        'root' : con.ACA_TYPE_WALL_ROOT,
+        'show' : 'is_showWalls',
+        'inputs' : None,
+        'ignore' : (GROUP_PLATFORM + GROUP_DOUGONG
+                    + GROUP_ROOF + GROUP_TILE),
+        'depends' : ('pillers',),
+    },
+    {
+        # 屋顶根节点，定位在柱头高度
+        'name' : 'roof',
+        'root' : con.ACA_TYPE_ROOF_ROOT,
+        'show' : None,
+        'inputs' : ('platform_height','piller_height',),
+        'ignore' : (),
+        'depends' : (),
+    },
+    {
+        'name' : 'dougong',
+        'root' : con.ACA_TYPE_DG_ROOT,
+        'show' : 'is_showDougong',
+        'inputs' : None,
+        'ignore' : (GROUP_PLATFORM + GROUP_WALL
+                    + GROUP_ROOF + GROUP_TILE),
+        'depends' : ('roof',),
+    },
+    {
+        'name' : 'beam',
+        'root' : con.ACA_TYPE_BEAM_ROOT,
+        'show' : 'is_showBeam',
+        'inputs' : None,
+        'ignore' : (GROUP_PLATFORM + GROUP_WALL + GROUP_TILE
+                    + ('use_flyrafter','use_wangban','qiqiao',
+                       'chong','use_pie','shengqi','liangtou',)),
+        'depends' : ('dougong',),
+    },
+    {
+        'name' : 'rafter',
+        'root' : con.ACA_TYPE_RAFTER_ROOT,
+        'show' : 'is_showRafter',
+        'inputs' : None,
+        'ignore' : (GROUP_PLATFORM + GROUP_WALL + GROUP_TILE),
+        'depends' : ('beam',),
+    },
+    {
+        'name' : 'tile',
+        'root' : con.ACA_TYPE_TILE_ROOT,
+        'show' : 'is_showTiles',
+        'inputs' : None,
+        'ignore' : (GROUP_PLATFORM + GROUP_WALL),
+        'depends' : ('rafter',),
+    },
+)
+ROOF_STAGES = ('roof','dougong','beam','rafter','tile')
+
+# 各阶段哈希在建筑根节点上的存储键
+STAGE_HASH_KEY = 'aca_stage_hash'
+
+# 将属性值转换为可哈希的形式
+def __normalizeValue(value):
+    # PointerProperty，取对象名称
+    if isinstance(value,bpy.types.ID):
+        return value.name
+    if isinstance(value,float):
+        return round(value,6)
+    if isinstance(value,(str,int,bool)) or value == None:
+        return value
+    # 数组类属性，如FloatVectorProperty
+    try:
+        return tuple(__normalizeValue(v) for v in value)
+    except TypeError:
+        return str(value)
+
+# 计算阶段的输入哈希
+def __getStageHash(bData:acaData,stage):
+    keys = stage['inputs']
+    if keys == None:
+        ignore = set(stage['ignore']
+                     + GROUP_SHOW + GROUP_DERIVED + GROUP_YARD)
+        keys = [key for key in bData.__annotations__.keys()
+                if key not in ignore]
+    keys = list(keys)
+    if stage['show'] != None:
+        keys.append(stage['show'])
+    values = []
+    for key in sorted(keys):
+        values.append((key,__normalizeValue(getattr(bData,key,None))))
+    # 椽望层受瓦作开关影响，开启瓦作时强制生成椽望
+    if stage['name'] == 'rafter':
+        values.append(('is_showTiles',bData.is_showTiles))
+    return hashlib.md5(repr(values).encode('utf-8')).hexdigest()
+
+# 计算所有阶段的输入哈希
+def getStageHashes(buildingObj:bpy.types.Object):
+    bData:acaData = buildingObj.ACA_data
+    hashes = {}
+    for stage in STAGES:
+        hashes[stage['name']] = __getStageHash(bData,stage)
+    return hashes
+
+# 记录阶段的输入哈希，在阶段营造完成后调用
+# stages为None时记录所有阶段
+def recordStages(buildingObj:bpy.types.Object,
+                 stages=None,
+                 hashes=None):
+    if hashes == None:
+        hashes = getStageHashes(buildingObj)
+    if stages == None:
+        stages = [stage['name'] for stage in STAGES]
+    stored = dict(buildingObj.get(STAGE_HASH_KEY,{}))
+    for name in stages:
+        stored[name] = hashes[name]
+    buildingObj[STAGE_HASH_KEY] = stored
+    # 250402 登记草图营造的阶段，以便后续补做完整营造
+    draft.markStages(buildingObj,stages)
+    return
+
+# 清除阶段记录，下次更新时全部重建
+def clearStages(buildingObj:bpy.types.Object):
+    if STAGE_HASH_KEY in buildingObj:
+        del buildingObj[STAGE_HASH_KEY]
+    return
+
+# 清除指定阶段的记录，下次更新时这些阶段（及其下游）重建
+def invalidateStages(buildingObj:bpy.types.Object,stages):
+    stored = dict(buildingObj.get(STAGE_HASH_KEY,{}))
+    for name in stages:
+        stored.pop(name,None)
+    buildingObj[STAGE_HASH_KEY] = stored
+    return
+
+# 判断需要重建的阶段
+# 返回阶段名称列表，按营造顺序；返回None表示没有历史记录，需要全部重建
+def getDirtyStages(buildingObj:bpy.types.Object,
+                   hashes=None):
+    stored = buildingObj.get(STAGE_HASH_KEY)
+    if stored == None:
+        return None
+    if hashes == None:
+        hashes = getStageHashes(buildingObj)
+    bData:acaData = buildingObj.ACA_data
+
+    dirty = []
+    for stage in STAGES:
+        name = stage['name']
+        isDirty = stored.get(name) != hashes[name]
+        # 上游阶段重建，下游也需要重建
+        for depend in stage['depends']:
+            if depend in dirty:
+                isDirty = True
+        # 应该显示，但根节点丢失（如被用户删除），需要重建
+        if (not isDirty
+                and stage['show'] != None
+                and getattr(bData,stage['show'])
+                and utils.getAcaChild(buildingObj,stage['root']) == None):
+            isDirty = True
+        if isDirty:
+            dirty.append(name)
+    return dirty
+
+# 增量更新建筑
+# 仅重建输入参数有变化的阶段，其他阶段的对象保持不变
+# quality：营造质量，见draft模块，None时沿用当前的质量
+# 返回实际重建的阶段列表
+def rebuild(buildingObj:bpy.types.Object,
+            quality=None):
+    with draft.quality(quality):
+        return __rebuild(buildingObj)
+
+# 增量更新的实现，营造质量由rebuild设置
+def __rebuild(buildingObj:bpy.types.Object):
+    from . import buildFloor
+    from . import buildPlatform
+    from . import buildWall
+    from . import buildRoof
+
+    bData:acaData = buildingObj.ACA_data
+    hashes = getStageHashes(buildingObj)
+    dirty = getDirtyStages(buildingObj,hashes)
+    # 没有历史记录，全部重建
+    if dirty == None:
+        buildFloor.buildFloor(buildingObj)
+        return [stage['name'] for stage in STAGES]
+    if len(dirty) == 0:
+        utils.outputMsg("参数未变化，无需更新")
+        return dirty
+    utils.outputMsg("增量更新：" + ','.join(dirty))
+
+    # 1、删除需要重建的阶段，包括根节点，以便根节点按新参数重新定位
+    # 屋顶根节点需要重建时，其下的各层一起删除
+    for stage in STAGES:
+        if stage['name'] not in dirty: continue
+        rootObj = utils.getAcaChild(buildingObj,stage['root'])
+        if rootObj != None:
+            utils.deleteHierarchy(rootObj,del_parent=True)
+
+    # 2、按营造顺序重建
+    if 'pillers' in dirty and bData.is_showPillers:
+        utils.outputMsg("Building Pillers...")
+        with tracer.span('pillers'):
+            buildFloor.buildPillers(buildingObj)
+    if 'platform' in dirty and bData.is_showPlatform:
+        utils.outputMsg("Building Platform...")
+        with tracer.span('platform'):
+            buildPlatform.buildPlatform(buildingObj)
+    if 'walls' in dirty and bData.is_showWalls:
+        utils.outputMsg("Building Wall...")
+        with tracer.span('walls'):
+            buildWall.buildWallLayout(buildingObj)
+    roofStages = [name for name in dirty if name in ROOF_STAGES]
+    if len(roofStages) > 0:
+        with tracer.span('roof'):
+            buildRoof.buildRoof(buildingObj,stages=roofStages)
+
+    # 3、记录已重建阶段的输入
+    recordStages(buildingObj,dirty,hashes)
+
+    # 重新聚焦回根节点
+    utils.focusObj(buildingObj)
+    return dirty
@@ -13,6 +13,7 @@ from .const import ACA_Consts as con
 from .data import ACA_data_obj as acaData
 from .data import ACA_data_template as tmpData
 from . import texture as mat
+from . import meshCache
 
 # 营造台基的各个结构
 def __buildTaiming(baseRootObj:bpy.types.Object):
@@ -411,6 +412,18 @@ def __drawStep(
     # 左右两侧踏跺不做镜像，仅做左侧或右侧
     # 241115 垂带与柱对齐
     chuidaiX = -pWidth/2
+    # 获取踏跺的全局旋转
+    stepRot = stepProxy.matrix_world.to_euler().z
+
+    # 250402 相同尺寸的踏跺直接从缓存重建
+    cacheKey = meshCache.getKey('step',
+        pWidth,pDeepth,pHeight,stoneWidth,isOnlyLeft,round(stepRot,3),
+        aData.mat_brick_3,aData.mat_rock)
+    stepJoined = meshCache.load(cacheKey,'踏跺.'+stepID,stepProxy)
+    if stepJoined != None:
+        stepJoined.ACA_data['aca_type'] = con.ACA_TYPE_STEP
+        stepJoined.ACA_data['stepID'] = stepID
+        return __placeStep(stepJoined,stepProxy)
     
 
     # 营造踏跺结构=======================
@@ -472,8 +485,6 @@ def __drawStep(
     clear_outer = False
     clear_inner = False
     dir='Y'
-    # 获取踏跺的全局旋转
-    stepRot = stepProxy.matrix_world.to_euler().z
     # 南踏跺
     if stepRot == 0:
         clear_outer=True
@@ -559,13 +570,19 @@ def __drawStep(
     if isOnlyLeft:
         utils.setOrigin(stepJoined,
             Vector((-stoneWidth/2,0,0)))
+    meshCache.save(cacheKey,stepJoined)
+
+    return __placeStep(stepJoined,stepProxy)
 
+# 将踏跺从proxy下移到上一层，并移除proxy
+def __placeStep(stepJoined:bpy.types.Object,
+                stepProxy:bpy.types.Object):
     # 绑定到上一层
     stepJoined.parent = stepProxy.parent
     stepJoined.location = stepProxy.matrix_local @ stepJoined.location
     stepJoined.rotation_euler = stepProxy.rotation_euler
     # 移除proxy
-    bpy.data.objects.remove(stepProxy)
+    utils.delObject(stepProxy)
 
     return stepJoined
 
@@ -669,7 +686,7 @@ def __addPlatformExpand(
 
     # 删除已被合并的踏跺扩展对象
     for stepExpandObj in stepExpandList:
-        bpy.data.objects.remove(stepExpandObj)
+        utils.delObject(stepExpandObj)
     
     # 5、设置材质
     mat.setMat(baseExpandObj,pfeMat)
@@ -783,6 +800,7 @@ def buildPlatform(buildingObj:bpy.types.Object):
         )
         baseRootObj.ACA_data['aca_obj'] = True
         baseRootObj.ACA_data['aca_type'] = con.ACA_TYPE_BASE_ROOT
+        utils.registerAcaChild(buildingObj,baseRootObj)
     else:
         # 清空台基下属的台明、踏跺
         utils.deleteHierarchy(baseRootObj)
@@ -848,6 +866,10 @@ def resizePlatform(buildingObj:bpy.types.Object):
             # 以大梁抬升, 实际为檐桁垫板高度+半桁
             tile_base += con.BOARD_YANHENG_H*dk + con.HENG_COMMON_D*dk/2
         roofRoot.location.z = tile_base
+
+    # 记录台基阶段的输入，以便后续增量更新
+    from . import buildGraph
+    buildGraph.recordStages(buildingObj,['platform'])
     
     # 重新聚焦建筑根节点
     utils.focusObj(buildingObj)
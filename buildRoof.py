@@ -16,9 +16,14 @@ from . import buildDougong
 from . import buildBeam
 from . import buildRooftile
 from . import texture as mat
+from . import tracer
+from . import meshCache
+from . import draft
 
 # 添加屋顶根节点
-def __addRoofRoot(buildingObj:bpy.types.Object):
+# clear：是否清空已有的屋顶，增量更新时保留未变化的层
+def __addRoofRoot(buildingObj:bpy.types.Object,
+                  clear=True):
     # 设置目录
     buildingColl = buildingObj.users_collection[0]
     utils.focusCollection(buildingColl.name)
@@ -26,7 +31,8 @@ def __addRoofRoot(buildingObj:bpy.types.Object):
     # 设置根节点
     roofRootObj = utils.getAcaChild(buildingObj,con.ACA_TYPE_ROOF_ROOT) 
     if roofRootObj != None:
-        utils.deleteHierarchy(roofRootObj)
+        if clear:
+            utils.deleteHierarchy(roofRootObj)
     else:
         # 250108 以柱头为屋顶层的起始点
         # 台基高度 + 柱高
@@ -42,6 +48,7 @@ def __addRoofRoot(buildingObj:bpy.types.Object):
         )
         roofRootObj.ACA_data['aca_obj'] = True
         roofRootObj.ACA_data['aca_type'] = con.ACA_TYPE_ROOF_ROOT
+        utils.registerAcaChild(buildingObj,roofRootObj)
 
     return roofRootObj
 
@@ -67,6 +74,7 @@ def __addRafterRoot(buildingObj:bpy.types.Object)->bpy.types.Object:
         )
         rafterRootObj.ACA_data['aca_obj'] = True
         rafterRootObj.ACA_data['aca_type'] = con.ACA_TYPE_RAFTER_ROOT
+        utils.registerAcaChild(buildingObj,rafterRootObj)
         
     else:
         utils.deleteHierarchy(rafterRootObj)
@@ -217,35 +225,44 @@ def __buildRafter_FB(buildingObj:bpy.types.Object,purlin_pos):
         rafter_offset = Vector((con.YUANCHUAN_D*dk,0,0))
         rafter_end += rafter_offset
         rafter_start += rafter_offset
-        # 根据起始点创建椽子
-        fbRafterObj = utils.addCylinderBy2Points(
-            radius = con.YUANCHUAN_D/2*dk,
-            start_point = rafter_start,
-            end_point = rafter_end,
-            name="前后檐.%d-%s" % (n+1,rafterNames[n]),
-            root_obj = rafterRootObj
-        )
-        
-        # 2. 各层椽子都上移，与桁檩上皮相切
-        bpy.ops.transform.translate(
-            value = (0,0,(con.HENG_COMMON_D+con.YUANCHUAN_D)*dk/2),
-            orient_type = con.OFFSET_ORIENTATION
-        )  
-        
-        # 3. 仅檐椽延长，按檐总平出加斜计算
+        rafterName = "前后檐.%d-%s" % (n+1,rafterNames[n])
+        # 250402 相同参数的椽子直接从缓存重建，跳过以下1~3步
+        cacheKey = meshCache.getKey('rafter_fb',
+            dk,n==0,rafter_start,rafter_end,
+            bData.use_dg,bData.dg_extend,con.OFFSET_ORIENTATION)
+        fbRafterObj = meshCache.load(cacheKey,rafterName,rafterRootObj)
+        if fbRafterObj == None:
+            # 根据起始点创建椽子
+            fbRafterObj = utils.addCylinderBy2Points(
+                radius = con.YUANCHUAN_D/2*dk,
+                start_point = rafter_start,
+                end_point = rafter_end,
+                name=rafterName,
+                root_obj = rafterRootObj
+            )
+            
+            # 2. 各层椽子都上移，与桁檩上皮相切
+            bpy.ops.transform.translate(
+                value = (0,0,(con.HENG_COMMON_D+con.YUANCHUAN_D)*dk/2),
+                orient_type = con.OFFSET_ORIENTATION
+            )  
+            
+            # 3. 仅檐椽延长，按檐总平出加斜计算
+            if n == 0:
+                # 檐椽斜率（圆柱体默认转90度）
+                yan_rafter_angle = math.cos(fbRafterObj.rotation_euler.y)
+                # 斗栱平出+14斗口檐椽平出
+                yan_rafter_ex = con.YANCHUAN_EX * dk
+                if bData.use_dg : 
+                    yan_rafter_ex += bData.dg_extend
+
+                # 加斜计算
+                fbRafterObj.dimensions.x += yan_rafter_ex / yan_rafter_angle
+                utils.applyTransfrom(fbRafterObj,use_scale=True) # 便于后续做望板时获取真实长度
+            meshCache.save(cacheKey,fbRafterObj)
         if n == 0:
             fbRafterObj.ACA_data['aca_obj'] = True
             fbRafterObj.ACA_data['aca_type'] = con.ACA_TYPE_RAFTER_FB
-            # 檐椽斜率（圆柱体默认转90度）
-            yan_rafter_angle = math.cos(fbRafterObj.rotation_euler.y)
-            # 斗栱平出+14斗口檐椽平出
-            yan_rafter_ex = con.YANCHUAN_EX * dk
-            if bData.use_dg : 
-                yan_rafter_ex += bData.dg_extend
-
-            # 加斜计算
-            fbRafterObj.dimensions.x += yan_rafter_ex / yan_rafter_angle
-            utils.applyTransfrom(fbRafterObj,use_scale=True) # 便于后续做望板时获取真实长度
 
         # 4、歇山顶在山花处再加一层檐椽
         if (bData.roof_style in (con.ROOF_XIESHAN,
@@ -1426,7 +1443,7 @@ def __buildCornerRafterEave(buildingObj:bpy.types.Object,
     bevel_object.parent = rafterRootObj
     # 设置大小
     bevel_object.scale = (width,height,0)
-    utils.applyTransfrom(bevel_object,use_scale=True)
+    utils.applyTransfrom(bevel_object,use_scale=True,update=False)
     utils.updateScene()
     # 移动origin到下皮外沿
     bpy.ops.object.mode_set(mode = 'EDIT')
@@ -1434,6 +1451,7 @@ def __buildCornerRafterEave(buildingObj:bpy.types.Object,
     bpy.ops.transform.translate(value=(width/2,height/2,0))
     bpy.ops.object.mode_set(mode = 'OBJECT')    
     # 将Plane Mesh转换为Curve，才能绑定到curve上
+    utils.trackObjectData(bevel_object)
     bpy.ops.object.convert(target='CURVE')
     # 翻转curve，否则会导致连檐的face朝向不对
     bpy.ops.object.editmode_toggle()
@@ -1879,7 +1897,7 @@ def __buildCornerFlyrafterEave(buildingObj:bpy.types.Object,
     bevel_object.parent = rafterRootObj
     # 设置大小
     bevel_object.scale = (width,height,0)
-    utils.applyTransfrom(bevel_object,use_scale=True)
+    utils.applyTransfrom(bevel_object,use_scale=True,update=False)
     utils.updateScene()
     # 移动origin到下皮外沿
     bpy.ops.object.mode_set(mode = 'EDIT')
@@ -1887,6 +1905,7 @@ def __buildCornerFlyrafterEave(buildingObj:bpy.types.Object,
     bpy.ops.transform.translate(value=(width/2,height/2,0))
     bpy.ops.object.mode_set(mode = 'OBJECT')    
     # 将Plane Mesh转换为Curve，才能绑定到curve上
+    utils.trackObjectData(bevel_object)
     bpy.ops.object.convert(target='CURVE')
     # 翻转curve，否则会导致连檐的face朝向不对
     bpy.ops.object.editmode_toggle()
@@ -3816,9 +3835,23 @@ def __buildRafterFrame(buildingObj:bpy.types.Object):
     return
 
 # 营造整个房顶
-def buildRoof(buildingObj:bpy.types.Object):
+# 250402 stages：需要重建的层（dougong/beam/rafter/tile），
+# 由buildGraph判断，None时全部重建
+# quality：营造质量，见draft模块，None时沿用当前的质量
+def buildRoof(buildingObj:bpy.types.Object,
+              stages=None,
+              quality=None):
+    with draft.quality(quality):
+        return __buildRoof(buildingObj,stages)
+
+# 营造房顶的实现，营造质量由buildRoof设置
+def __buildRoof(buildingObj:bpy.types.Object,
+                stages=None):
     # 载入数据
     bData:acaData = buildingObj.ACA_data
+    isFull = (stages == None)
+    if isFull:
+        stages = ('dougong','beam','rafter','tile')
     # 添加“屋顶层”根节点
     # 斗栱层、梁架、椽望、瓦作都绑定在该节点下，便于统一重新生成
     # 这三层的结构紧密相连，无法解耦，只能一起生成，一起刷新
@@ -3826,7 +3859,7 @@ def buildRoof(buildingObj:bpy.types.Object):
         or bData.is_showBeam
         or bData.is_showRafter
         or bData.is_showTiles):
-        __addRoofRoot(buildingObj)
+        __addRoofRoot(buildingObj,clear=isFull)
 
     # 层间的依赖，自动处理
     # 斗栱层、梁架层、椽望层都已经分别解耦，可以独立生成
@@ -3835,24 +3868,28 @@ def buildRoof(buildingObj:bpy.types.Object):
         bData['is_showRafter'] = True
 
     # 生成斗栱层
-    if bData.is_showDougong:
+    if bData.is_showDougong and 'dougong' in stages:
         utils.outputMsg("Building Dougong...")
-        buildDougong.buildDougong(buildingObj)
+        with tracer.span('dougong'):
+            buildDougong.buildDougong(buildingObj)
 
     # 生成梁架
-    if bData.is_showBeam:
+    if bData.is_showBeam and 'beam' in stages:
         utils.outputMsg("Building Beams...")
-        buildBeam.buildBeamFrame(buildingObj)
+        with tracer.span('beam'):
+            buildBeam.buildBeamFrame(buildingObj)
     
     # 生成椽望
-    if bData.is_showRafter:
+    if bData.is_showRafter and 'rafter' in stages:
         utils.outputMsg("Building Rafters...")
-        __buildRafterFrame(buildingObj)
+        with tracer.span('rafter'):
+            __buildRafterFrame(buildingObj)
 
     # 生成瓦作层
-    if bData.is_showTiles:
+    if bData.is_showTiles and 'tile' in stages:
         utils.outputMsg("Building Tiles...")
-        buildRooftile.buildTile(buildingObj)
+        with tracer.span('tile'):
+            buildRooftile.buildTile(buildingObj)
     
     utils.focusObj(buildingObj)
     return {'FINISHED'}
\ No newline at end of file
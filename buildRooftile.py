@@ -14,6 +14,8 @@ from .const import ACA_Consts as con
 from .data import ACA_data_obj as acaData
 from .data import ACA_data_template as tmpData
 from . import texture as mat
+from . import tileCache
+from . import draft
 
 # 创建瓦作层根节点
 # 如果已存在根节点，则一概清空重建
@@ -37,6 +39,7 @@ def __setTileRoot(buildingObj:bpy.types.Object)->bpy.types.Object:
         )
         tileRootObj.ACA_data['aca_obj'] = True
         tileRootObj.ACA_data['aca_type'] = con.ACA_TYPE_TILE_ROOT
+        utils.registerAcaChild(buildingObj,tileRootObj)
     else:
         utils.deleteHierarchy(tileRootObj)
         utils.focusCollByObj(tileRootObj)
@@ -856,8 +859,9 @@ def __setTile(
             name,
             Matrix,
             offset,
-            parent
-):    
+            parent,
+            glaze=True,
+):
     TileCopy = utils.copySimplyObject(
         sourceObj=sourceObj,
         name=name,
@@ -869,8 +873,19 @@ def __setTile(
     TileCopy.location += offset
 
     # 250110 新增琉璃颜色切换
-    mat.setGlazeStyle(TileCopy)
-    return TileCopy   
+    if glaze:
+        mat.setGlazeStyle(TileCopy)
+    return TileCopy
+
+# 计算瓦片的放置矩阵
+# 与__setTile的定位方式一致，在面矩阵的基础上叠加旋转后的偏移
+def __getTileMatrix(M:Matrix,offset:Vector)->Matrix:
+    loc,rot,scale = M.decompose()
+    offset = offset.copy()
+    offset.rotate(rot)
+    tileMatrix = M.copy()
+    tileMatrix.translation = loc + offset
+    return tileMatrix
 
 # 在网格上平铺瓦片
 def __arrayTileGrid(buildingObj:bpy.types.Object,
@@ -885,32 +900,12 @@ def __arrayTileGrid(buildingObj:bpy.types.Object,
     )
 
     # 载入瓦片资源
-    flatTile:bpy.types.Object = utils.copyObject(
-        aData.flatTile_source,singleUser=True)
-    circularTile:bpy.types.Object = utils.copyObject(
-        aData.circularTile_source,singleUser=True)
-    eaveTile:bpy.types.Object = utils.copyObject(
-        aData.eaveTile_source,singleUser=True)
-    dripTile:bpy.types.Object = utils.copyObject(
-        aData.dripTile_source,singleUser=True)
-    # 根据斗口调整尺度
-    flatTile = utils.resizeObj(flatTile,
-        bData.DK / con.DEFAULT_DK)
-    circularTile = utils.resizeObj(circularTile,
-        bData.DK / con.DEFAULT_DK)
-    eaveTile = utils.resizeObj(eaveTile,
-        bData.DK / con.DEFAULT_DK)
-    dripTile = utils.resizeObj(dripTile,
-        bData.DK / con.DEFAULT_DK)
-    utils.applyTransfrom(flatTile,use_scale=True)
-    utils.applyTransfrom(circularTile,use_scale=True)
-    utils.applyTransfrom(eaveTile,use_scale=True)
-    utils.applyTransfrom(dripTile,use_scale=True)
-    # 应用所有的modifier，以免后续快速合并时丢失
-    utils.applyAllModifer(flatTile)
-    utils.applyAllModifer(circularTile)
-    utils.applyAllModifer(eaveTile)
-    utils.applyAllModifer(dripTile)
+    # 250402 从缓存中获取按斗口缩放、应用修改器、设置琉璃后的瓦片
+    # 各瓦面复用，不再逐次复制和处理
+    flatTile = tileCache.getTile(aData.flatTile_source,bData)
+    circularTile = tileCache.getTile(aData.circularTile_source,bData)
+    eaveTile = tileCache.getTile(aData.eaveTile_source,bData)
+    dripTile = tileCache.getTile(aData.dripTile_source,bData)
 
     # 瓦垄宽度
     tileWidth = bData.tile_width
@@ -946,6 +941,16 @@ def __arrayTileGrid(buildingObj:bpy.types.Object,
         # 瓦片走向取第二条边
         dir_index = 1
 
+    # 250402 瓦片以数据层面批量写入，不再逐个复制对象
+    # 琉璃颜色和UV已在缓存的瓦片上设置，每类瓦片仅展一次UV
+    # 合并时直接复制材质槽和UV数组
+    useInstance = con.USE_TILE_INSTANCE
+    # 各类瓦片的放置矩阵
+    flatMatrix = []
+    circularMatrix = []
+    dripMatrix = []
+    eaveMatrix = []
+
     # 在瓦面网格上依次排布瓦片
     bm = bmesh.new()   # create an empty BMesh
     bm.from_mesh(tileGrid.data)   # fill it in from a Mesh
@@ -1019,45 +1024,56 @@ def __arrayTileGrid(buildingObj:bpy.types.Object,
             # 不做最后一列板瓦，以免与排山勾滴重叠
             and f.index%GridCols != GridCols-1
             and f.index >= GridCols):
-            tileObj = __setTile(
-                sourceObj=flatTile,
-                name='板瓦',
-                Matrix=M,
-                offset=offset_aside.copy(),
-                parent=tileGrid,
-            )
-            tileList.append(tileObj)
+            if useInstance:
+                flatMatrix.append(__getTileMatrix(M,offset_aside))
+            else:
+                tileObj = __setTile(
+                    sourceObj=flatTile,
+                    name='板瓦',
+                    Matrix=M,
+                    offset=offset_aside.copy(),
+                    parent=tileGrid,
+                )
+                tileList.append(tileObj)
 
         # 排布筒瓦，奇数列排布
         if (f.index%GridCols) % 2 == 1 and f.index >= GridCols:
-            tileObj = __setTile(
-                sourceObj=circularTile,
-                name='筒瓦',
-                Matrix=M,
-                offset=offset_aside.copy(),
-                parent=tileGrid,
-            )
-            tileList.append(tileObj)
+            if useInstance:
+                circularMatrix.append(__getTileMatrix(M,offset_aside))
+            else:
+                tileObj = __setTile(
+                    sourceObj=circularTile,
+                    name='筒瓦',
+                    Matrix=M,
+                    offset=offset_aside.copy(),
+                    parent=tileGrid,
+                )
+                tileList.append(tileObj)
 
         # 排布檐口瓦
         if f.index < GridCols:# 第一行
             # 排布滴水
             if f.index % 2 == 0:
-                tileObj = __setTile(
-                    sourceObj=dripTile,
-                    name='滴水',
-                    Matrix=M,
-                    offset=offset_head.copy(),
-                    parent=tileGrid,
-                )
                 # 硬山、悬山（卷棚）最后一个滴水做斜切
-                if bData.roof_style in (
+                isBisect = (bData.roof_style in (
                             con.ROOF_YINGSHAN,
                             con.ROOF_YINGSHAN_JUANPENG,
                             con.ROOF_XUANSHAN,
                             con.ROOF_XUANSHAN_JUANPENG
-                        ):
-                    if f.index%GridCols == GridCols-1:
+                        ) and f.index%GridCols == GridCols-1)
+                if useInstance and not isBisect:
+                    dripMatrix.append(__getTileMatrix(M,offset_head))
+                else:
+                    # 需要斜切的滴水仍单独生成对象，最后合并
+                    tileObj = __setTile(
+                        sourceObj=dripTile,
+                        name='滴水',
+                        Matrix=M,
+                        offset=offset_head.copy(),
+                        parent=tileGrid,
+                        glaze=not useInstance,
+                    )
+                    if isBisect:
                         utils.addBisect(
                             object=tileObj,
                             pStart=tileGrid.matrix_world @ Vector((0,0,0)),
@@ -1065,18 +1081,22 @@ def __arrayTileGrid(buildingObj:bpy.types.Object,
                             pCut=tileGrid.matrix_world @ f.calc_center_median(),
                             clear_inner=True
                         )
-                tileList.append(tileObj) 
+                    tileList.append(tileObj) 
 
             # 排布瓦当
             if f.index % 2 == 1:
-                tileObj = __setTile(
-                    sourceObj=eaveTile,
-                    name='瓦当',
-                    Matrix=M,
-                    offset=offset_head.copy(),
-                    parent=tileGrid,
-                )
-                tileList.append(tileObj)
+                if useInstance:
+                    eaveMatrix.append(__getTileMatrix(M,offset_head))
+                else:
+                    tileObj = __setTile(
+                        sourceObj=eaveTile,
+                        name='瓦当',
+                        Matrix=M,
+                        offset=offset_head.copy(),
+                        parent=tileGrid,
+                    )
+                    tileList.append(tileObj)
+    bm.free()
     
     # 合并所有的瓦片对象
     # 可以极大的提高重新生成时的效率（海量对象删除太慢了）
@@ -1084,8 +1104,27 @@ def __arrayTileGrid(buildingObj:bpy.types.Object,
         tileSetName = '前后檐'
     else:
         tileSetName = '两山'
-    tileSet = utils.joinObjects(
-        tileList,newName = '屋瓦.' + tileSetName)
+    if useInstance:
+        # 一次性写入所有瓦片的mesh
+        tileSet = utils.addInstanceMesh(
+            name='屋瓦.' + tileSetName,
+            instanceList=(
+                (flatTile,flatMatrix),
+                (circularTile,circularMatrix),
+                (dripTile,dripMatrix),
+                (eaveTile,eaveMatrix),
+            ),
+            parent=tileGrid,
+            uvCubeSize=200,
+        )
+        # 合并单独处理的瓦片（如斜切的滴水）
+        if len(tileList) > 0:
+            tileSet = utils.joinObjects(
+                [tileSet] + tileList,
+                newName = '屋瓦.' + tileSetName)
+    else:
+        tileSet = utils.joinObjects(
+            tileList,newName = '屋瓦.' + tileSetName)
     # 将屋瓦绑定到根节点
     utils.changeParent(tileSet,tileRootObj)
     # 庑殿、歇山做裁剪
@@ -1117,16 +1156,13 @@ def __arrayTileGrid(buildingObj:bpy.types.Object,
     tileSet.active_material_index = int(bData.tile_color)*2
     # 这里在modifier的平铺范围上做全局的UV平铺
     # 250209 使用cubeProject时有明显的横纹，改为smartProject
-    mat.setGlazeUV(tileSet,uvType=None)
+    # 250402 批量写入时UV已从源瓦片复制，并按瓦片位置做了偏移，不再重展
+    if not useInstance:
+        mat.setGlazeUV(tileSet,uvType=None)
 
     # 隐藏辅助对象
     utils.hideObj(tile_bool_obj)
 
-    bpy.data.objects.remove(flatTile)
-    bpy.data.objects.remove(circularTile)
-    bpy.data.objects.remove(eaveTile)
-    bpy.data.objects.remove(dripTile)
-
 # 计算正脊长度
 # 并且可以在硬山、悬山、歇山的垂脊、排山勾滴等复用
 def __getTopRidgeLength(buildingObj: bpy.types.Object,
@@ -2152,17 +2188,13 @@ def __buildSideTile(buildingObj: bpy.types.Object,
             + ridgeHeight))         # 取到博脊上皮
     if bData.roof_style in (con.ROOF_XIESHAN,
                             con.ROOF_XIESHAN_JUANPENG):
-        utils.addBisect(
-            object=eaveTileObj,
-            pCut=tileRootObj.matrix_world @ cutPoint,
+        # 250402 勾头、滴水使用同一裁切面，批量裁切
+        pCut = tileRootObj.matrix_world @ cutPoint
+        normal = utils.getBisectNormal(direction='V')
+        utils.addBisectBatch(
+            [(eaveTileObj,pCut,normal),
+             (dripTileObj,pCut,normal)],
             clear_outer=True,
-            direction='V'
-        )
-        utils.addBisect(
-            object=dripTileObj,
-            pCut=tileRootObj.matrix_world @ cutPoint,
-            clear_outer=True,
-            direction='V'
         )
 
     # 平滑处理
@@ -2577,12 +2609,17 @@ def buildTile(buildingObj: bpy.types.Object):
     # 250114 标记前后檐瓦面，后续在做垂脊定位时，可以精确判断瓦垄位置
     oData : acaData = tileGrid.ACA_data
     oData['aca_type'] = con.ACA_TYPE_TILE_GRID
-    # 在网格上铺瓦
-    __arrayTileGrid(
-        buildingObj,
-        rafter_pos,
-        tileGrid,
-        direction='X')
+    # 250402 草图营造，仅显示瓦面网格，不铺瓦、不做屋脊
+    isDraft = draft.isDraft()
+    if isDraft:
+        utils.showObj(tileGrid)
+    else:
+        # 在网格上铺瓦
+        __arrayTileGrid(
+            buildingObj,
+            rafter_pos,
+            tileGrid,
+            direction='X')
     
     # 仅庑殿、歇山做两山的瓦面
     if bData.roof_style in (
@@ -2596,16 +2633,20 @@ def buildTile(buildingObj: bpy.types.Object):
             buildingObj,
             rafter_pos,
             direction='Y')
-        # 在网格上铺瓦
-        __arrayTileGrid(
-            buildingObj,
-            rafter_pos,
-            tileGrid,
-            direction='Y')
+        if isDraft:
+            utils.showObj(tileGrid)
+        else:
+            # 在网格上铺瓦
+            __arrayTileGrid(
+                buildingObj,
+                rafter_pos,
+                tileGrid,
+                direction='Y')
         
     # 添加屋脊
-    utils.outputMsg("Building Ridge...")
-    __buildRidge(buildingObj,rafter_pos)
+    if not isDraft:
+        utils.outputMsg("Building Ridge...")
+        __buildRidge(buildingObj,rafter_pos)
 
     # 重新聚焦根节点
     utils.focusObj(buildingObj)
@@ -27,6 +27,7 @@ def __addWallrootNode(buildingObj:bpy.types.Object):
     )
     wallrootObj.ACA_data['aca_obj'] = True
     wallrootObj.ACA_data['aca_type'] = con.ACA_TYPE_WALL_ROOT
+    utils.registerAcaChild(buildingObj,wallrootObj)
     return wallrootObj
 
 # 计算墙体数据
@@ -408,6 +409,12 @@ def buildSingleWall(
 
         utils.outputMsg("Building " + wallObj.name)
 
+    # 个体修改时，记录装修阶段的输入，以便后续增量更新
+    # 全局修改由buildWallLayout统一记录，避免逐个墙体重复计算
+    if inputObjType == con.ACA_TYPE_WALL and bobj != None:
+        from . import buildGraph
+        buildGraph.recordStages(bobj,['walls'])
+
     utils.focusObj(wallObj)
 
     return wallObj
@@ -530,6 +537,10 @@ def buildWallLayout(buildingObj:bpy.types.Object):
     for wallID in wallList:
         if wallID == '': continue
         buildSingleWall(buildingObj,wallID)
+
+    # 记录装修阶段的输入，以便后续增量更新
+    from . import buildGraph
+    buildGraph.recordStages(buildingObj,['walls'])
     
     # 重新聚焦建筑根节点
     utils.focusObj(buildingObj)
@@ -13,6 +13,7 @@ from .data import ACA_data_template as tmpData
 from . import utils
 from . import template
 from . import texture as mat
+from . import tileCache
 
 # 添加建筑empty根节点，并绑定设计模板
 # 返回建筑empty根节点对象
@@ -56,18 +57,14 @@ def __arrayTile(
     rowHeight = aData.circularTile_source.dimensions.y * tileScale
 
     # 导入瓦片对象
-    tileObj = utils.copyObject(
+    # 250402 从缓存中获取按斗口缩放、应用修改器后的瓦片，各段墙体复用
+    tileObj = utils.copySimplyObject(
         name=name,
-        sourceObj=sourceObj,
+        sourceObj=tileCache.getTile(sourceObj,bData,glaze=False),
         location=location,
         rotation=rotation,
         parentObj=wallProxy,
         singleUser=True)
-    # 根据斗口调整尺度
-    utils.resizeObj(tileObj,tileScale)
-    utils.applyTransfrom(tileObj,use_scale=True)
-    # 应用所有的modifier，以免后续快速合并时丢失
-    utils.applyAllModifer(tileObj)
 
     # 横向平铺
     modArray:bpy.types.ArrayModifier = \
@@ -335,7 +332,8 @@ def buildSingleWall(
 
 def buildYardWall(buildingObj:bpy.types.Object,
                   templateName = None,
-                  reloadAssets = False):
+                  reloadAssets = False,
+                  overrides:dict = None):
     # 定位到根目录，如果没有则新建
     utils.setCollection(con.ROOT_COLL_NAME,
                         isRoot=True,colorTag=2)
@@ -354,6 +352,9 @@ def buildYardWall(buildingObj:bpy.types.Object,
         buildingObj = __addBuildingRoot(templateName)
         # 在buldingObj上绑定模板bData和资产库aData
         template.loadTemplate(buildingObj)
+        # 覆盖模板参数
+        if overrides:
+            template.applyOverrides(buildingObj,overrides)
     else:
         utils.outputMsg("更新建筑...")
         # 简单粗暴的全部删除
@@ -200,6 +200,15 @@ class ACA_Consts(object):
     CURVE_RESOLUTION = 500              # 曲线的精细度，在细分翼角椽坐标时提高精确度
     CORNER_RAFTER_START_SPREAD = 2      # 翼角椽尾散开的宽度，单位斗口
     BOOLEAN_TYPE = 'FAST'               # boolean.solver类型：FAST/EXACT
+    USE_TILE_INSTANCE = True            # 瓦片以数据层面批量写入mesh，False时回退为逐个复制对象再合并
+    MAT_DEDUP_BY_CONTENT = False        # 清理重复材质时，是否按内容识别（默认仅按名称后缀.001识别）
+    USE_DG_INSTANCE = True              # 斗栱以链接复制摆放，共用mesh，镜像直接生成负缩放副本；False时回退为逐个复制+镜像修改器
+    USE_MESH_CACHE = True               # 构件几何缓存，相同参数的椽、隔扇、梁、踏跺从blend文件旁的npz缓存重建
+    MESH_CACHE_MAX_MB = 200             # 构件几何缓存目录的容量上限(MB)，超出时删除最久未使用的文件
+    USE_UV_KERNEL = True                # 立方体、适配、柱状展UV在数据层面用numpy计算，不切换编辑模式；False时回退为bpy.ops.uv
+    DRAFT_IDLE_DELAY = 2.0              # 草图营造后，用户停止操作多久(秒)自动补做完整营造
+    UPDATE_DELAY = 0.3                  # 参数修改后延迟刷新的默认时间(秒)，停止修改后统一重建一次，可在插件设置中修改
+    PROGRESS_INTERVAL = 0.1             # 进度提示刷新界面的最小间隔(秒)，间隔内的消息仅更新状态文字
     DEFAULT_PILLER_HEIGHT = 0.8         # 默认柱高，取明间的0.8，马炳坚p4
     SANSHUI_WIDTH = 20                  # 散水宽度(DK)
     SANSHUI_HEIGHT = 0.02               # 散水高度(m)
@@ -6,7 +6,6 @@
 #   触发控件数据更新
 
 import bpy
-from functools import partial
 
 from .const import ACA_Consts as con
 from . import utils
@@ -49,10 +48,12 @@ def update_building(self, context:bpy.types.Context):
     buildingObj,bdata,odata = utils.getRoot(context.object)
     if buildingObj != None:
         from . import build
-        funproxy = partial(
-                build.updateBuilding,
-                buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        from . import scheduler
+        # 250402 延迟刷新，参数停止变化后统一增量营造
+        scheduler.requestUpdate(
+                buildingObj,
+                scheduler.ACTION_REBUILD,
+                build.updateBuilding)
     else:
         utils.outputMsg("updated building failed, context.object should be buildingObj")
     return
@@ -76,7 +77,18 @@ def update_yardwall(self, context:bpy.types.Context):
     if not isRebuild:
         return
     
-    bpy.ops.aca.build_yardwall()
+    # 确认选中为院墙根节点
+    buildingObj,bData,oData = utils.getRoot(context.object)
+    if buildingObj != None:
+        from . import buildYardWall
+        from . import scheduler
+        # 250402 延迟刷新，参数停止变化后统一重建
+        scheduler.requestUpdate(
+                buildingObj,
+                'yardwall',
+                buildYardWall.buildYardWall)
+    else:
+        utils.outputMsg("updated yardwall failed, context.object should be yardwallObj")
     return
 
 def update_platform(self, context:bpy.types.Context):
@@ -90,11 +102,13 @@ def update_platform(self, context:bpy.types.Context):
     if buildingObj != None:
         # 调用台基缩放
         from . import buildPlatform
+        from . import scheduler
         # buildPlatform.resizePlatform(buildingObj)
-        funproxy = partial(
-                buildPlatform.resizePlatform,
-                buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        # 250402 延迟刷新，参数停止变化后统一执行
+        scheduler.requestUpdate(
+                buildingObj,
+                'platform',
+                buildPlatform.resizePlatform)
     else:
         utils.outputMsg("updated platform failed, context should be buildingObj")
     return
@@ -111,11 +125,13 @@ def update_PillerStyle(self, context:bpy.types.Context):
     if buildingObj != None:
         # 调用营造序列
         from . import buildFloor
+        from . import scheduler
         # buildFloor.buildPillers(buildingObj)
-        funproxy = partial(
-                buildFloor.buildPillers,
-                buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        # 250402 延迟刷新，参数停止变化后统一执行
+        scheduler.requestUpdate(
+                buildingObj,
+                'pillers',
+                buildFloor.buildPillers)
     else:
         utils.outputMsg("updated building failed, context.object should be buildingObj")
     return
@@ -132,11 +148,13 @@ def update_piller(self, context:bpy.types.Context):
     if buildingObj != None:
         # 缩放柱形
         from . import buildFloor
+        from . import scheduler
         # buildFloor.resizePiller(buildingObj)
-        funproxy = partial(
-                buildFloor.resizePiller,
-                buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        # 250402 延迟刷新，参数停止变化后统一执行
+        scheduler.requestUpdate(
+                buildingObj,
+                'piller_size',
+                buildFloor.resizePiller)
     else:
         utils.outputMsg("updated piller failed, context should be pillerObj")
     return
@@ -209,15 +227,16 @@ def update_wall(self, context:bpy.types.Context):
     refObj = self.id_data
 
     from . import buildWall
+    from . import scheduler
+    # 250402 延迟刷新，参数停止变化后统一执行
     # 更新全局的墙体
     if self.aca_type == con.ACA_TYPE_BUILDING:
-        funproxy = partial(buildWall.buildWallLayout,
-                         buildingObj=refObj)
+        scheduler.requestUpdate(refObj,'wall',
+                                buildWall.buildWallLayout)
     # 更新个体的墙体
     elif self.aca_type == con.ACA_TYPE_WALL:
-        funproxy = partial(buildWall.buildSingleWall,
-                                buildingObj=refObj)
-    utils.fastRun(funproxy)
+        scheduler.requestUpdate(refObj,'wall',
+                                buildWall.buildSingleWall)
 
     return
 
@@ -237,10 +256,12 @@ def update_dougong(self, context:bpy.types.Context):
         
         # 241125 修改斗栱时，涉及到柱高的变化，最好是全屋更新
         from . import build
-        funproxy = partial(
-                build.updateBuilding,
-                buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        from . import scheduler
+        # 250402 延迟刷新，参数停止变化后统一增量营造
+        scheduler.requestUpdate(
+                buildingObj,
+                scheduler.ACTION_REBUILD,
+                build.updateBuilding)
     else:
         utils.outputMsg("updated dougong failed, context.object should be buildingObj")
     return
@@ -251,18 +272,19 @@ def update_roof(self, context:bpy.types.Context):
     if not isRebuild:
         return
     
-    # 手动将操作添加到撤销栈
-    bpy.ops.ed.undo_push(message="Float Property Update")
-    
     # 确认选中为building节点
     buildingObj,bData,oData = utils.getRoot(context.object)
     if buildingObj != None:
         from . import build
+        from . import scheduler
         # 重新生成屋顶
-        funproxy = partial(
-            build.resetRoof,
-            buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        # 250402 由buildGraph判断需要重建的层，斗栱、梁架不受影响时不再重建
+        # 延迟刷新，参数停止变化后统一营造，并仅添加一次撤销步骤
+        scheduler.requestUpdate(
+            buildingObj,
+            scheduler.ACTION_REBUILD,
+            build.updateBuilding,
+            undoMessage="Float Property Update")
     else:
         utils.outputMsg("updated platform failed, context.object should be buildingObj")
     return
@@ -294,12 +316,15 @@ def update_rooftile(self, context:bpy.types.Context):
     # 确认选中为building节点
     buildingObj,bData,oData = utils.getRoot(context.object)
     if buildingObj != None:
-        from . import buildRooftile
-        # 重新生成屋顶
-        funproxy = partial(
-            buildRooftile.buildTile,
-            buildingObj=buildingObj)
-        utils.fastRun(funproxy)
+        from . import build
+        from . import scheduler
+        # 重新生成瓦作
+        # 250402 由buildGraph判断，仅重建瓦作层
+        # 延迟刷新，参数停止变化后统一营造
+        scheduler.requestUpdate(
+            buildingObj,
+            scheduler.ACTION_REBUILD,
+            build.updateBuilding)
     else:
         utils.outputMsg("updated platform failed, context.object should be buildingObj")
     return
@@ -332,6 +357,7 @@ def hide_tiles(self, context:bpy.types.Context):
 # Python must keep a reference to the strings 
 # returned by the callback or Blender will 
 # misbehave or even crash.
+# 250402 列表由template按assetsIndex.xml缓存，面板重绘时不再重复解析XML
 dougongList = []
 def getDougongList(self, context):
     from . import template
@@ -905,6 +931,11 @@ class ACA_data_scene(bpy.types.PropertyGroup):
             name = "是否实时重建",
             description = "取消后，在大部分参数修改时，不会自动重建，直到手工点击更新建筑",
         ) # type: ignore
+    use_draft : bpy.props.BoolProperty(
+            default = False,
+            name = "草图模式",
+            description = "修改参数时，以方柱、斗栱包围盒、瓦面快速预览，停止操作后自动补做完整营造",
+        ) # type: ignore
     # template原来提供给模板下拉框使用，现在改为列表，则不再使用该属性
     # template : bpy.props.EnumProperty(
     #         name = "样式列表",
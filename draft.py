@@ -0,0 +1,125 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   草图营造，用于拖动参数时的快速预览
+#   草图下，柱子简化为方柱，斗栱简化为包围盒，瓦作仅生成瓦面网格，不展UV
+#   以草图营造的阶段记录在建筑根节点上，在用户停止操作一段时间后，
+#   或手工点击“完整营造”时，仅重建这些阶段
+#   用法：
+#   with draft.quality(draft.QUALITY_DRAFT):
+#       ...营造...
+#   if draft.isDraft(): ...简化的做法...
+import bpy
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from .const import ACA_Consts as con
+from . import utils
+
+# 营造质量
+QUALITY_FULL = 'full'
+QUALITY_DRAFT = 'draft'
+
+# 草图营造阶段在建筑根节点上的存储键
+DRAFT_STAGE_KEY = 'aca_draft_stages'
+
+# 当前的营造质量
+__current = QUALITY_FULL
+# 等待补做完整营造的建筑，{建筑名称:最后一次草图营造的时间}
+__pending = {}
+
+# 当前是否为草图营造
+def isDraft():
+    return __current == QUALITY_DRAFT
+
+# 在指定的质量下营造，可嵌套
+# level为None时沿用外层的质量
+@contextmanager
+def quality(level=None):
+    global __current
+    previous = __current
+    if level != None:
+        __current = level
+    try:
+        yield
+    finally:
+        __current = previous
+
+# 建筑是否有以草图营造、尚未完整营造的阶段
+def hasDraft(buildingObj:bpy.types.Object):
+    return len(buildingObj.get(DRAFT_STAGE_KEY,[])) > 0
+
+# 登记已营造的阶段，由buildGraph.recordStages调用
+# 草图营造时记录阶段，并在空闲时补做完整营造；完整营造时清除记录
+def markStages(buildingObj:bpy.types.Object,stages):
+    draftStages = list(buildingObj.get(DRAFT_STAGE_KEY,[]))
+    if isDraft():
+        for name in stages:
+            if name not in draftStages:
+                draftStages.append(name)
+        scheduleFull(buildingObj)
+    else:
+        draftStages = [name for name in draftStages
+                       if name not in stages]
+    if len(draftStages) > 0:
+        buildingObj[DRAFT_STAGE_KEY] = draftStages
+    elif DRAFT_STAGE_KEY in buildingObj:
+        del buildingObj[DRAFT_STAGE_KEY]
+    return
+
+# 补做完整营造，仅重建以草图营造的阶段
+# 返回实际重建的阶段列表
+def buildFull(buildingObj:bpy.types.Object):
+    from . import buildGraph
+    __pending.pop(buildingObj.name,None)
+    if not hasDraft(buildingObj):
+        return []
+    buildGraph.invalidateStages(buildingObj,
+                                buildingObj[DRAFT_STAGE_KEY])
+    with quality(QUALITY_FULL):
+        return buildGraph.rebuild(buildingObj)
+
+# 登记空闲后的完整营造
+# 每次草图营造都会重新计时，直到用户停止操作超过DRAFT_IDLE_DELAY
+def scheduleFull(buildingObj:bpy.types.Object):
+    # 后台运行时没有用户操作，不使用空闲营造
+    if bpy.app.background:
+        return
+    __pending[buildingObj.name] = time.time()
+    if not bpy.app.timers.is_registered(__onIdle):
+        bpy.app.timers.register(__onIdle,
+            first_interval=con.DRAFT_IDLE_DELAY)
+    return
+
+# 取消所有等待中的完整营造
+def cancelFull():
+    __pending.clear()
+    if bpy.app.timers.is_registered(__onIdle):
+        bpy.app.timers.unregister(__onIdle)
+    return
+
+# 空闲计时器的回调
+# 返回下次检查的间隔，返回None时注销计时器
+def __onIdle():
+    from . import build
+    from . import scheduler
+    # 正在营造中，或还有等待中的参数刷新，稍后再试
+    if not build.isFinished or scheduler.isPending():
+        return con.DRAFT_IDLE_DELAY
+    now = time.time()
+    for buildingName,lastTime in list(__pending.items()):
+        if now - lastTime < con.DRAFT_IDLE_DELAY:
+            continue
+        del __pending[buildingName]
+        buildingObj = bpy.data.objects.get(buildingName)
+        # 建筑可能已被删除或改名
+        if buildingObj == None or not hasDraft(buildingObj):
+            continue
+        utils.outputMsg("空闲，补做完整营造：" + buildingName)
+        utils.fastRun(partial(build.buildFull,buildingObj))
+    if len(__pending) == 0:
+        return None
+    # 按最早到期的建筑计算下次检查的间隔
+    nextTime = min(__pending.values()) + con.DRAFT_IDLE_DELAY
+    return max(0.1,nextTime - now)
@@ -0,0 +1,324 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   柱网、桁檩定位的计算内核
+#   仅做数值计算，不依赖bpy，可在blender外单独导入，用于参数遍历和性能测试
+#   输入为普通的参数字典（见PARAM_KEYS），不回写建筑对象
+#   用法：
+#   import kernel
+#   params = kernel.getParams(bData, x_1=4.5)
+#   net_x,net_y = kernel.getFloorNet(params)
+#   result = kernel.getPurlinPos(params)
+
+# 在插件中以相对路径导入，在blender外直接导入
+try:
+    from .const import ACA_Consts as con
+except ImportError:
+    from const import ACA_Consts as con
+
+# 计算所需的参数，与ACA_data_obj的属性同名
+PARAM_KEYS = (
+    'DK',
+    'x_rooms','x_1','x_2','x_3','x_4',
+    'y_rooms','y_1','y_2','y_3',
+    'roof_style','juzhe','rafter_count','use_hallway',
+    'use_dg','dg_extend',
+    'shoushan','tuishan','luding_rafterspan',
+)
+
+# 举折系数的选项
+LIFT_RATIOS = {
+    '0' : con.LIFT_RATIO_DEFAULT,
+    '1' : con.LIFT_RATIO_BIG,
+    '2' : con.LIFT_RATIO_SMALL,
+}
+
+# 组装参数字典
+# source：任意带有同名属性的对象（如bData），或字典，可以为None
+# overrides：覆盖的参数
+def getParams(source=None,**overrides):
+    params = {}
+    for key in PARAM_KEYS:
+        if source == None:
+            continue
+        if isinstance(source,dict):
+            if key in source:
+                params[key] = source[key]
+        elif hasattr(source,key):
+            params[key] = getattr(source,key)
+    params.update(overrides)
+    return params
+
+# 计算对称的柱网序列
+# center：中间的柱位，偶数间进深有居中的山柱
+# offsets：从中心向外，各柱位的偏移
+def __mirrorNet(offsets,center=False):
+    net = [-offset for offset in reversed(offsets)]
+    if center:
+        net.append(0)
+    net += offsets
+    return net
+
+# 计算柱网的X、Y坐标序列
+# 返回net_x,net_y
+def getFloorNet(params):
+    x_rooms = params['x_rooms']   # 面阔几间
+    y_rooms = params['y_rooms']   # 进深几间
+
+    # 构造柱网X坐标序列
+    # 排布规律：明间+多个次间+梢间
+    # 明间有且只有1间
+    offset = params['x_1'] / 2
+    offsets = [offset]
+    # 次间可能有多间
+    if x_rooms > 5:
+        # -1明间-2梢间-2尽间
+        cijianNum = x_rooms - 5
+    elif x_rooms > 3:
+        # -1明间-2梢间
+        cijianNum = x_rooms - 3
+    else:
+        # -1明间
+        cijianNum = x_rooms - 1
+    for n in range(1,int(cijianNum/2)+1):
+        offset = (params['x_1']/2 + params['x_2']*n)
+        offsets.append(offset)
+    # 梢间，5间以上配置一间
+    if x_rooms >= 5 :
+        offset += params['x_3']
+        offsets.append(offset)
+    # 尽间，7间以上配置一间
+    if x_rooms >= 7 :
+        offset += params['x_4']
+        offsets.append(offset)
+    net_x = __mirrorNet(offsets)
+
+    # 构造柱网Y坐标序列
+    # 进深可以为奇数（山柱分两侧），也可以为偶数（山柱居中）
+    if y_rooms%2 == 1: # 奇数间
+        # 明间，有且只有1间
+        offset = params['y_1'] / 2
+        # 计算次间数量
+        if y_rooms > 3:
+            # 1间明间，2间梢间
+            cijianNum = y_rooms - 3
+        else:
+            # 仅1间明间，不做梢间
+            cijianNum = y_rooms -1
+        start = params['y_1'] / 2
+        hasShao = y_rooms > 3
+        center = False
+    else:   #偶数间
+        # 偶数间进深，有默认的山柱，位置Y=0
+        # 明间，分做2间
+        offset = params['y_1']
+        # 计算次间数量
+        if y_rooms > 4:
+            # 2间明间，2间梢间
+            cijianNum = y_rooms - 4
+        else:
+            # 仅2间明间，无梢间
+            cijianNum = y_rooms - 2
+        start = params['y_1']
+        hasShao = y_rooms > 4
+        center = True
+    offsets = [offset]
+    # 循环计算次间柱位
+    for n in range(1,int(cijianNum/2)+1):
+        offset = (start + params['y_2']*n)
+        offsets.append(offset)
+    # 梢间
+    if hasShao:
+        offset += params['y_3']
+        offsets.append(offset)
+    net_y = __mirrorNet(offsets,center)
+
+    return net_x,net_y
+
+# 计算通面阔、通进深
+def getNetTotal(net_x,net_y):
+    return net_x[-1]-net_x[0],net_y[-1]-net_y[0]
+
+# 计算桁檩的定位点
+# net：柱网坐标(net_x,net_y)，为None时自动计算
+# 返回字典：
+# purlin_pos：各桁的(x,y,z)，从挑檐桁（或正心桁）到脊桁
+# shoushan：按限制值修正后的收山尺寸
+# rafter_count：实际采用的椽架数量
+# rafter_adjusted：椽架数量是否做了异常的奇变偶调整
+def getPurlinPos(params,net=None):
+    dk = params['DK']
+    pd = con.PILLER_D_EAVE * dk
+    # 屋顶样式，1-庑殿，2-歇山，3-悬山，4-硬山
+    roofStyle = params['roof_style']
+    # 三组举折系数，可供选择
+    lift_ratio = LIFT_RATIOS.get(params['juzhe'],[])
+    if net == None:
+        net = getFloorNet(params)
+    net_x,net_y = net
+    x_total,y_total = getNetTotal(net_x,net_y)
+    shoushan = params['shoushan']
+    dg_extend = params['dg_extend']
+
+    # 开始构造槫子数据
+    purlin_pos = []
+
+    # 0、槫子布局起点
+    purlinWidth = x_total/2
+    purlinDeepth = y_total/2
+    # 屋顶起点root在挑檐枋下皮，所以初始即上移半桁
+    purlinHeight = con.HENG_TIAOYAN_D/2*dk
+    # 硬山桁檩：做到梁的外皮
+    if roofStyle in (
+            con.ROOF_YINGSHAN,
+            con.ROOF_YINGSHAN_JUANPENG):
+        purlinWidth += con.BEAM_DEPTH*pd/2
+    # 悬山（卷棚）：从山柱中加檐出（14斗口）
+    if roofStyle in (
+            con.ROOF_XUANSHAN,
+            con.ROOF_XUANSHAN_JUANPENG):
+        purlinWidth += con.YANCHUAN_EX*dk
+
+    # 1、构造挑檐桁
+    if (params['use_dg']        # 不使用斗栱的不用挑檐桁
+        and dg_extend > 0       # 一斗三升这种无出跳的，不用挑檐桁
+        ):
+        # 为了不改动起始点，另用变量计算挑檐桁
+        purlinWidth_dg = purlinWidth
+        # 庑殿、歇山、盝顶，做两山斗栱出跳
+        if roofStyle in (
+                con.ROOF_WUDIAN,
+                con.ROOF_XIESHAN,
+                con.ROOF_XIESHAN_JUANPENG,
+                con.ROOF_LUDING):
+            purlinWidth_dg = purlinWidth + dg_extend
+        # 插入挑檐桁等位点
+        purlin_pos.append((
+            purlinWidth_dg,
+            purlinDeepth+dg_extend,
+            purlinHeight))
+        # 补偿正心桁的抬升挑檐桁举折
+        purlinHeight += dg_extend*lift_ratio[0]
+
+    # 2、构造正心桁
+    purlin_pos.append((
+            purlinWidth,
+            purlinDeepth,
+            purlinHeight,
+        ))
+
+    # 3、构造下金桁、上金桁、脊桁
+    # 房屋总进深
+    roomDepth = y_total
+    # 步架数量
+    rafterCount = params['rafter_count']
+    rafterAdjusted = False
+    # 卷棚顶：顶层桁檩间距3椽径，要从进深中减去后，平分椽架
+    if roofStyle in (
+            con.ROOF_XUANSHAN_JUANPENG,
+            con.ROOF_YINGSHAN_JUANPENG,
+            con.ROOF_XIESHAN_JUANPENG,
+        ):
+        # 卷棚椽架排除“顶步架”，如果为奇数，自动扣除一步架
+        roomDepth -= con.JUANPENG_SPAN*dk
+        if rafterCount%2 != 0:
+            rafterCount -= 1
+            # 正常的奇变偶，不输出提示
+    else:
+        if rafterCount%2 != 0:
+            rafterCount -= 1
+            # 异常的奇变偶，由调用方给出提示
+            rafterAdjusted = True
+    for n in range(int(rafterCount/2)):
+        # 1、计算每层步架的进深----------------
+        # 20241123 根据尖山、卷棚、盝顶、是否做廊步架等计算每个步架长度
+        # 判断是否做廊步架(至少4步架才能做廊步架，否则忽略)
+        if params['use_hallway'] and rafterCount>=4:
+            if n==0 :
+                # 廊步架宽度 = 柱网的廊间进深
+                rafterSpan = abs(net_y[1]-net_y[0])
+                rafterSpan0 = rafterSpan    # 檐步架宽度，后续使用
+                roomDepth -= rafterSpan*2 # 从通进深扣除前后的两个廊步架
+            else:
+                # 其他步架平分
+                rafterSpan = roomDepth/(rafterCount-2)
+        else:
+            # 不做廊步架，则所有步架平分
+            rafterSpan = roomDepth/rafterCount
+            rafterSpan0 = rafterSpan    # 檐步架宽度，后续使用
+        # 盝顶：直接采用用户设置的参数
+        if roofStyle == con.ROOF_LUDING:
+            rafterSpan = params['luding_rafterspan']
+
+        # 2、计算每根槫子的长度，包括推山做法、收山做法的影响--------------
+        # 2.a、硬山、悬山（卷棚）不推
+        if roofStyle in (con.ROOF_YINGSHAN,
+                         con.ROOF_YINGSHAN_JUANPENG,
+                         con.ROOF_XUANSHAN,
+                         con.ROOF_XUANSHAN_JUANPENG):
+            pass
+        # 2.b、歇山，面阔方向，下金桁以上按收山法则
+        elif (roofStyle in (
+                    con.ROOF_XIESHAN,
+                    con.ROOF_XIESHAN_JUANPENG,)
+                and n>0):
+                # 收山系统的选择，推荐一桁径以上，一步架以下
+                # 当超出限制值时，自动设置为限制值
+                # 注意：这里必须按照檐步架计算
+                # 而且在廊间举架做法中，檐步架与其他步架宽度不同
+                shoushanLimit = (
+                    rafterSpan0                 # 檐步架
+                    - con.BOFENG_WIDTH*dk       # 博缝板
+                    - con.XYB_WIDTH*dk          # 山花板
+                    - con.BEAM_DEPTH*pd/2       # 梁架中线
+                    )
+                if shoushan > shoushanLimit:
+                    shoushan = shoushanLimit
+                # 推山从山面檐檩中，向内一檩径，作为山花板外皮（博缝板内皮）
+                purlinWidth = (x_total/2
+                        - shoushan         # 用户自定义推山尺寸
+                    )
+        # 2.c、庑殿，下金桁以上，应用推山做法
+        # 见马炳坚书p25，Xn= 0.9**n * X
+        elif (roofStyle == con.ROOF_WUDIAN
+            and n>0):
+            purlinWidth -= params['tuishan']**n*rafterSpan
+        # 2.4、盝顶仅做到下金桁
+        elif roofStyle== con.ROOF_LUDING and n >0:
+            continue
+        else:
+            # 面阔、进深，每次推一个步架
+            purlinWidth -= rafterSpan
+
+        # 3. 计算每根槫子的举折
+        # 3.a、进深Y方向的举折
+        purlinDeepth -= rafterSpan
+        # 3.b、举折：举架高度 = 步架 * 举架系数
+        purlinHeight += rafterSpan*lift_ratio[n]
+
+        # 4、存入槫子参数集合
+        purlin_pos.append((
+            purlinWidth,
+            purlinDeepth,
+            purlinHeight))
+
+    return {
+        'purlin_pos' : purlin_pos,
+        'shoushan' : shoushan,
+        'rafter_count' : rafterCount,
+        'rafter_adjusted' : rafterAdjusted,
+    }
+
+# 一次计算柱网和桁檩，便于参数遍历
+# 返回字典，包括net_x,net_y,x_total,y_total，以及getPurlinPos的结果
+def solve(params):
+    net_x,net_y = getFloorNet(params)
+    x_total,y_total = getNetTotal(net_x,net_y)
+    result = {
+        'net_x' : net_x,
+        'net_y' : net_y,
+        'x_total' : x_total,
+        'y_total' : y_total,
+    }
+    result.update(getPurlinPos(params,(net_x,net_y)))
+    return result
@@ -0,0 +1,262 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   构件几何缓存
+#   按构件输入参数的哈希，将生成的mesh（顶点、面、UV、材质）保存为npz文件
+#   再次营造相同参数的构件时，直接从缓存重建mesh，不再执行bmesh和bpy.ops的构造过程
+#   缓存目录在blend文件旁（文件名_acacache），未保存的文件使用临时目录
+#   缓存目录的容量不超过MESH_CACHE_MAX_MB，超出时删除最久未使用的文件
+#   可在插件设置中手工清空缓存
+#   用法：
+#   key = meshCache.getKey('beam',dk,dimension,...)
+#   obj = meshCache.load(key,name,parent)
+#   if obj == None:
+#       obj = ...正常构造...
+#       meshCache.save(key,obj)
+import bpy
+import os
+import shutil
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from mathutils import Matrix
+
+from .const import ACA_Consts as con
+from . import utils
+from . import draft
+
+# 缓存格式版本，构件的构造逻辑修改后需要递增，使旧缓存失效
+CACHE_VERSION = 1
+# 缓存目录的后缀
+CACHE_DIR_SUFFIX = '_acacache'
+# 内存中缓存的构件数量上限，超出时淘汰最久未使用的，仍可从文件中读取
+MAX_ITEMS = 256
+
+# 已读取的缓存，避免同一会话中重复读取文件
+# {key:{数组名:数组}}，按使用顺序排列，最近使用的在最后
+__memCache = OrderedDict()
+# 缓存目录的占用空间(字节)，{缓存目录:字节数}，首次保存时统计，之后随保存累加
+__diskSize = {}
+
+# 计算资产对象的内容指纹：名称，及自身和子对象的网格顶点数、坐标哈希、材质
+# 用户修改了资产（如棂心、材质对象的贴图）但保持名称不变时，缓存键随之变化
+def __getObjectFingerprint(obj:bpy.types.Object):
+    parts = [obj.name]
+    for child in (obj,) + tuple(obj.children_recursive):
+        for slot in child.material_slots:
+            if slot.material != None:
+                parts.append(__getMatFingerprint(slot.material))
+        if child.type != 'MESH':
+            continue
+        mesh = child.data
+        co = np.empty(len(mesh.vertices)*3,dtype=np.float32)
+        mesh.vertices.foreach_get('co',co)
+        parts.append((child.name,len(mesh.vertices),
+                      hashlib.md5(co.tobytes()).hexdigest()))
+    return tuple(parts)
+
+# 计算材质的内容指纹：名称，及贴图的名称和尺寸
+# 贴图尺寸影响展UV时的宽高比修正，见texture.__correctAspect
+def __getMatFingerprint(mat:bpy.types.Material):
+    parts = [mat.name]
+    if mat.use_nodes and mat.node_tree != None:
+        for node in mat.node_tree.nodes:
+            image = getattr(node,'image',None)
+            if image != None:
+                parts.append((node.name,image.name,tuple(image.size)))
+    return tuple(parts)
+
+# 将参数转换为可哈希的形式
+def __normalize(value):
+    if isinstance(value,bpy.types.Object):
+        return __getObjectFingerprint(value)
+    if isinstance(value,bpy.types.Material):
+        return __getMatFingerprint(value)
+    if isinstance(value,bpy.types.ID):
+        return value.name
+    if isinstance(value,float):
+        return round(value,6)
+    if isinstance(value,(str,int,bool)) or value == None:
+        return value
+    # Vector、tuple等序列
+    try:
+        return tuple(__normalize(v) for v in value)
+    except TypeError:
+        return str(value)
+
+# 根据构件类型和输入参数计算缓存键
+# kind：构件类型，如'beam'，同时作为缓存文件名的前缀
+def getKey(kind,*values):
+    normalized = (CACHE_VERSION,kind,__normalize(values))
+    digest = hashlib.md5(repr(normalized).encode('utf-8')).hexdigest()
+    return kind + '_' + digest
+
+# 获取缓存目录
+def getCacheDir():
+    if bpy.data.filepath != '':
+        blendDir,blendName = os.path.split(bpy.data.filepath)
+        return os.path.join(blendDir,
+            os.path.splitext(blendName)[0] + CACHE_DIR_SUFFIX)
+    return os.path.join(bpy.app.tempdir,'aca' + CACHE_DIR_SUFFIX)
+
+# 加入内存缓存，超出上限时淘汰最久未使用的
+def __remember(key,data):
+    __memCache[key] = data
+    __memCache.move_to_end(key)
+    while len(__memCache) > MAX_ITEMS:
+        __memCache.popitem(last=False)
+    return
+
+# 读取缓存，未命中时返回None
+def __read(key):
+    data = __memCache.get(key)
+    if data != None:
+        __memCache.move_to_end(key)
+        return data
+    path = os.path.join(getCacheDir(),key + '.npz')
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path,allow_pickle=False) as npz:
+            data = {name:npz[name] for name in npz.files}
+        # 更新修改时间，容量超限时按此淘汰最久未使用的文件
+        os.utime(path)
+    except (OSError,ValueError) as e:
+        # 文件损坏，视为未命中，下次保存时覆盖
+        utils.outputMsg("构件缓存读取失败：" + str(e))
+        return None
+    __remember(key,data)
+    return data
+
+# 从缓存重建构件对象
+# name：对象名称，parent：父对象
+# 返回新建的对象，未命中时返回None
+def load(key,name,parent:bpy.types.Object=None):
+    # 草图营造不展UV，不读写缓存，以免与完整营造的构件混用
+    if not con.USE_MESH_CACHE or draft.isDraft():
+        return None
+    data = __read(key)
+    if data == None:
+        return None
+    # 材质按名称查找，材质丢失时视为未命中
+    materials = []
+    for matName in data['materials']:
+        if matName == '':
+            materials.append(None)
+            continue
+        material = bpy.data.materials.get(str(matName))
+        if material == None:
+            return None
+        materials.append(material)
+
+    mesh = utils.addMeshByArrays(
+        name,
+        co=data['co'],
+        loopVerts=data['loopVerts'],
+        loopStart=data['loopStart'],
+        matIndex=data['matIndex'],
+        smooth=data['smooth'],
+        uv=data.get('uv'),
+        materials=materials,
+        edges=data['edges'],
+        loopEdges=data['loopEdges'],
+        sharpEdge=data.get('sharpEdge'),
+    )
+    obj = bpy.data.objects.new(name,mesh)
+    bpy.context.collection.objects.link(obj)
+    obj.parent = parent
+    obj.matrix_basis = Matrix(data['matrix'].tolist())
+    return obj
+
+# 读取缓存中随构件保存的附加数值，如隔扇的窗台高度
+def getExtra(key,name):
+    data = __read(key)
+    if data == None or ('extra_' + name) not in data:
+        return None
+    return data['extra_' + name].item()
+
+# 将构件对象保存到缓存
+# 保存对象的mesh（不含修改器）和相对父对象的矩阵
+# extra：附加的数值，通过getExtra读取
+def save(key,obj:bpy.types.Object,**extra):
+    if not con.USE_MESH_CACHE or draft.isDraft():
+        return None
+    arrays = utils.getMeshArrays(obj)
+    data = {
+        'co' : arrays['co'],
+        'edges' : arrays['edges'],
+        'loopVerts' : arrays['loopVerts'],
+        'loopEdges' : arrays['loopEdges'],
+        'loopStart' : arrays['loopStart'],
+        'matIndex' : arrays['matIndex'],
+        'smooth' : arrays['smooth'],
+        'materials' : np.array(
+            [m.name if m != None else '' for m in arrays['materials']],
+            dtype=str),
+        'matrix' : np.array(obj.matrix_basis,dtype=np.float64),
+    }
+    if arrays['uv'] is not None:
+        data['uv'] = arrays['uv']
+    if arrays['sharpEdge'] is not None:
+        data['sharpEdge'] = arrays['sharpEdge']
+    for name,value in extra.items():
+        data['extra_' + name] = np.array(value)
+    __remember(key,data)
+
+    cacheDir = getCacheDir()
+    path = os.path.join(cacheDir,key + '.npz')
+    try:
+        os.makedirs(cacheDir,exist_ok=True)
+        oldSize = __getDiskSize(cacheDir)
+        if os.path.exists(path):
+            oldSize -= os.path.getsize(path)
+        np.savez_compressed(path,**data)
+        __diskSize[cacheDir] = oldSize + os.path.getsize(path)
+        __pruneDisk(cacheDir)
+    except OSError as e:
+        # 目录不可写时，仅保留内存中的缓存
+        utils.outputMsg("构件缓存保存失败：" + str(e))
+    return key
+
+# 统计缓存目录的占用空间
+def __getDiskSize(cacheDir):
+    size = __diskSize.get(cacheDir)
+    if size == None:
+        size = 0
+        for entry in os.scandir(cacheDir):
+            if entry.is_file():
+                size += entry.stat().st_size
+        __diskSize[cacheDir] = size
+    return size
+
+# 缓存目录超出容量上限时，按修改时间删除最久未使用的文件
+# 删除到上限的80%，以免每次保存都触发清理
+def __pruneDisk(cacheDir):
+    limit = con.MESH_CACHE_MAX_MB*1024*1024
+    if __diskSize[cacheDir] <= limit:
+        return
+    entries = [entry for entry in os.scandir(cacheDir)
+               if entry.is_file()]
+    entries.sort(key=lambda entry:entry.stat().st_mtime)
+    size = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if size <= limit*0.8:
+            break
+        try:
+            fileSize = entry.stat().st_size
+            os.remove(entry.path)
+            size -= fileSize
+        except OSError:
+            continue
+    __diskSize[cacheDir] = size
+    utils.outputMsg("构件缓存超出容量，已清理最久未使用的文件")
+    return
+
+# 清空缓存，包括内存和缓存目录
+def clearCache():
+    __memCache.clear()
+    __diskSize.clear()
+    cacheDir = getCacheDir()
+    if os.path.isdir(cacheDir):
+        shutil.rmtree(cacheDir,ignore_errors=True)
+    return
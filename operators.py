@@ -100,6 +100,23 @@ class ACA_OT_update_building(bpy.types.Operator):
 
         return {'FINISHED'}
     
+# 完整营造，补做草图模式下简化的阶段
+class ACA_OT_build_full(bpy.types.Operator):
+    bl_idname="aca.build_full"
+    bl_label = "完整营造"
+    bl_options = {'REGISTER', 'UNDO'}
+    bl_description = '草图模式下，立即补做完整的柱子、斗栱、瓦作和贴图'
+
+    def execute(self, context):  
+        buildingObj,bData,objData = utils.getRoot(context.object)
+        if buildingObj == None:
+            utils.popMessageBox("此对象并非插件生成，或已经合并，无法操作。")
+            return {'FINISHED'}
+        funproxy = partial(build.buildFull,
+                    buildingObj=buildingObj)
+        utils.fastRun(funproxy)
+        return {'FINISHED'}
+    
 # 删除建筑
 class ACA_OT_del_building(bpy.types.Operator):
     bl_idname="aca.del_building"
@@ -880,15 +897,7 @@ class ACA_OT_EXPORT_FBX(bpy.types.Operator):
         # 导出fbx
         filePath = self.filepath
         absPath = bpy.path.abspath(filePath)
-        bpy.ops.export_scene.fbx(
-            filepath = absPath, 
-            check_existing=True,
-            use_selection = True,
-            mesh_smooth_type = 'FACE',
-            path_mode = 'COPY',
-            embed_textures = True,
-            colors_type='NONE'
-        )
+        utils.exportFBX(absPath)
 
         return {'FINISHED'}
     
@@ -937,20 +946,7 @@ class ACA_OT_EXPORT_GLB(bpy.types.Operator):
         # 导出fbx
         filePath = self.filepath
         absPath = bpy.path.abspath(filePath)
-        bpy.ops.export_scene.gltf(
-            filepath=absPath, 
-            check_existing=True, 
-            use_selection=True,         # only select
-            use_visible=True,           # only visible
-            use_renderable=True,        # only renderable
-            export_apply=True,          # apply modifiers
-            export_animations=False,    # not export ani
-            export_skins=False,         # not export skin
-            export_morph=False,         # not export shapekey 
-            # not sure
-            # export_gn_mesh=False,     # Geometry Nodes Instances (Experimental), Export Geometry nodes instance meshes
-            # export_original_specular=False,  # Export original PBR Specular, Export original glTF PBR Specular, instead of Blender Principled Shader Specular
-        )
+        utils.exportGLB(absPath)
 
         return {'FINISHED'}
     
@@ -977,6 +973,59 @@ class ACA_OT_EXPORT_GLB(bpy.types.Operator):
         context.window_manager.fileselect_add(self)   
         return {'RUNNING_MODAL'}
     
+# 导出营造记录
+# 250402 将最近几次营造的阶段记录导出为json
+class ACA_OT_EXPORT_TRACE(bpy.types.Operator):
+    bl_idname="aca.export_trace"
+    bl_label = "导出营造记录"
+    bl_options = {'REGISTER'}
+    bl_description = '将最近几次营造的阶段耗时、对象数和顶点数的变化导出为json'
+
+    filepath: bpy.props.StringProperty(
+        subtype="FILE_PATH")# type: ignore
+    check_existing: bpy.props.BoolProperty(
+        name="Check Existing",
+        description="Check and warn on overwriting existing files",
+        default=True,
+        options={'HIDDEN'},
+    )# type: ignore
+    filename: bpy.props.StringProperty()# type: ignore
+
+    def execute(self, context):
+        from . import tracer
+        absPath = bpy.path.abspath(self.filepath)
+        tracer.exportJSON(absPath)
+        self.report({'INFO'},'营造记录已导出：' + absPath)
+        return {'FINISHED'}
+    
+    def invoke(self, context, event):
+        # 获取当前的Blender文件名
+        blend_filepath = context.blend_data.filepath
+        if not blend_filepath:
+            blend_filepath = "untitled"
+        else:
+            import os
+            blend_filepath = os.path.splitext(blend_filepath)[0]
+        self.filepath = blend_filepath + '_trace.json'
+        
+        # 弹出文件选择框
+        context.window_manager.fileselect_add(self)   
+        return {'RUNNING_MODAL'}
+
+# 清空构件几何缓存
+class ACA_OT_CLEAR_MESH_CACHE(bpy.types.Operator):
+    bl_idname="aca.clear_mesh_cache"
+    bl_label = "清空构件缓存"
+    bl_options = {'REGISTER'}
+    bl_description = '删除blend文件旁的构件几何缓存目录，下次营造时重新生成'
+
+    def execute(self, context):
+        from . import meshCache
+        cacheDir = meshCache.getCacheDir()
+        meshCache.clearCache()
+        self.report({'INFO'},'构件缓存已清空：' + cacheDir)
+        return {'FINISHED'}
+    
 # 测试
 class ACA_OT_test(bpy.types.Operator):
     bl_idname="aca.test"
@@ -1029,6 +1078,14 @@ class ACA_OT_Preferences(bpy.types.AddonPreferences):
             description = "取消后，不再使用倒角，直接生成直角构件",
         ) # type: ignore
 
+    update_delay : bpy.props.FloatProperty(
+            default = con.UPDATE_DELAY,
+            min = 0,
+            max = 5,
+            name = "参数刷新延迟(秒)",
+            description = "修改参数后，停止修改一段时间再统一重建，拖动滑块时不再反复营造；设为0时立即重建",
+        ) # type: ignore
+
     def draw(self, context):
         layout = self.layout
         row = layout.row()
@@ -1043,6 +1100,10 @@ class ACA_OT_Preferences(bpy.types.AddonPreferences):
         
         row = layout.row()
         row.prop(self,'use_bevel')
+        row = layout.row()
+        row.prop(self,'update_delay')
+        row = layout.row()
+        row.operator("aca.clear_mesh_cache",icon='TRASH')
     
 # 关联素材库
 class ACA_OT_LINK_ASSETS(bpy.types.Operator):
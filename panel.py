@@ -129,6 +129,22 @@ class ACA_PT_basic(bpy.types.Panel):
                     text=text
                 )
 
+                # 250402 草图模式，修改参数时快速预览
+                toolBar = box.row(align=True)
+                col = toolBar.column(align=True)
+                col.prop(
+                    data=bpy.context.scene.ACA_data,
+                    property='use_draft',
+                    toggle=True,
+                    icon='MESH_CUBE',
+                )
+                # 有待补做的草图阶段时，可立即完整营造
+                from . import draft
+                col = toolBar.column(align=True)
+                col.enabled = draft.hasDraft(buildingObj)
+                col.operator(
+                    "aca.build_full",icon='SHADING_TEXTURE')
+
                 toolBox = box.column(align=True)
                 # 合并按钮
                 toolBar = toolBox.grid_flow(columns=1, align=True)
@@ -1100,4 +1116,50 @@ class ACA_PT_yardwall_props(bpy.types.Panel):
                     'aca.build_yardwall',
                     icon='PLAY',
                     depress=True,
-                    text='重新生成院墙')
\ No newline at end of file
+                    text='重新生成院墙')
+# “营造记录”面板
+# 250402 展示最近几次营造的阶段耗时、对象增删、顶点数
+class ACA_PT_trace(bpy.types.Panel):
+    # 常规属性
+    bl_context = "objectmode"       # 关联的上下文，如，objectmode, mesh_edit, armature_edit等
+    bl_region_type = 'UI'           # UI代表sidebar形式
+    bl_space_type = 'VIEW_3D'       # View_3D在viewport中显示
+    
+    # 自定义属性
+    bl_category = "筑韵古建"         # 标签页名称
+    bl_label = "营造记录"            # 面板名称，显示为可折叠的箭头后
+    bl_options = {"DEFAULT_CLOSED"}     # 默认折叠
+
+    @classmethod 
+    def poll(self, context):
+        return build.isFinished
+
+    def draw(self, context):
+        from . import tracer
+        layout = self.layout
+
+        if len(tracer.history) == 0:
+            layout.label(text='暂无营造记录',icon='INFO')
+            return
+
+        # 导出按钮
+        row = layout.row()
+        row.operator("aca.export_trace",icon='EXPORT')
+
+        # 最新的记录在前
+        for trace in reversed(tracer.history):
+            box = layout.box()
+            if trace.get('status') == 'CANCELLED':
+                icon = 'ERROR'
+            else:
+                icon = 'TIME'
+            box.label(
+                text='%s  %.2fs' % (trace['name'],trace['seconds']),
+                icon=icon)
+            col = box.column(align=True)
+            for depth,span in tracer.flatten(trace)[1:]:
+                row = col.row(align=True)
+                row.label(text='  '*depth + span['name'])
+                row.label(text='%.2fs' % span['seconds'])
+                row.label(text='%+d' % span['objects'])
+                row.label(text='%+d' % span['verts'])
@@ -0,0 +1,214 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   多进程营造，将多个建筑分配到多个后台blender进程中并行营造
+#   每个子进程通过batch.py营造分到的建筑，并保存为blend文件
+#   主进程将各blend文件中的建筑链接回当前场景，按模板的偏移摆放
+#   组合模板拆分为子模板，分别分配到不同的子进程
+#   用法：
+#   blender -b -P parallel.py -- --templates 模板1 模板2 --workers 4 --save 合并.blend
+#   blender -b -P parallel.py -- --manifest manifest.json --out 输出目录
+#   manifest格式同batch.py，可以增加"offset":[x,y,z]指定建筑的摆放位置
+import bpy
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from mathutils import Vector
+
+# 插件的模块名称，即插件目录名称
+ADDON_NAME = 'ACA Builder'
+
+# 解析命令行参数，仅处理'--'之后的部分
+def parseArgs(argv=None):
+    if argv == None:
+        argv = sys.argv
+        if '--' in argv:
+            argv = argv[argv.index('--')+1:]
+        else:
+            argv = []
+    parser = argparse.ArgumentParser(
+        prog='blender -b -P parallel.py --',
+        description='ACA Builder多进程营造')
+    parser.add_argument('--templates', nargs='*', default=[],
+        help='模板名称列表')
+    parser.add_argument('--manifest', default=None,
+        help='参数清单json文件')
+    parser.add_argument('--workers', type=int, default=None,
+        help='子进程数量，默认为CPU核数')
+    parser.add_argument('--out', default=None,
+        help='子进程blend文件的输出目录，默认为当前目录')
+    parser.add_argument('--save', default=None,
+        help='合并后的场景保存路径，可选')
+    parser.add_argument('--append', action='store_true',
+        help='追加建筑（可编辑），默认为链接')
+    parser.add_argument('--addon', default=ADDON_NAME,
+        help='插件模块名称')
+    return parser.parse_args(argv)
+
+# 展开组合模板，每个子模板作为独立的任务
+# 子模板继承组合模板的参数覆盖和偏移
+def expandJobs(jobs):
+    from .const import ACA_Consts as con
+    from . import template
+    expanded = []
+    for job in jobs:
+        acaType = job.get('aca_type')
+        if acaType == None:
+            acaType = template.getBuildingType(job['template'])
+        if acaType != con.ACA_TYPE_COMBO:
+            expanded.append(dict(job,aca_type=acaType))
+            continue
+        for child in template.getTemplateChild(job['template']):
+            expanded.append(dict(job,
+                template=child['templateName'],
+                name=job['name'] + '.' + child['templateName'],
+                aca_type=child['acaType']))
+    return expanded
+
+# 将任务轮流分配给各子进程
+def shardJobs(jobs,workers):
+    shards = [[] for n in range(min(workers,len(jobs)))]
+    for n,job in enumerate(jobs):
+        shards[n % len(shards)].append(job)
+    return shards
+
+# 启动一个后台blender子进程，营造一组任务
+def __startWorker(shard,shardDir,addon):
+    os.makedirs(shardDir,exist_ok=True)
+    manifestPath = os.path.join(shardDir,'manifest.json')
+    reportPath = os.path.join(shardDir,'batch_report.json')
+    with open(manifestPath,'w',encoding='utf-8') as f:
+        json.dump(shard,f,ensure_ascii=False,indent=2)
+    batchPath = os.path.join(os.path.dirname(__file__),'batch.py')
+    cmd = [bpy.app.binary_path,'-b','-P',batchPath,'--',
+           '--manifest',manifestPath,
+           '--out',shardDir,
+           '--format','blend',
+           '--report',reportPath,
+           '--addon',addon]
+    logPath = os.path.join(shardDir,'worker.log')
+    log = open(logPath,'w',encoding='utf-8')
+    proc = subprocess.Popen(cmd,stdout=log,stderr=subprocess.STDOUT)
+    return {
+        'proc' : proc,
+        'log' : log,
+        'log_path' : logPath,
+        'report_path' : reportPath,
+    }
+
+# 从blend文件中链接或追加建筑目录，并摆放到指定位置
+def __linkBuilding(filepath,collName,offset,link=True):
+    from .const import ACA_Consts as con
+    from . import utils
+    with bpy.data.libraries.load(filepath,link=link) as (dataFrom,dataTo):
+        dataTo.collections = [collName]
+    buildingColl = dataTo.collections[0]
+    if buildingColl == None:
+        return None
+    rootColl = utils.setCollection(con.ROOT_COLL_NAME,
+                        isRoot=True,colorTag=2)
+    if link:
+        # 链接的数据不可修改，通过集合实例摆放
+        instanceObj = bpy.data.objects.new(buildingColl.name,None)
+        instanceObj.instance_type = 'COLLECTION'
+        instanceObj.instance_collection = buildingColl
+        instanceObj.location = offset
+        rootColl.objects.link(instanceObj)
+        return instanceObj
+    # 追加的数据直接放入场景，移动建筑根节点
+    rootColl.children.link(buildingColl)
+    for obj in buildingColl.objects:
+        if obj.parent == None:
+            obj.location = Vector(obj.location) + offset
+    return buildingColl
+
+# 多进程营造
+# jobs：任务列表，见batch.getJobs，可以增加'offset'
+# 返回各任务的报告
+def runParallel(jobs,workers=None,outDir=None,link=True,
+                addon=ADDON_NAME):
+    from . import utils
+    if workers == None:
+        workers = os.cpu_count() or 1
+    if outDir == None:
+        outDir = os.getcwd()
+    # 子进程输出的文件路径用于链接，必须为绝对路径
+    outDir = os.path.abspath(outDir)
+    os.makedirs(outDir,exist_ok=True)
+
+    jobs = expandJobs(jobs)
+    shards = shardJobs(jobs,workers)
+    report = {
+        'workers' : len(shards),
+        'jobs' : [],
+    }
+    start = time.time()
+
+    # 1、启动子进程，各自营造分到的建筑
+    running = []
+    for n,shard in enumerate(shards):
+        shardDir = os.path.join(outDir,'worker_%02d' % n)
+        running.append(__startWorker(shard,shardDir,addon))
+    utils.outputMsg("多进程营造：%d个建筑，%d个子进程"
+                    % (len(jobs),len(shards)),force=True)
+
+    # 2、等待所有子进程结束
+    for worker in running:
+        returnCode = worker['proc'].wait()
+        worker['log'].close()
+        if (returnCode != 0
+                or not os.path.exists(worker['report_path'])):
+            report['jobs'].append({
+                'error' : '子进程异常退出，见' + worker['log_path'],
+            })
+            continue
+        with open(worker['report_path'],encoding='utf-8') as f:
+            workerReport = json.load(f)
+        report['jobs'] += workerReport['jobs']
+    report['build_seconds'] = round(time.time() - start,4)
+
+    # 3、按任务的偏移，将建筑链接回当前场景
+    cursor = Vector(bpy.context.scene.cursor.location)
+    offsets = {job['name']:Vector(job.get('offset',(0,0,0)))
+               for job in jobs}
+    for jobReport in report['jobs']:
+        if 'error' in jobReport or jobReport.get('file') == None:
+            continue
+        offset = cursor + offsets.get(jobReport['name'],Vector())
+        for collName in jobReport.get('collections',[]):
+            __linkBuilding(jobReport['file'],collName,offset,link)
+    report['total_seconds'] = round(time.time() - start,4)
+    return report
+
+# 命令行入口
+def main(argv=None):
+    from . import batch
+    args = parseArgs(argv)
+    jobs = batch.getJobs(args.templates,args.manifest)
+    if len(jobs) == 0:
+        print("ACA parallel: 没有待营造的模板，请使用--templates或--manifest")
+        return None
+    outDir = args.out if args.out != None else os.getcwd()
+    report = runParallel(jobs,workers=args.workers,
+                         outDir=outDir,link=not args.append,
+                         addon=args.addon)
+    if args.save != None:
+        bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.save))
+        print("ACA parallel: 场景已保存到 " + args.save)
+    reportPath = os.path.join(outDir,'parallel_report.json')
+    with open(reportPath,'w',encoding='utf-8') as f:
+        json.dump(report,f,ensure_ascii=False,indent=2)
+    print("ACA parallel: 报告已保存到 " + reportPath)
+    return report
+
+# 以blender -b -P parallel.py方式运行时，本文件不在插件包内
+# 需要先启用插件，再调用插件包中的parallel模块
+if __name__ == '__main__':
+    import addon_utils
+    args = parseArgs()
+    addon_utils.enable(args.addon,default_set=True)
+    sys.modules[args.addon].parallel.main()
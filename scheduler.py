@@ -0,0 +1,128 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   参数修改的延迟刷新
+#   拖动滑块时，每一步都会触发属性的update回调，如果立即重建，会连续排队多次营造
+#   回调仅登记需要刷新的对象和动作，并注册计时器，待参数停止变化一段时间后统一执行
+#   同一建筑的多次修改合并为一次增量营造，由buildGraph按阶段哈希判断需要重建的阶段
+#   用法：
+#   scheduler.requestUpdate(buildingObj,scheduler.ACTION_REBUILD,build.updateBuilding)
+import bpy
+import time
+from functools import partial
+
+from .const import ACA_Consts as con
+from . import utils
+
+# 增量营造，由buildGraph判断需要重建的阶段
+ACTION_REBUILD = 'rebuild'
+# 以下动作的参数变化都能被buildGraph识别，与增量营造同时登记时，由增量营造一并处理
+COVERED_BY_REBUILD = ('platform','pillers','piller_size','wall')
+
+# 等待刷新的对象，{对象名称:{动作名称:回调}}，回调以对象为参数
+# 记录名称而非对象引用，以免撤销后引用失效
+__pending = {}
+# 最后一次登记的时间
+__lastTime = 0.0
+# 刷新后添加的撤销步骤名称，None时使用默认名称
+__undoMessage = None
+# 刷新后默认的撤销步骤名称
+DEFAULT_UNDO_MESSAGE = 'ACA Update'
+
+# 获取刷新延迟(秒)，在插件设置中配置
+def getDelay():
+    preferences = bpy.context.preferences
+    addon_main_name = __name__.split('.')[0]
+    addon = preferences.addons.get(addon_main_name)
+    if addon == None:
+        return con.UPDATE_DELAY
+    return addon.preferences.update_delay
+
+# 登记一次刷新
+# obj：需要刷新的对象，通常为建筑根节点
+# action：动作名称，同一对象的同名动作仅执行一次
+# func：刷新的回调，以obj为参数
+# undoMessage：刷新后添加的撤销步骤名称，默认为DEFAULT_UNDO_MESSAGE
+def requestUpdate(obj:bpy.types.Object,
+                  action,
+                  func,
+                  undoMessage=None):
+    global __lastTime,__undoMessage
+    delay = getDelay()
+    # 不延迟，或后台运行时，立即执行
+    if delay <= 0 or bpy.app.background:
+        if undoMessage != None:
+            bpy.ops.ed.undo_push(message=undoMessage)
+        utils.fastRun(partial(func,obj))
+        return
+
+    actions = __pending.setdefault(obj.name,{})
+    actions[action] = func
+    __lastTime = time.time()
+    if undoMessage != None:
+        __undoMessage = undoMessage
+    if not bpy.app.timers.is_registered(__onTimer):
+        bpy.app.timers.register(__onTimer,first_interval=delay)
+    return
+
+# 是否有等待中的刷新
+def isPending():
+    return len(__pending) > 0
+
+# 立即执行所有等待中的刷新
+def flush():
+    global __undoMessage
+    pending = dict(__pending)
+    __pending.clear()
+    undoMessage = __undoMessage
+    __undoMessage = None
+    if len(pending) == 0:
+        return
+
+    for objName,actions in pending.items():
+        obj = bpy.data.objects.get(objName)
+        # 对象可能已被删除或改名
+        if obj == None:
+            continue
+        if ACTION_REBUILD in actions:
+            actions = {name:func for name,func in actions.items()
+                       if name not in COVERED_BY_REBUILD}
+        for func in actions.values():
+            utils.fastRun(partial(func,obj))
+
+    # 延迟执行的修改不在属性编辑的撤销步骤中，每次刷新后都添加撤销步骤
+    # 计时器中可能没有窗口上下文，无法添加撤销步骤时跳过
+    if undoMessage == None:
+        undoMessage = DEFAULT_UNDO_MESSAGE
+    if bpy.ops.ed.undo_push.poll():
+        bpy.ops.ed.undo_push(message=undoMessage)
+    return
+
+# 取消所有等待中的刷新
+def cancel():
+    global __undoMessage
+    __pending.clear()
+    __undoMessage = None
+    if bpy.app.timers.is_registered(__onTimer):
+        bpy.app.timers.unregister(__onTimer)
+    return
+
+# 计时器的回调
+# 返回下次检查的间隔，返回None时注销计时器
+def __onTimer():
+    from . import build
+    if not isPending():
+        return None
+    delay = getDelay()
+    # 正在营造中，稍后再试
+    if not build.isFinished:
+        return max(0.1,delay)
+    # 参数仍在变化，等待停止后再执行
+    elapsed = time.time() - __lastTime
+    if elapsed < delay:
+        return max(0.01,delay - elapsed)
+    flush()
+    # 刷新过程中又有新的登记时，继续等待
+    if isPending():
+        return max(0.01,delay)
+    return None
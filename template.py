@@ -3,12 +3,14 @@
 # 功能概述：
 #   管理模板
 import bpy
+import os
 import pathlib
 import xml.etree.ElementTree as ET
 from .const import ACA_Consts as con
 from .data import ACA_data_obj as acaData
 from .data import ACA_data_template as tmpData
 from . import utils
+from . import tileCache
 
 
 xmlFileName = 'template.xml'
@@ -25,50 +27,104 @@ def __getPath(fileName):
     srcPath = USER / "scripts/addons" / addonName / templateFolder / fileName
     return str(srcPath)
 
+# XML解析缓存，避免每次调用都重新解析
+# {fileName:{'stamp':(mtime,size),'tree':ElementTree,...}}
+# 文件的修改时间或大小变化时，自动重新解析
+__xmlCache = {}
+
+# 建立模板索引
+# top：根层次的模板，names：根层次模板名称（保持顺序）
+# templates：可以直接载入的模板，包括组合模板的子模板
+def __indexTemplates(cache):
+    root = cache['tree'].getroot()
+    top = {}
+    names = []
+    templates = {}
+    for template in root.findall('template'):
+        tname = template.find('template_name')
+        if tname == None: continue
+        top.setdefault(tname.text,template)
+        names.append(tname.text)
+        tType = template.find('aca_type')
+        if tType != None and tType.text == con.ACA_TYPE_COMBO:
+            # 组合模板仅索引其子模板
+            for child in template.findall('template'):
+                cname = child.find('template_name')
+                if cname != None:
+                    templates.setdefault(cname.text,child)
+        else:
+            templates.setdefault(tname.text,template)
+    cache['top'] = top
+    cache['names'] = names
+    cache['templates'] = templates
+    return cache
+
+# 获取XML解析结果（带缓存）
+def __getXML(fileName):
+    path = __getPath(fileName)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns,stat.st_size)
+    cache = __xmlCache.get(fileName)
+    if cache == None or cache['stamp'] != stamp:
+        cache = {
+            'stamp' : stamp,
+            'tree' : ET.parse(path),
+        }
+        if fileName == xmlFileName:
+            __indexTemplates(cache)
+        __xmlCache[fileName] = cache
+    return cache
+
+# 将修改后的XML写回文件，并同步更新缓存
+def __saveXML(fileName):
+    cache = __xmlCache[fileName]
+    tree = cache['tree']
+    path = __getPath(fileName)
+    # 缩进美化
+    # https://stackoverflow.com/questions/28813876/how-do-i-get-pythons-elementtree-to-pretty-print-to-an-xml-file
+    ET.indent(tree, space="\t", level=0)
+    try:
+        # 保存
+        tree.write(path, encoding='UTF-8',xml_declaration=True)
+    except:
+        # 写入失败时丢弃缓存，下次重新解析文件
+        __xmlCache.pop(fileName,None)
+        raise
+    stat = os.stat(path)
+    cache['stamp'] = (stat.st_mtime_ns,stat.st_size)
+    if fileName == xmlFileName:
+        __indexTemplates(cache)
+    return
+
 # 解析XML，获取模板列表
 def getTemplateList(onlyname=False):
     # 载入XML
-    # 这个结果打包发布后出现错误，改为绝对路径
-    # path = os.path.join(templateFolder, xmlFileName)
-    path = __getPath(xmlFileName)
-    tree = ET.parse(path)
-    root = tree.getroot()
-    templates = root.findall('template')
+    # 250402 改为从缓存中读取
+    cache = __getXML(xmlFileName)
 
     template_list = []
-    for template in templates:
-        tname = template.find('template_name')
-        if  tname != None:
-            template_name = tname.text
-            if onlyname:
-                template_list.append(template_name)
-            else:
-                template_list.append(
-                    (template_name,template_name,template_name))
+    for template_name in cache['names']:
+        if onlyname:
+            template_list.append(template_name)
+        else:
+            template_list.append(
+                (template_name,template_name,template_name))
             
     return template_list
 
 # 根据选择的模板，获取模板类型（房屋、院墙）
 def getBuildingType(templateName):
     # 载入XML
-    # 这个结果打包发布后出现错误，改为绝对路径
-    # path = os.path.join(templateFolder, xmlFileName)
-    path = __getPath(xmlFileName)
-    tree = ET.parse(path)
-    root = tree.getroot()
-    templates = root.findall('template')
+    cache = __getXML(xmlFileName)
 
     # 有些模板没有这个类型值，默认置为普通building
     typeName = con.ACA_TYPE_BUILDING
 
-    template_list = []
-    for template in templates:
-        tname = template.find('template_name')
-        if  tname.text == templateName:
-            typeNode = template.find('aca_type')
-            if typeNode != None:
-                typeName = typeNode.text
-            break
+    template = cache['top'].get(templateName)
+    if template != None:
+        typeNode = template.find('aca_type')
+        if typeNode != None:
+            typeName = typeNode.text
             
     return typeName
 
@@ -79,14 +135,16 @@ def getBuildingType(templateName):
 #     <item type='Object' style='斗口重昂'>斗口重昂.柱头科</item>
 #     <item type='Object' style='单翘重昂'>单翘重昂.柱头科</item>
 # </dg_piller_source>
+# 250402 结果保存在XML缓存中，仅在assetsIndex.xml变化后重新计算
 def getDougongList():
-    dougong_list = []
-
     # 载入XML
-    path = __getPath(assetsFileName)
-    tree = ET.parse(path)
+    cache = __getXML(assetsFileName)
+    if 'dougong_list' in cache:
+        return cache['dougong_list']
+
+    dougong_list = []
     # 根节点<assets>
-    root = tree.getroot()
+    root = cache['tree'].getroot()
     # 查找“柱头科”配置
     dgPillerNode = root.find('dg_piller_source')
     if dgPillerNode != None:
@@ -100,6 +158,7 @@ def getDougongList():
                 dougong_list.append(
                     (str(n),dgStyle,dgStyle)
                 )
+    cache['dougong_list'] = dougong_list
             
     return dougong_list
 
@@ -122,17 +181,13 @@ def updateDougongData(buildingObj:bpy.types.Object):
         bData['dg_style'] = '0'
     
     # 1.2、更新aData中的斗栱样式
+    # 250402 所有样式资产一次性从资产库载入
     __updateAssetStyle(
-        buildingObj,'dg_piller_source',
-        parent=dgrootObj)
-    __updateAssetStyle(
-        buildingObj,'dg_fillgap_source',
-        parent=dgrootObj)
-    __updateAssetStyle(
-        buildingObj,'dg_fillgap_alt_source',
-        parent=dgrootObj)
-    __updateAssetStyle(
-        buildingObj,'dg_corner_source',
+        buildingObj,
+        ('dg_piller_source',
+         'dg_fillgap_source',
+         'dg_fillgap_alt_source',
+         'dg_corner_source',),
         parent=dgrootObj)
     if (aData.dg_piller_source == None
             or aData.dg_fillgap_source == None
@@ -168,52 +223,59 @@ def updateDougongData(buildingObj:bpy.types.Object):
     return
 
 # 更新资产样式
+# assetNames：aData中的资产属性名列表，根据bData中的样式选择，载入对应的资产
+# 250402 先解析出所有需要的资产名称，再一次性载入
 def __updateAssetStyle(buildingObj:bpy.types.Object,
-                     assetName='',
+                     assetNames=(),
                      parent=None): 
     # 载入数据
     bData:acaData = buildingObj.ACA_data  
     aData : tmpData = bpy.context.scene.ACA_temp
+    # 兼容传入单个资产属性名
+    if isinstance(assetNames,str):
+        assetNames = (assetNames,)
     # 载入XML
-    path = __getPath(assetsFileName)
-    tree = ET.parse(path)
+    tree = __getXML(assetsFileName)['tree']
     # 根节点<assets>
     root = tree.getroot()
-    # 查找配置
-    assetNode = root.find(assetName)
-    if assetNode != None:
+
+    # 1、解析每个资产属性对应的资产名称
+    styleAssets = {}
+    for assetName in assetNames:
+        # 查找配置
+        assetNode = root.find(assetName)
+        if assetNode == None: continue
         # 判断type属性
         type = assetNode.attrib['type']
-        if type == 'List':
-            # 获取样式定义，是指bData中定义的变量名称
-            styleKey = assetNode.attrib['key']
-            # 有些配置可能太老，导致部分styleKey缺失
-            if styleKey in bData:
-                # styleValue为了样式下拉框能自动选中，
-                # 在载入样式时自动转为了int，这里要转为str与xml比较
-                styleValue = int(bData[styleKey])
-                # 查找“item”子节点
-                items = assetNode.findall('item')
-                for n,item in enumerate(items):
-                    if n == styleValue:
-                        # 250104 为了解决以下报错，做的安全性验证
-                        # 似乎是4.2中做了一个Breaking changes：Statically Typed IDProperties
-                        # https://developer.blender.org/docs/release_notes/4.2/python_api/#statically-typed-idproperties
-                        # TypeError: Cannot assign a 'Object' value to the existing 'dg_piller_source' Group IDProperty
-                        if assetName in aData:  
-                            del aData[assetName]
-                        # 个性化样式资产，不采用link方式，而是复制到各个建筑内
-                        aData[assetName] = loadAssets(
-                            item.text,link=False,parent=parent)
+        if type != 'List': continue
+        # 获取样式定义，是指bData中定义的变量名称
+        styleKey = assetNode.attrib['key']
+        # 有些配置可能太老，导致部分styleKey缺失
+        if styleKey not in bData: continue
+        # styleValue为了样式下拉框能自动选中，
+        # 在载入样式时自动转为了int，这里要转为str与xml比较
+        styleValue = int(bData[styleKey])
+        # 查找“item”子节点
+        items = assetNode.findall('item')
+        if styleValue < len(items):
+            styleAssets[assetName] = items[styleValue].text
+
+    # 2、一次性载入所有资产
+    # 个性化样式资产，不采用link方式，而是复制到各个建筑内
+    assetObjs = loadAssetsBulk(
+        styleAssets.values(),link=False,parent=parent)
+    for assetName,objName in styleAssets.items():
+        # 250104 为了解决以下报错，做的安全性验证
+        # 似乎是4.2中做了一个Breaking changes：Statically Typed IDProperties
+        # https://developer.blender.org/docs/release_notes/4.2/python_api/#statically-typed-idproperties
+        # TypeError: Cannot assign a 'Object' value to the existing 'dg_piller_source' Group IDProperty
+        if assetName in aData:  
+            del aData[assetName]
+        aData[assetName] = assetObjs.get(objName)
     return
 
-# 载入Blender中的资产
-# 参考教程：https://b3d.interplanety.org/en/appending-all-objects-from-the-external-blend-file-to-the-scene-with-blender-python-api/
-# 参考文档：https://docs.blender.org/api/current/bpy.types.BlendDataLibraries.html
-def loadAssets(assetName : str,
-               parent:bpy.types.Object=None,
-               hide=True,
-               link=True):   
+# 查找资产库文件
+def __getAssetsPath():
     import os
     # 查找默认插件目录下的素材库
     filepath = __getPath(blenderFileName)
@@ -226,22 +288,14 @@ def loadAssets(assetName : str,
         filepath = addon_prefs.filepath    
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"无法打开资产库，请确认已经按照使用手册，关联了acaAssets.blend文件。")   
-
-    # 简化做法，效率更高，但没有关联子对象
-    try:
-        with bpy.data.libraries.load(filepath,link=link) as (data_from, data_to):
-            data_to.objects = [name for name in data_from.objects if name==assetName]
-    except OSError:
-        raise Exception('无法打开资产库，请确认acaAssets.blend文件已经放入插件目录')
-    # 验证找到的资产是否唯一
-    if len(data_to.objects) == 0:
-        utils.outputMsg("未找到指定载入的资产:" + assetName)
-        return
-    if len(data_to.objects) > 1:
-        utils.outputMsg("无法定位唯一的资产:" + assetName)
-        return 
-    
-    sourceObj = data_to.objects[0]
+    return filepath
+
+# 对载入的资产做后处理
+# link方式直接返回引用，否则复制一个新对象
+def __setupAsset(sourceObj:bpy.types.Object,
+                 parent:bpy.types.Object=None,
+                 hide=True,
+                 link=True):
     if link:
         # 直接返回引用
         # bpy.context.collection.objects.link(sourceObj)
@@ -264,6 +318,53 @@ def loadAssets(assetName : str,
                 utils.showObj(child)
         return newobj
 
+# 载入Blender中的资产
+# 参考教程：https://b3d.interplanety.org/en/appending-all-objects-from-the-external-blend-file-to-the-scene-with-blender-python-api/
+# 参考文档：https://docs.blender.org/api/current/bpy.types.BlendDataLibraries.html
+def loadAssets(assetName : str,
+               parent:bpy.types.Object=None,
+               hide=True,
+               link=True):   
+    assetObjs = loadAssetsBulk(
+        [assetName],parent=parent,hide=hide,link=link)
+    return assetObjs.get(assetName)
+
+# 批量载入Blender中的资产
+# 仅打开一次资产库，返回{资产名称:对象}
+# 250402 新建建筑时，逐个载入资产需要反复打开资产库，非常耗时
+def loadAssetsBulk(assetNames,
+               parent:bpy.types.Object=None,
+               hide=True,
+               link=True):
+    filepath = __getAssetsPath()
+    # 去重，并保持顺序
+    assetNames = list(dict.fromkeys(assetNames))
+    if len(assetNames) == 0:
+        return {}
+
+    # 简化做法，效率更高，但没有关联子对象
+    try:
+        with bpy.data.libraries.load(filepath,link=link) as (data_from, data_to):
+            fromNames = set(data_from.objects)
+            data_to.objects = [name for name in assetNames 
+                               if name in fromNames]
+    except OSError:
+        raise Exception('无法打开资产库，请确认acaAssets.blend文件已经放入插件目录')
+    
+    # data_to.objects与请求的名称顺序一致
+    loadedNames = [name for name in assetNames if name in fromNames]
+    assetObjs = {}
+    for name in assetNames:
+        if name not in fromNames:
+            utils.outputMsg("未找到指定载入的资产:" + name)
+    for name,sourceObj in zip(loadedNames,data_to.objects):
+        if sourceObj == None:
+            utils.outputMsg("无法定位唯一的资产:" + name)
+            continue
+        assetObjs[name] = __setupAsset(
+            sourceObj,parent=parent,hide=hide,link=link)
+    return assetObjs
+
 # 用const填充XML中未定义的属性
 def __loadDefaultData(buildingObj:bpy.types.Object):
     # 载入数据
@@ -320,11 +421,11 @@ def loadAssetByBuilding(buildingObj:bpy.types.Object):
     aData : tmpData = bpy.context.scene.ACA_temp
 
     # 解析XML配置模板
-    path = __getPath(assetsFileName)
-    tree = ET.parse(path)
+    tree = __getXML(assetsFileName)['tree']
     root = tree.getroot()
     
-    # 填充
+    # 解析需要载入的资产
+    objectNodes = {}
     for node in root:
         tag = node.tag
         type = node.attrib['type']
@@ -333,13 +434,22 @@ def loadAssetByBuilding(buildingObj:bpy.types.Object):
         # 动态的模板对象声明为List，
         # 不在这里处理，而拆分到类似updateDougongData的定制方法中处理
         if type == 'Object':
-            # 241224 为了解决以下报错，做的安全性验证
-            # 似乎是4.2中做了一个Breaking changes：Statically Typed IDProperties
-            # https://developer.blender.org/docs/release_notes/4.2/python_api/#statically-typed-idproperties
-            # TypeError: Cannot assign a 'Object' value to the existing 'mat_wood' Group IDProperty
-            if tag in aData:  
-                del aData[tag]  
-            aData[tag] = loadAssets(value)
+            objectNodes[tag] = value
+
+    # 250402 一次性打开资产库，载入所有资产
+    assetObjs = loadAssetsBulk(objectNodes.values())
+    # 资源已更新，清空基于旧资源的瓦件缓存
+    tileCache.clear()
+
+    # 填充
+    for tag,value in objectNodes.items():
+        # 241224 为了解决以下报错，做的安全性验证
+        # 似乎是4.2中做了一个Breaking changes：Statically Typed IDProperties
+        # https://developer.blender.org/docs/release_notes/4.2/python_api/#statically-typed-idproperties
+        # TypeError: Cannot assign a 'Object' value to the existing 'mat_wood' Group IDProperty
+        if tag in aData:  
+            del aData[tag]  
+        aData[tag] = assetObjs.get(value)
 
     # # 3、其他个性化处理
     # # 提取斗栱自定义属性，填充入bData
@@ -349,27 +459,21 @@ def loadAssetByBuilding(buildingObj:bpy.types.Object):
     return
 
 def getTemplateChild(templateName):
-    path = __getPath(xmlFileName)
-    tree = ET.parse(path)
-    root = tree.getroot()
-    templates = root.findall('template')
+    cache = __getXML(xmlFileName)
 
     tempChildren = []
-    for template in templates:
-        tname = template.find('template_name')
-        if tname == None: 
-            continue
-        if tname.text == templateName:
-            children = template.findall('template')
-            for child in children:
-                tname = child.find('template_name')
-                ttype = child.find('aca_type')
-                tempChildren.append(
-                    {
-                        'templateName': tname.text,
-                        'acaType' : ttype.text,
-                    }
-                )
+    template = cache['top'].get(templateName)
+    if template != None:
+        children = template.findall('template')
+        for child in children:
+            tname = child.find('template_name')
+            ttype = child.find('aca_type')
+            tempChildren.append(
+                {
+                    'templateName': tname.text,
+                    'acaType' : ttype.text,
+                }
+            )
     return tempChildren
 
 def __loadTemplateSingle(
@@ -449,43 +553,38 @@ def loadTemplate(buildingObj:bpy.types.Object):
     templateName = bData.template_name
     
     # 解析XML配置模板
-    path = __getPath(xmlFileName)
-    tree = ET.parse(path)
-    root = tree.getroot()
-    
-    # 读取所有根节点模板
-    templates = root.findall('template')
-    if templates == None:
-        utils.outputMsg("模板解析失败")
+    # 250402 从缓存的索引中直接查找，包括组合模板的子模板
+    cache = __getXML(xmlFileName)
+    template = cache['templates'].get(templateName)
+    if template != None:
+        __loadTemplateSingle(buildingObj,template)
         return
-    
-    # 在根层次中查找对应名称的那个模板
-    for template in templates:
-        # 查看是否有子模版
-        tType = template.find('aca_type')
-        if tType != None:
-            # 如果 aca_type=combo，则继续查找子模板
-            if tType.text == con.ACA_TYPE_COMBO:
-                # 查找子模板XML节点
-                tempChildren = template.findall('template')
-                for tempChild in tempChildren:
-                    nameNode = tempChild.find('template_name')
-                    if nameNode != None:
-                        if nameNode.text == templateName:
-                            __loadTemplateSingle(
-                                buildingObj,tempChild)
-                            return
-            else:
-                nameNode = template.find('template_name')
-                if nameNode != None:
-                    if nameNode.text == templateName:
-                        __loadTemplateSingle(
-                            buildingObj,template)
-                        return
                     
     # 经过经过以上循环，没有符合条件的模板，抛出异常
     raise Exception('无法载入模板')
 
+# 用指定的参数覆盖模板中的设置
+# 用于批量营造时，在同一模板基础上生成不同尺寸的建筑
+# overrides:{属性名:值}，直接写入bData，不触发update回调
+def applyOverrides(buildingObj:bpy.types.Object,
+                   overrides:dict):
+    bData:acaData = buildingObj.ACA_data
+    for key,value in overrides.items():
+        if key not in bData.bl_rna.properties:
+            utils.outputMsg("无法识别的参数：" + key)
+            continue
+        keyType = bData.bl_rna.properties[key].rna_type.identifier
+        # 与模板载入时的类型转换保持一致
+        if keyType in ('EnumProperty','IntProperty'):
+            bData[key] = int(value)
+        elif keyType == 'FloatProperty':
+            bData[key] = round(float(value),3)
+        elif keyType == 'BoolProperty':
+            bData[key] = (value in (True,'True','true',1))
+        else:
+            bData[key] = value
+    return
+
 # 保存模板修改
 def saveTemplate(buildingObj:bpy.types.Object):
     # 载入输入
@@ -505,26 +604,13 @@ def saveTemplate(buildingObj:bpy.types.Object):
     }
     
     # 解析XML配置模板
-    path = __getPath(xmlFileName)
-    tree = ET.parse(path)
-    root = tree.getroot()   # <templates>根节点
-    # 验证根节点
-    templateNodeList = root.findall('template')
-    if templateNodeList == None:
-        utils.outputMsg("模板解析失败")
-        return
+    cache = __getXML(xmlFileName)
+    root = cache['tree'].getroot()   # <templates>根节点
     
-    # 遍历查找对应模板
-    isNewTemplate = True
-    for templateNode in templateNodeList:
-        nameNode = templateNode.find('template_name')
-        if nameNode != None:
-            if nameNode.text == templateName:
-                # 找到对应模板
-                isNewTemplate = False
-                break
+    # 查找对应模板
+    templateNode = cache['top'].get(templateName)
     # 如果没有找到，则新建模板节点
-    if isNewTemplate:
+    if templateNode == None:
         templateNode = ET.SubElement(root,'template')
 
     # 遍历bData，保存所有的键值
@@ -562,20 +648,16 @@ def saveTemplate(buildingObj:bpy.types.Object):
         keyNode.text = str(value)
         keyNode.attrib['type'] = keyType
 
-    # 缩进美化
-    # https://stackoverflow.com/questions/28813876/how-do-i-get-pythons-elementtree-to-pretty-print-to-an-xml-file
-    ET.indent(tree, space="\t", level=0)
-    # 保存
-    tree.write(path, encoding='UTF-8',xml_declaration=True)
+    # 保存，并同步更新缓存
+    __saveXML(xmlFileName)
 
     return {'FINISHED'}
 
 # 删除模板
 def delTemplate(templateName):
     # 解析XML配置模板
-    path = __getPath(xmlFileName)
-    tree = ET.parse(path)
-    root = tree.getroot()   # <templates>根节点
+    cache = __getXML(xmlFileName)
+    root = cache['tree'].getroot()   # <templates>根节点
     # 验证根节点
     templateNodeList = root.findall('template')
     if templateNodeList == None:
@@ -606,10 +688,7 @@ def delTemplate(templateName):
                 nextTemplateName = nameNode.text
                 break
 
-    # 缩进美化
-    # https://stackoverflow.com/questions/28813876/how-do-i-get-pythons-elementtree-to-pretty-print-to-an-xml-file
-    ET.indent(tree, space="\t", level=0)
-    # 保存
-    tree.write(path, encoding='UTF-8',xml_declaration=True)
+    # 保存，并同步更新缓存
+    __saveXML(xmlFileName)
 
     return {'FINISHED'}
\ No newline at end of file
@@ -5,9 +5,11 @@
 import bpy
 import bmesh
 import math
+import numpy as np
 from mathutils import Vector
 
 from . import utils
+from . import draft
 from .const import ACA_Consts as con
 from .data import ACA_data_obj as acaData
 from .data import ACA_data_template as tmpData
@@ -23,37 +25,43 @@ class uvType:
 
 
 
-# 二维点阵基于p点的缩放
-# v：待缩放的向量（vx，vy）
-# s: 缩放比例（sx，sy）
-# p：缩放的原点（px，py）
-def __Scale2D( v, s, p ):
-    return ( p[0] + s[0]*(v[0] - p[0]), p[1] + s[1]*(v[1] - p[1]) )     
+# 读取UV数组，shape(loops,2)
+def __getUV(uvMap):
+    uv = np.empty(len(uvMap.data)*2,dtype=np.float32)
+    uvMap.data.foreach_get('uv',uv)
+    return uv.reshape(-1,2)
+
+# 写回UV数组
+def __setUV(uvMap,uv):
+    uvMap.data.foreach_set('uv',uv.astype(np.float32).ravel())
+    return
 
 # UV的缩放
+# 250402 改为numpy批量计算，避免逐个loop读写
 def __ScaleUV( uvMap, scale, pivot, fixcenter=False):
-    for uvIndex in range( len(uvMap.data) ):
-        if fixcenter:
-            if uvMap.data[uvIndex].uv[0] > - 0.0001 and uvMap.data[uvIndex].uv[0]< 1.0001:
-                continue
-        uvMap.data[uvIndex].uv = __Scale2D( uvMap.data[uvIndex].uv, scale, pivot )
-
-# 二维点阵的旋转
-def __make_rotation_transformation(angle, origin=(0, 0)):
-    from math import cos, sin
-    cos_theta, sin_theta = cos(angle), sin(angle)
-    x0, y0 = origin    
-    def xform(point):
-        x, y = point[0] - x0, point[1] - y0
-        return (x * cos_theta - y * sin_theta + x0,
-                x * sin_theta + y * cos_theta + y0)
-    return xform
+    uv = __getUV(uvMap)
+    mask = np.ones(len(uv),dtype=bool)
+    if fixcenter:
+        # 已在0~1范围内的UV（如箍头）不做缩放
+        mask = (uv[:,0] <= -0.0001) | (uv[:,0] >= 1.0001)
+    p = np.array(pivot,dtype=np.float32)
+    s = np.array(scale,dtype=np.float32)
+    uv[mask] = p + s*(uv[mask] - p)
+    __setUV(uvMap,uv)
+    return
 
 # UV的旋转
+# 250402 改为numpy批量计算，避免逐个loop读写
 def __RotateUV(uvMap, angle, pivot):
-    rot = __make_rotation_transformation(angle, pivot)
-    for uvIndex in range( len(uvMap.data) ):
-        uvMap.data[uvIndex].uv = rot(uvMap.data[uvIndex].uv ) 
+    uv = __getUV(uvMap)
+    cos_theta, sin_theta = math.cos(angle), math.sin(angle)
+    p = np.array(pivot,dtype=np.float32)
+    x = uv[:,0] - p[0]
+    y = uv[:,1] - p[1]
+    uv = np.column_stack((
+        x * cos_theta - y * sin_theta,
+        x * sin_theta + y * cos_theta)) + p
+    __setUV(uvMap,uv)
     return
 
 # 复制UV
@@ -77,42 +85,190 @@ def __copyUV(
     bpy.ops.object.join_uvs()
 
     # 删除fromObj
-    bpy.data.objects.remove(fromobjCopy)
+    utils.delObject(fromobjCopy)
 
     return
 
-# 展UV，提供了多种不同的方式
-def UvUnwrap(object:bpy.types.Object,
-             type=None,
-             scale=None,
-             pivot=(0,0),
-             rotate=None,
-             fitIndex=None,
-             cubesize=2,
-             correctAspect = True,
-             scaleToBounds = False,
-             remainSelect = False,
-             onlyActiveMat = False,
-             ):   
-    # 隐藏对象不重新展UV
-    if (object.hide_viewport 
-        or object.hide_get()
-        ):
-        return
-    
-    # 非Mesh对象不能展UV
-    if object.type not in ('MESH'):
-        return
+# 读取展UV所需的mesh数组
+# 返回字典：co顶点坐标，normal面法线，loopVerts/loopFace每个loop的顶点和所属面，
+# matIndex面的材质索引，select面的选择状态
+def __getUvMeshArrays(me:bpy.types.Mesh):
+    vCount = len(me.vertices)
+    pCount = len(me.polygons)
+    lCount = len(me.loops)
+    co = np.empty(vCount*3,dtype=np.float32)
+    me.vertices.foreach_get('co',co)
+    normal = np.empty(pCount*3,dtype=np.float32)
+    me.polygons.foreach_get('normal',normal)
+    loopVerts = np.empty(lCount,dtype=np.int32)
+    me.loops.foreach_get('vertex_index',loopVerts)
+    loopTotal = np.empty(pCount,dtype=np.int32)
+    me.polygons.foreach_get('loop_total',loopTotal)
+    matIndex = np.empty(pCount,dtype=np.int32)
+    me.polygons.foreach_get('material_index',matIndex)
+    select = np.empty(pCount,dtype=bool)
+    me.polygons.foreach_get('select',select)
+    return {
+        'co' : co.reshape(-1,3),
+        'normal' : normal.reshape(-1,3),
+        'loopVerts' : loopVerts,
+        # loop按面的顺序连续排列
+        'loopFace' : np.repeat(np.arange(pCount),loopTotal),
+        'matIndex' : matIndex,
+        'select' : select,
+    }
+
+# 获取材质活跃贴图的宽高比，对应bpy.ops.uv的correct_aspect
+# 返回每个材质槽的aspect(宽/高)，没有贴图的为1
+def __getMatAspect(object:bpy.types.Object):
+    aspects = []
+    for slot in object.material_slots:
+        aspect = 1.0
+        mat = slot.material
+        if mat != None and mat.use_nodes and mat.node_tree != None:
+            nodes = mat.node_tree.nodes
+            texNode = nodes.active
+            if texNode == None or not texNode.bl_idname.startswith('ShaderNodeTex'):
+                texNode = next((node for node in nodes
+                    if node.bl_idname.startswith('ShaderNodeTex')),None)
+            if (texNode != None
+                and texNode.bl_idname == 'ShaderNodeTexImage'
+                and texNode.image != None):
+                w,h = texNode.image.size
+                if w > 0 and h > 0:
+                    aspect = w/h
+        aspects.append(aspect)
+    if len(aspects) == 0:
+        aspects.append(1.0)
+    return np.array(aspects,dtype=np.float32)
+
+# 按材质贴图的宽高比修正UV，以0.5为中心压缩较长的方向
+def __correctAspect(object,uv,loopMask,loopMat):
+    aspects = __getMatAspect(object)
+    loopAspect = aspects[np.clip(loopMat,0,len(aspects)-1)]
+    scaleU = loopMask & (loopAspect > 1)
+    uv[scaleU,0] = (uv[scaleU,0] - 0.5)/loopAspect[scaleU] + 0.5
+    scaleV = loopMask & (loopAspect < 1)
+    uv[scaleV,1] = (uv[scaleV,1] - 0.5)*loopAspect[scaleV] + 0.5
+    return uv
+
+# 将选中的UV缩放到0~1范围，对应bpy.ops.uv的scale_to_bounds
+def __scaleToBounds(uv,loopMask):
+    if not loopMask.any():
+        return uv
+    selUV = uv[loopMask]
+    uvMin = selUV.min(axis=0)
+    size = selUV.max(axis=0) - uvMin
+    size[size <= 0] = 1
+    uv[loopMask] = (selUV - uvMin)/size
+    return uv
+
+# 立方体投影，对应bpy.ops.uv.cube_project
+# 每个面按法线的主轴方向，投影到另两个轴构成的平面
+def __cubeProject(arrays,uv,loopMask,cubesize):
+    if cubesize == 0:
+        cubesize = 1
+    absNormal = np.abs(arrays['normal'])
+    # 主轴为Z时取XY，主轴为Y时取XZ，否则取YZ，与blender的axis_dominant_v3一致
+    axisZ = (absNormal[:,2] >= absNormal[:,0]) & (absNormal[:,2] >= absNormal[:,1])
+    axisY = ~axisZ & (absNormal[:,1] >= absNormal[:,0])
+    axisU = np.where(axisZ | axisY,0,1)
+    axisV = np.where(axisZ,1,2)
+    loopFace = arrays['loopFace'][loopMask]
+    loopCo = arrays['co'][arrays['loopVerts'][loopMask]]
+    rows = np.arange(len(loopCo))
+    uv[loopMask,0] = 0.5 + loopCo[rows,axisU[loopFace]]/cubesize
+    uv[loopMask,1] = 0.5 + loopCo[rows,axisV[loopFace]]/cubesize
+    return uv
+
+# 柱状投影，对应bpy.ops.uv.cylinder_project(direction='ALIGN_TO_OBJECT')
+# 以选中面的包围盒中心为轴心，绕对象Z轴展开
+def __cylinderProject(arrays,uv,loopMask):
+    loopVerts = arrays['loopVerts'][loopMask]
+    loopCo = arrays['co'][loopVerts]
+    center = (loopCo.min(axis=0) + loopCo.max(axis=0))/2
+    pv = loopCo - center
+    length = np.hypot(pv[:,0],pv[:,1])
+    safeLen = np.where(length > 0,length,1)
+    u = (1 - np.arctan2(pv[:,0]/safeLen,pv[:,1]/safeLen)/math.pi)/2
+    v = (pv[:,2] + 1)/2
+    u[length == 0] = 0
+    v[length == 0] = 0
+    # 接缝处统一为0
+    u[u >= 1] -= 1
+    # 跨越接缝的面，将小于最大值一半以上的UV右移一圈，避免整面反向拉伸
+    loopFace = arrays['loopFace'][loopMask]
+    faceMax = np.full(len(arrays['normal']),-np.inf,dtype=np.float32)
+    np.maximum.at(faceMax,loopFace,u)
+    wrap = (faceMax[loopFace] - u) > 0.5
+    u[wrap] += 1
+    uv[loopMask,0] = u
+    uv[loopMask,1] = v
+    return uv
+
+# 在数据层面展UV，不进入编辑模式，不改变选择状态
+# 支持cube、fit、cylinder三种投影，其他类型仍使用bpy.ops.uv
+# faceMask：需要展UV的面
+def __projectUV(object:bpy.types.Object,
+                type,
+                faceMask,
+                fitIndex=None,
+                cubesize=2,
+                correctAspect=True,
+                scaleToBounds=False):
+    me:bpy.types.Mesh = object.data
+    # 没有UV时新建，与bpy.ops.uv一致
+    if me.uv_layers.active == None:
+        me.uv_layers.new(name='UVMap')
+    uvMap = me.uv_layers.active
+    arrays = __getUvMeshArrays(me)
+    uv = __getUV(uvMap)
+    loopFace = arrays['loopFace']
+    loopMask = faceMask[loopFace]
+
+    if type == uvType.CUBE:
+        uv = __cubeProject(arrays,uv,loopMask,cubesize)
+        if correctAspect:
+            uv = __correctAspect(object,uv,loopMask,
+                                 arrays['matIndex'][loopFace])
+        if scaleToBounds:
+            uv = __scaleToBounds(uv,loopMask)
+    # 精确适配
+    # 先所有面一起做投影，然后针对需要特殊处理的面，进行二次适配
+    elif type == uvType.FIT:
+        loopMat = arrays['matIndex'][loopFace]
+        uv = __cubeProject(arrays,uv,loopMask,cubesize)
+        uv = __correctAspect(object,uv,loopMask,loopMat)
+        uv = __scaleToBounds(uv,loopMask)
+        if fitIndex != None:
+            fitMask = np.zeros(len(faceMask),dtype=bool)
+            fitMask[[i for i in fitIndex if i < len(faceMask)]] = True
+            fitLoopMask = fitMask[loopFace]
+            uv = __cubeProject(arrays,uv,fitLoopMask,cubesize)
+            uv = __correctAspect(object,uv,fitLoopMask,loopMat)
+            uv = __scaleToBounds(uv,fitLoopMask)
+    elif type == uvType.CYLINDER:
+        uv = __cylinderProject(arrays,uv,loopMask)
+        if correctAspect:
+            uv = __correctAspect(object,uv,loopMask,
+                                 arrays['matIndex'][loopFace])
+        uv = __scaleToBounds(uv,loopMask)
+
+    __setUV(uvMap,uv)
+    me.update()
+    return
 
-    # 验证对象是否可以展UV，至少应该有一个以上的面
-    bm = bmesh.new()
-    bm.from_mesh(object.data)
-    faceCount= len(bm.faces)
-    bm.free()
-    if faceCount == 0 : 
-        utils.outputMsg("展UV异常，该对象不存在几何面")
-        return
-    
+# 通过bpy.ops.uv展UV，需要进入编辑模式
+# smart project、reset，以及关闭USE_UV_KERNEL时使用
+def __UvUnwrapByOps(object:bpy.types.Object,
+                    type=None,
+                    fitIndex=None,
+                    cubesize=2,
+                    correctAspect = True,
+                    scaleToBounds = False,
+                    remainSelect = False,
+                    onlyActiveMat = False,
+                    ):
     # 聚焦对象
     utils.focusObj(object)
 
@@ -187,6 +343,74 @@ def UvUnwrap(object:bpy.types.Object,
             scale_to_bounds=True
         )
     bpy.ops.object.mode_set(mode = 'OBJECT')
+    return
+
+# 展UV，提供了多种不同的方式
+def UvUnwrap(object:bpy.types.Object,
+             type=None,
+             scale=None,
+             pivot=(0,0),
+             rotate=None,
+             fitIndex=None,
+             cubesize=2,
+             correctAspect = True,
+             scaleToBounds = False,
+             remainSelect = False,
+             onlyActiveMat = False,
+             ):   
+    # 隐藏对象不重新展UV
+    if (object.hide_viewport 
+        or object.hide_get()
+        ):
+        return
+    
+    # 非Mesh对象不能展UV
+    if object.type not in ('MESH'):
+        return
+
+    # 250402 草图营造不展UV
+    if draft.isDraft():
+        return
+
+    # 验证对象是否可以展UV，至少应该有一个以上的面
+    if len(object.data.polygons) == 0 : 
+        utils.outputMsg("展UV异常，该对象不存在几何面")
+        return
+
+    # 250402 立方体、适配、柱状投影直接在数据层面计算
+    # 不再聚焦对象、切换编辑模式，也不改变面的选择状态
+    if (con.USE_UV_KERNEL
+        and type in (uvType.CUBE,uvType.FIT,uvType.CYLINDER)):
+        # 应用modifier
+        utils.applyAllModifer(object)
+        me:bpy.types.Mesh = object.data
+        if onlyActiveMat:
+            # 仅针对活跃材质active material
+            matIndex = np.empty(len(me.polygons),dtype=np.int32)
+            me.polygons.foreach_get('material_index',matIndex)
+            faceMask = (matIndex == object.active_material_index)
+        elif remainSelect:
+            # 保持原有的选择
+            faceMask = np.empty(len(me.polygons),dtype=bool)
+            me.polygons.foreach_get('select',faceMask)
+        else:
+            faceMask = np.ones(len(me.polygons),dtype=bool)
+        __projectUV(object,
+                    type,
+                    faceMask,
+                    fitIndex=fitIndex,
+                    cubesize=cubesize,
+                    correctAspect=correctAspect,
+                    scaleToBounds=scaleToBounds)
+    else:
+        __UvUnwrapByOps(object,
+                        type,
+                        fitIndex=fitIndex,
+                        cubesize=cubesize,
+                        correctAspect=correctAspect,
+                        scaleToBounds=scaleToBounds,
+                        remainSelect=remainSelect,
+                        onlyActiveMat=onlyActiveMat)
 
     # 拉伸UV，参考以下：
     # https://blender.stackexchange.com/questions/75061/scale-uv-map-script
@@ -315,6 +539,7 @@ def __copyMaterial(fromObj:bpy.types.Object,
                  toObj:bpy.types.Object,
                  single=False):
     if toObj.type in ('MESH','CURVE'):
+        utils.trackData(*toObj.data.materials)
         toObj.data.materials.clear()
         for mat in fromObj.data.materials:
             if single:
@@ -541,7 +766,7 @@ def __setPillerHead(pillerObj:bpy.types.Object,
         utils.shaderSmooth(part)
     # 移除原有的柱身，并将柱名称让给新对象
     pillerName = pillerObj.name
-    bpy.data.objects.remove(pillerObj)
+    utils.delObject(pillerObj)
     # 柱身、柱头合并
     newPiller = utils.joinObjects(pillerParts,pillerName,cleanup=True)
     
@@ -782,8 +1007,10 @@ def __setDgBoard(dgBoardObj:bpy.types.Object,
             (n+0.5)*boardLength-totalLength/2)
         newDgBoard.location.y = 0
         newDgBoard.location.z = 0
-        utils.applyTransfrom(newDgBoard,use_scale=True)
+        # 连续应用多个栱垫板，循环结束后统一刷新
+        utils.applyTransfrom(newDgBoard,use_scale=True,update=False)
         newDgBoardList.append(newDgBoard)
+    utils.updateScene()
 
     # 合并栱垫板
     joinedDgBoard = utils.joinObjects(newDgBoardList)
@@ -980,30 +1207,33 @@ def __setShanhua(shanhuaObj:bpy.types.Object,
     return
 
 # 切换材质slot
+# slotMap: {原slot:新slot}，所有映射同时生效
+# 250402 改为foreach批量读写，不再逐面遍历bmesh
 def __replaceSlot(obj:bpy.types.Object,
-                  fromSlot=0,
-                  toSlot=0,):
-    bm = bmesh.new()
-    bm.from_mesh(obj.data)
-    for face in bm.faces:
-        if face.material_index == fromSlot:
-            face.material_index = toSlot
-    bm.to_mesh(obj.data)
-    bm.free()
+                  slotMap:dict):
+    if len(slotMap) == 0: return
+    me:bpy.types.Mesh = obj.data
+    matIndex = np.empty(len(me.polygons), dtype=np.int32)
+    me.polygons.foreach_get('material_index', matIndex)
+    lookup = np.arange(
+        max(matIndex.max(initial=0),max(slotMap))+1,
+        dtype=np.int32)
+    for fromSlot,toSlot in slotMap.items():
+        lookup[fromSlot] = toSlot
+    me.polygons.foreach_set('material_index', lookup[matIndex])
+    me.update()
     return
 
-# 根据琉璃瓦作配色
-# 根据用户从panel上选择的bData.tile_style，切换obj的材质slot
-# 0-黄琉璃
-# 1-黄琉璃绿剪边
-# 2-绿琉璃
-# 3-绿琉璃黄剪边
-def setGlazeStyle(paintObj:bpy.types.Object,
-                  resetUV=True):
+# 计算琉璃对象的材质slot映射
+# 返回slotMap{原slot:新slot}，和切换后的active_material_index
+# 250402 从setGlazeStyle拆分，以便瓦片等批量构件每类只计算一次
+def getGlazeSlotMap(paintObj:bpy.types.Object,
+                    bData:acaData):
     # 载入数据
     aData:tmpData = bpy.context.scene.ACA_temp
-    buildingObj,bData,objData = utils.getRoot(paintObj)
     paintName = paintObj.data.name
+    slotMap = {}
+    activeIndex = None
 
     # 1、瓦面（筒瓦/板瓦）颜色
     tileColorIndex = int(bData.tile_color) 
@@ -1014,8 +1244,8 @@ def setGlazeStyle(paintObj:bpy.types.Object,
     for obj in glazeMain:
         if obj.data.name in paintName:
             # 配色从slot0切换到slot1
-            __replaceSlot(paintObj,0,tileColorIndex)
-            paintObj.active_material_index = tileColorIndex
+            slotMap[0] = tileColorIndex
+            activeIndex = tileColorIndex
 
     # 2、剪边/屋脊的颜色
     # 2.1、单一材质
@@ -1041,9 +1271,8 @@ def setGlazeStyle(paintObj:bpy.types.Object,
     for obj in glazeList1:
         if obj.data.name in paintName:
             # 配色从slot0切换到slot1
-            __replaceSlot(
-                paintObj,0,tileAltColorIndex)
-            paintObj.active_material_index = tileAltColorIndex
+            slotMap[0] = tileAltColorIndex
+            activeIndex = tileAltColorIndex
     # 2.2、两个材质
     glazeList2 = [
         aData.dripTile_source,      # 滴水
@@ -1054,11 +1283,28 @@ def setGlazeStyle(paintObj:bpy.types.Object,
     for obj in glazeList2:
         if obj.data.name in paintName:
             # 两个材质切换到绿色
-            __replaceSlot(
-                paintObj,0,tileAltColorIndex*2)
-            __replaceSlot(
-                paintObj,1,tileAltColorIndex*2+1)
-            paintObj.active_material_index = tileAltColorIndex*2
+            slotMap[0] = tileAltColorIndex*2
+            slotMap[1] = tileAltColorIndex*2+1
+            activeIndex = tileAltColorIndex*2
+
+    return slotMap,activeIndex
+
+# 根据琉璃瓦作配色
+# 根据用户从panel上选择的bData.tile_style，切换obj的材质slot
+# 0-黄琉璃
+# 1-黄琉璃绿剪边
+# 2-绿琉璃
+# 3-绿琉璃黄剪边
+# 250402 可直接传入bData，瓦片的源对象尚未绑定到建筑时使用
+def setGlazeStyle(paintObj:bpy.types.Object,
+                  resetUV=True,
+                  bData:acaData=None):
+    if bData == None:
+        buildingObj,bData,objData = utils.getRoot(paintObj)
+    slotMap,activeIndex = getGlazeSlotMap(paintObj,bData)
+    __replaceSlot(paintObj,slotMap)
+    if activeIndex != None:
+        paintObj.active_material_index = activeIndex
 
     # 重新展UV，在modifier的基础上平铺
     if resetUV:
@@ -0,0 +1,89 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   瓦件预处理缓存
+#   瓦件资源按斗口缩放、应用修改器、设置琉璃颜色后缓存，供各瓦面、院墙复用
+#   以(资源对象,斗口,琉璃颜色)为键，最久未使用的先淘汰
+#   重新载入资源时清空
+import bpy
+from collections import OrderedDict
+
+from .const import ACA_Consts as con
+from .data import ACA_data_obj as acaData
+from . import utils
+from . import texture as mat
+
+# 缓存的瓦件数量上限
+MAX_ITEMS = 16
+# 缓存对象的名称后缀
+CACHE_SUFFIX = '.瓦件缓存'
+
+# {键:缓存对象名称}，按使用顺序排列，最近使用的在最后
+# 缓存对象不链接到场景，记录名称而非对象引用，以免撤销后引用失效
+__cache = OrderedDict()
+
+# 生成缓存的键
+# glaze为False时不设置琉璃颜色（如院墙）
+def __getKey(sourceObj:bpy.types.Object,
+             bData:acaData,
+             glaze):
+    glazeKey = None
+    if glaze:
+        glazeKey = (bData.tile_color,bData.tile_alt_color)
+    return (sourceObj.name,round(bData.DK,6),glazeKey)
+
+# 预处理瓦件：复制资源，按斗口缩放，应用修改器，设置琉璃
+def __prepare(sourceObj:bpy.types.Object,
+              bData:acaData,
+              glaze):
+    tileObj:bpy.types.Object = utils.copySimplyObject(
+        sourceObj,
+        name=sourceObj.name + CACHE_SUFFIX,
+        singleUser=True)
+    # 根据斗口调整尺度
+    utils.resizeObj(tileObj,bData.DK / con.DEFAULT_DK)
+    utils.applyTransfrom(tileObj,use_scale=True)
+    # 应用所有的modifier，以免后续快速合并时丢失
+    utils.applyAllModifer(tileObj)
+    # 琉璃颜色和UV在缓存对象上一次性设置
+    if glaze:
+        mat.setGlazeStyle(tileObj,bData=bData)
+    # 修改器的应用、UV的展开都需要对象在场景中，完成后移出场景
+    for coll in tileObj.users_collection:
+        coll.objects.unlink(tileObj)
+    return tileObj
+
+# 获取预处理后的瓦件
+# 返回的对象不在场景中，仅用作复制和批量写入的源对象，不要修改
+def getTile(sourceObj:bpy.types.Object,
+            bData:acaData,
+            glaze=True):
+    key = __getKey(sourceObj,bData,glaze)
+    objName = __cache.get(key)
+    if objName != None:
+        tileObj = bpy.data.objects.get(objName)
+        # 缓存对象可能被清理孤立数据时删除
+        if tileObj != None:
+            __cache.move_to_end(key)
+            return tileObj
+        del __cache[key]
+
+    tileObj = __prepare(sourceObj,bData,glaze)
+    __cache[key] = tileObj.name
+    while len(__cache) > MAX_ITEMS:
+        __evict(next(iter(__cache)))
+    return tileObj
+
+# 淘汰一个缓存的瓦件
+def __evict(key):
+    objName = __cache.pop(key)
+    tileObj = bpy.data.objects.get(objName)
+    if tileObj != None:
+        utils.delObject(tileObj)
+    return
+
+# 清空缓存，在重新载入资源时调用
+def clear():
+    for key in list(__cache.keys()):
+        __evict(key)
+    return
@@ -0,0 +1,117 @@
+# 作者：willimxp
+# 所属插件：ACA Builder
+# 功能概述：
+#   营造过程的结构化追踪
+#   每次营造记录为一棵阶段树，每个阶段记录耗时、对象数的变化、网格顶点数的变化
+#   不扫描bpy.data：对象数取len(bpy.data.objects)，
+#   顶点数由utils中新建/合并网格的工具函数通过addVerts累计，为近似值
+#   保留最近若干次营造记录，在面板中展示，并可导出为json
+import bpy
+import time
+import json
+from contextlib import contextmanager
+
+# 保留的营造记录数量
+MAX_HISTORY = 10
+
+# 最近的营造记录，最新的在最后
+history = []
+# 当前营造中尚未结束的阶段栈，栈底为本次营造的根节点
+__stack = []
+# 累计的网格顶点数，由addVerts更新
+__vertCount = 0
+
+# 登记新增（或删除，count为负）的网格顶点数
+# 由新建、合并网格的工具函数调用，开销仅为一次加法
+def addVerts(count):
+    global __vertCount
+    __vertCount += count
+    return
+
+# 新建一个阶段节点
+def __newSpan(name):
+    return {
+        'name' : name,
+        'start' : time.time(),
+        'seconds' : 0.0,
+        'objects' : 0,
+        'verts' : 0,
+        'children' : [],
+        '_objects' : len(bpy.data.objects),
+        '_verts' : __vertCount,
+    }
+
+# 结束一个阶段节点，计算与开始时的差值
+def __closeSpan(span):
+    span['seconds'] = round(time.time() - span['start'],4)
+    span['objects'] = len(bpy.data.objects) - span.pop('_objects')
+    span['verts'] = __vertCount - span.pop('_verts')
+    return span
+
+# 是否正在追踪中
+def isTracing():
+    return len(__stack) > 0
+
+# 开始一次营造的追踪
+# 已在追踪中时（如嵌套调用fastRun），作为子阶段处理
+def beginBuild(name):
+    span = __newSpan(name)
+    if isTracing():
+        __stack[-1]['children'].append(span)
+    __stack.append(span)
+    return span
+
+# 结束当前营造的追踪，写入历史记录
+def endBuild(status='FINISHED'):
+    if not isTracing():
+        return None
+    span = __closeSpan(__stack.pop())
+    span['status'] = status
+    if not isTracing():
+        history.append(span)
+        del history[:-MAX_HISTORY]
+    return span
+
+# 追踪一个营造阶段，可嵌套
+# 用法：with tracer.span('dougong'): ...
+# 未开始营造追踪时，不做任何记录
+@contextmanager
+def span(name):
+    if not isTracing():
+        yield None
+        return
+    node = __newSpan(name)
+    __stack[-1]['children'].append(node)
+    __stack.append(node)
+    try:
+        yield node
+    finally:
+        # 异常时，栈中可能残留更深的节点，一并关闭
+        while __stack:
+            closed = __closeSpan(__stack.pop())
+            if closed is node: break
+
+# 获取最近一次的营造记录
+def getLastBuild():
+    if len(history) == 0:
+        return None
+    return history[-1]
+
+# 清空营造记录
+def clearHistory():
+    history.clear()
+    return
+
+# 将阶段树展开为列表，便于界面逐行显示
+# 返回[(depth,span),...]
+def flatten(span,depth=0):
+    rows = [(depth,span)]
+    for child in span['children']:
+        rows += flatten(child,depth+1)
+    return rows
+
+# 导出营造记录到json文件
+def exportJSON(filepath):
+    with open(filepath,'w',encoding='utf-8') as f:
+        json.dump(history,f,ensure_ascii=False,indent=2)
+    return filepath
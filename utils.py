@@ -8,12 +8,15 @@ import bmesh
 import math
 import logging
 import traceback
-from mathutils import Vector,Euler,Matrix,geometry
+from mathutils import Vector,Euler,Matrix,geometry,kdtree
+from bpy.app.handlers import persistent
 import numpy as np
 import time
+import hashlib
 from typing import List
 
 from . import data
+from . import tracer
 from .const import ACA_Consts as con
 
 # 获取console窗口的context
@@ -73,6 +76,11 @@ def popMessageBox(message = "", icon = 'INFO'):
     logger = logging.getLogger('ACA')
     logger.info(message)
 
+    # 后台模式（blender -b）没有窗口，仅输出到控制台
+    if bpy.app.background:
+        print(message)
+        return
+
     bpy.ops.aca.show_message_box('INVOKE_DEFAULT', 
         message=message, 
         icon=icon, 
@@ -142,6 +150,10 @@ def focusCollByObj(obj:bpy.types.Object):
     parentColl = obj.users_collection[0].name
     focusCollection(parentColl)
 
+# 250402 本次营造中聚焦过的目录名称（不含根目录），None表示不在营造中
+# 营造结束后仅在这些目录（含子目录）中查找新建的对象
+buildCollections = None
+
 # 新建或聚焦当前场景下的目录
 # 所有对象建立在插件目录下，以免与用户自建的内容冲突
 def setCollection(name:str, 
@@ -181,15 +193,29 @@ def setCollection(name:str,
         if IsClear:
             # 清空collection，每次重绘
             for obj in coll.objects: 
-                bpy.data.objects.remove(obj)
+                delObject(obj)
         # 选中目录，防止用户手工选择其他目录而导致的失焦
         focusCollection(coll_name)
     
     if colorTag != None:
         coll.color_tag = 'COLOR_0' + str(colorTag)
+    # 登记营造中使用的目录，根目录包含所有建筑，不登记
+    if not isRoot and buildCollections != None:
+        buildCollections.add(coll.name)
     # 返回目录的对象
     return coll
 
+# 获取对象的网格顶点数，非mesh对象返回0
+def __getVertCount(object:bpy.types.Object):
+    if object.type != 'MESH':
+        return 0
+    return len(object.data.vertices)
+
+# 登记对象网格的顶点数，用于营造追踪
+def __traceVerts(object:bpy.types.Object):
+    tracer.addVerts(__getVertCount(object))
+    return
+
 # 复制简单对象（仅复制instance）
 def copySimplyObject(
         sourceObj:bpy.types.Object, 
@@ -206,6 +232,7 @@ def copySimplyObject(
     newObj:bpy.types.Object = sourceObj.copy()
     if singleUser :
         newObj.data = sourceObj.data.copy()
+        __traceVerts(newObj)
     bpy.context.collection.objects.link(newObj)  
     if name == None:
         newObj.name = sourceObj.name
@@ -248,6 +275,7 @@ def copyObject(
     newObj:bpy.types.Object = sourceObj.copy()
     if singleUser :
         newObj.data = sourceObj.data.copy()
+        __traceVerts(newObj)
     bpy.context.collection.objects.link(newObj) 
     if name == None:
         newObj.name = sourceObj.name
@@ -298,6 +326,21 @@ def getAcaSibling(object:bpy.types.Object,
 # 如，根据台基对象，找到对应的柱网对象
 def getAcaChild(object:bpy.types.Object,
                   acaObj_type:str) -> bpy.types.Object:
+    # 250402 各层根节点优先从索引中查找
+    isIndexed = acaObj_type in ACA_INDEX_TYPES
+    if isIndexed:
+        child = __lookupAcaChild(object,acaObj_type)
+        if child != None:
+            return child
+
+    child = __findAcaChild(object,acaObj_type)
+    if isIndexed and child != None:
+        registerAcaChild(object,child)
+    return child
+
+# 递归遍历子树，查找对象类型
+def __findAcaChild(object:bpy.types.Object,
+                  acaObj_type:str) -> bpy.types.Object:
     children = object.children
     child = None
     for obj in children:
@@ -306,11 +349,94 @@ def getAcaChild(object:bpy.types.Object,
             break # 如果找到，直接停止
         # 递归，深挖下一级子节点
         if len(obj.children) > 0:
-            child = getAcaChild(obj,acaObj_type)
+            child = __findAcaChild(obj,acaObj_type)
             if child != None: break
             
     return child
 
+# 250402 建筑构件索引
+# 以建筑根节点为单位，记录aca_type到对象的映射，避免每次递归遍历子树
+# 仅索引各层的根节点，每个建筑中唯一
+# 结构为{建筑指针:{aca_type:对象}}
+ACA_INDEX_TYPES = (
+    con.ACA_TYPE_FLOOR_ROOT,
+    con.ACA_TYPE_BASE_ROOT,
+    con.ACA_TYPE_WALL_ROOT,
+    con.ACA_TYPE_ROOF_ROOT,
+    con.ACA_TYPE_DG_ROOT,
+    con.ACA_TYPE_BEAM_ROOT,
+    con.ACA_TYPE_RAFTER_ROOT,
+    con.ACA_TYPE_TILE_ROOT,
+)
+acaChildIndex = {}
+
+# 登记建筑中的根节点，在新建根节点时调用
+def registerAcaChild(buildingObj:bpy.types.Object,
+                     childObj:bpy.types.Object):
+    acaType = childObj.ACA_data.aca_type
+    if acaType not in ACA_INDEX_TYPES:
+        return
+    index = acaChildIndex.setdefault(buildingObj.as_pointer(),{})
+    index[acaType] = childObj
+    return
+
+# 从索引中查找，惰性校验
+# 对象已被删除、类型已修改、或已不在该建筑下时，删除该条索引
+def __lookupAcaChild(object:bpy.types.Object,
+                     acaObj_type:str) -> bpy.types.Object:
+    index = acaChildIndex.get(object.as_pointer())
+    if index == None:
+        return None
+    child = index.get(acaObj_type)
+    if child == None:
+        return None
+    try:
+        isValid = (child.ACA_data.aca_type == acaObj_type
+                   and __isDescendant(child,object))
+    except ReferenceError:
+        isValid = False
+    if not isValid:
+        del index[acaObj_type]
+        return None
+    return child
+
+# 判断对象是否在父节点的子树中
+def __isDescendant(object:bpy.types.Object,
+                   parentObj:bpy.types.Object):
+    parent = object.parent
+    while parent != None:
+        if parent == parentObj:
+            return True
+        parent = parent.parent
+    return False
+
+# 从索引中移除已删除的对象
+def __unregisterAcaChildren(pointers:set):
+    for key in pointers:
+        rootCache.pop(key,None)
+    for key in list(acaChildIndex.keys()):
+        if key in pointers:
+            del acaChildIndex[key]
+            continue
+        index = acaChildIndex[key]
+        for acaType in list(index.keys()):
+            try:
+                isDeleted = index[acaType].as_pointer() in pointers
+            except ReferenceError:
+                isDeleted = True
+            if isDeleted:
+                del index[acaType]
+    return
+
+# 清空构件索引和根节点缓存
+# 打开文件、撤销/重做后，对象会被重新分配，原指针可能被复用，缓存的对象引用失效
+# 由__init__中注册的load_post/undo_post/redo_post回调调用
+@persistent
+def clearAcaCache(*args):
+    acaChildIndex.clear()
+    rootCache.clear()
+    return
+
 # 递归查找父节点，输入对象类型
 def getAcaParent(object:bpy.types.Object,
                     acaObj_type:str) -> bpy.types.Object:
@@ -338,10 +464,12 @@ def applyScale(object:bpy.types.Object):
         isolate_users=True) # apply多用户对象时可能失败，所以要加上这个强制单用户
 
 # 应用缩放、旋转、位置
+# update：是否立即刷新场景，连续应用多个对象时，可仅在最后一次刷新
 def applyTransfrom(ob, 
                     use_location=False, 
                     use_rotation=False, 
-                    use_scale=False):
+                    use_scale=False,
+                    update=True):
     mb = ob.matrix_basis
     I = Matrix()
     loc, rot, scale = mb.decompose()
@@ -367,6 +495,9 @@ def applyTransfrom(ob,
         swap(2)
         
     M = transform[0] @ transform[1] @ transform[2]
+    # 250402 无需应用的变换（如缩放已为1），跳过数据修改和场景刷新
+    if M == I:
+        return
     if hasattr(ob.data, "transform"):
         ob.data.transform(M)
     for c in ob.children:
@@ -374,7 +505,8 @@ def applyTransfrom(ob,
         
     ob.matrix_basis = basis[0] @ basis[1] @ basis[2]
     # 强制一次刷新，以便对象的dimension能够准确应用
-    updateScene()
+    if update:
+        updateScene()
 
 # 强制聚焦到对象
 def focusObj(object:bpy.types.Object):
@@ -407,8 +539,11 @@ def deleteHierarchy(parent_obj:bpy.types.Object,del_parent=False):
         names.add(parent_obj.name)
     objects = bpy.data.objects
     if names:
+        # 同步清理构件索引
+        __unregisterAcaChildren(
+            set(objects[name].as_pointer() for name in names))
         for child_name in names:
-            bpy.data.objects.remove(objects[child_name])
+            delObject(objects[child_name])
 
     delOrphan()
     # 数据清理
@@ -495,6 +630,7 @@ def addCube(name='Cube',
     mesh = bpy.data.meshes.new(name)
     mesh.from_pydata(vertices, [], faces)
     mesh.update()
+    tracer.addVerts(len(vertices))
     
     # 当以上的面数组顺序调整正确后，就没有出现错误的面朝向了
     # # 重新计算Normal
@@ -589,6 +725,8 @@ def getMeshDims(object):
     me = object.data
     if object.type == "CURVE":
         me = bpy.data.meshes.new_from_object(object)
+        # 临时mesh，登记后清理
+        trackData(me)
 
     coords = np.empty(3 * len(me.vertices))
     me.vertices.foreach_get("co", coords)
@@ -695,6 +833,7 @@ def drawHexagon(dimensions:Vector,
     bpy.context.collection.objects.link(obj) 
     bm.to_mesh(mesh)
     bm.free()
+    tracer.addVerts(len(mesh.vertices))
     obj.location = location
     if parent != None:
         obj.parent = parent
@@ -708,8 +847,24 @@ def drawHexagon(dimensions:Vector,
 # 如果函数带参数，需要用偏函数或闭包进行封装后传入
 # https://blender.stackexchange.com/questions/7358/python-performance-with-blender-operators
 def fastRun(func):
+    # 250402 结构化追踪，记录本次营造的各阶段
+    traceName = getattr(func,'func',func).__name__
+    tracer.beginBuild(traceName)
+
     # 清理垃圾数据
     delOrphan()
+    # 记录水位，以便结束后仅处理本次新建的对象
+    watermark = getSessionWatermark()
+    # 记录本次营造使用的目录，嵌套调用时并入外层
+    global buildCollections
+    outerCollections = buildCollections
+    buildCollections = set()
+    # 当前活动目录（如合并、导出等不切换目录的操作），根目录和场景目录除外
+    activeColl = bpy.context.collection
+    if (activeColl != None
+            and activeColl != bpy.context.scene.collection
+            and activeColl.name.find(con.ROOT_COLL_NAME) < 0):
+        buildCollections.add(activeColl.name)
     
     # 关闭viewlayer的刷新
     from bpy.ops import _BPyOpsSubModOp
@@ -719,7 +874,7 @@ def fastRun(func):
     try:
         _BPyOpsSubModOp._view_layer_update = dummy_view_layer_update
         result = func()
-        outputMsg("执行成功-------------------------")
+        outputMsg("执行成功-------------------------",force=True)
     except Exception as e:
         # 输出到console
         print(e)
@@ -733,21 +888,48 @@ def fastRun(func):
                 + "”|请联系开发者，并提供日志文件")
         popMessageBox(message)
 
+        tracer.endBuild(status='CANCELLED')
+
         # 返回给上层调用
         return {'CANCELLED':e}
     finally:
         _BPyOpsSubModOp._view_layer_update = view_layer_update
+        collNames = buildCollections
+        buildCollections = outerCollections
+        if outerCollections != None:
+            outerCollections.update(collNames)
     
-    # 清理重复的材质
-    cleanDupMat()
-    
-    # 再次清理数据
-    delOrphan()
+    with tracer.span('cleanup'):
+        # 清理重复的材质，仅处理本次营造新建的对象
+        cleanDupMat(getNewObjects(watermark,collNames),
+                    byContent=con.MAT_DEDUP_BY_CONTENT)
+        
+        # 再次清理数据
+        delOrphan()
 
+    tracer.endBuild()
     return result
 
+# 250402 进度刷新节流
+# 每次刷新界面都需要完整的depsgraph求值，间隔内的消息合并，仅更新状态文字
+# 后台运行（如批量营造）时不刷新界面
+progressInterval = con.PROGRESS_INTERVAL
+lastRedrawTime = 0.0
+
+# 判断是否需要刷新界面，force为True时忽略间隔
+def __needRedraw(force=False):
+    global lastRedrawTime
+    if bpy.app.background:
+        return False
+    now = time.time()
+    if not force and now - lastRedrawTime < progressInterval:
+        return False
+    lastRedrawTime = now
+    return True
+
 # 格式化输出内容
-def outputMsg(msg:str):
+# force：忽略刷新间隔，立即刷新界面
+def outputMsg(msg:str,force=False):
     # 打印到python console中
     # 拼接毫秒部分
     timestamp = time.time()
@@ -774,7 +956,9 @@ def outputMsg(msg:str):
     else:
         build.progress += 0.01
     
-    # 界面刷新
+    # 界面刷新，按间隔节流
+    if not __needRedraw(force):
+        return
     try:
         #console_print(strout)
         redrawViewport()
@@ -832,6 +1016,7 @@ def addCylinder(radius=0.5,
     cylinderObj = bpy.context.object
     cylinderObj.name = name
     cylinderObj.data.name = name
+    __traceVerts(cylinderObj)
     cylinderObj.parent = root_obj
     cylinderObj.ACA_data.aca_obj = True
     shaderSmooth(cylinderObj)
@@ -952,7 +1137,10 @@ def applyAllModifer(object:bpy.types.Object):
     if (len(object.modifiers) > 0
         or object.type != 'MESH'):
         focusObj(object)
+        trackObjectData(object)
+        before = __getVertCount(object)
         bpy.ops.object.convert(target='MESH')
+        tracer.addVerts(__getVertCount(object) - before)
 
 # 翻转对象的normal
 def flipNormal(object:bpy.types.Object):
@@ -968,6 +1156,7 @@ def flipNormal(object:bpy.types.Object):
     return object
 
 # 基于面的裁切
+# pStart,pEnd,pCut均为世界坐标
 def addBisect(object:bpy.types.Object,
               pStart=Vector((0,0,0)),
               pEnd=Vector((0,0,0)),
@@ -976,9 +1165,18 @@ def addBisect(object:bpy.types.Object,
               clear_inner=False,
               direction  = 'Z',
               use_fill = True)    :
-    focusObj(object)
-    # 将对象的mesh数据single化，避免影响场景中其他对象
-    object.data = object.data.copy()
+    bisect_normal = getBisectNormal(pStart,pEnd,direction)
+    addBisectBatch(
+        [(object,pCut,bisect_normal)],
+        clear_outer=clear_outer,
+        clear_inner=clear_inner,
+        use_fill=use_fill)
+    return
+
+# 计算裁切面的法线
+def getBisectNormal(pStart=Vector((0,0,0)),
+                    pEnd=Vector((0,0,0)),
+                    direction='Z'):
     if direction == 'Z':
         # 1、计算剪切平面，先将由戗投影到XY平面，再沿Z轴旋转90度
         pstart_project = Vector((pStart.x,pStart.y,0))
@@ -1002,22 +1200,99 @@ def addBisect(object:bpy.types.Object,
         # 实际的需求就是做水平横切，所以强制把normal置为Z轴方向
         bisect_normal = Vector((0,0,-1))
     bisect_normal = Vector(bisect_normal).normalized() # normal必须normalized,注意不是normalize
+    return bisect_normal
+
+# 250402 批量裁切，直接在mesh数据上用bmesh.ops.bisect_plane完成
+# 不再切换选择和编辑模式，同一对象的多个裁切面在一次bmesh中完成
+# bisectList：[(对象,裁切点,裁切面法线),...]，坐标均为世界坐标
+def addBisectBatch(bisectList,
+                   clear_outer=False,
+                   clear_inner=False,
+                   use_fill=True):
+    # 按对象分组，保持裁切顺序
+    planeMap = {}
+    for object,pCut,normal in bisectList:
+        planeMap.setdefault(object.as_pointer(),(object,[]))[1].append(
+            (Vector(pCut),Vector(normal).normalized()))
+
+    # 刷新depsgraph，以免刚移动过的对象matrix_world尚未更新
+    # 原convert会隐式刷新，无修改器的mesh已不再调用convert
+    updateScene()
 
-    # 2、选中并裁切
-    bpy.ops.object.convert(target='MESH')
-    bpy.ops.object.editmode_toggle()
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.mesh.bisect(
-        plane_co=pCut, 
-        plane_no=bisect_normal, 
-        clear_outer=clear_outer,
-        clear_inner=clear_inner,
-        use_fill=use_fill
-    )
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.editmode_toggle()  
-    # 250124 之前这里将对象做了平面化，为什么？没有理解，先注释掉观察看看
-    # bpy.ops.object.shade_flat()
+    for object,planes in planeMap.values():
+        # 应用修改器，并转换为mesh
+        __applyModifierData(object)
+        # 将对象的mesh数据single化，避免影响场景中其他对象
+        if object.data.users > 1:
+            object.data = object.data.copy()
+        mesh:bpy.types.Mesh = object.data
+
+        # 裁切面转换到对象的局部坐标
+        matrix = object.matrix_world
+        matrixInv = matrix.inverted()
+        matrixNormal = matrix.to_3x3().transposed()
+
+        bm = bmesh.new()
+        bm.from_mesh(mesh)
+        for pCut,normal in planes:
+            planeCo = matrixInv @ pCut
+            planeNo = (matrixNormal @ normal).normalized()
+            result = bmesh.ops.bisect_plane(
+                bm,
+                geom=bm.verts[:]+bm.edges[:]+bm.faces[:],
+                dist=0.0001,
+                plane_co=planeCo,
+                plane_no=planeNo,
+                clear_outer=clear_outer,
+                clear_inner=clear_inner,
+            )
+            # 与mesh.bisect一致，用切口的边补面
+            if use_fill:
+                cutEdges = [ele for ele in result['geom_cut']
+                            if isinstance(ele,bmesh.types.BMEdge)]
+                if len(cutEdges) > 0:
+                    fill = bmesh.ops.triangle_fill(
+                        bm,
+                        use_beauty=True,
+                        use_dissolve=True,
+                        edges=cutEdges,
+                        normal=planeNo)
+                    fillFaces = [ele for ele in fill['geom']
+                                 if isinstance(ele,bmesh.types.BMFace)]
+                    bmesh.ops.face_attribute_fill(
+                        bm,
+                        faces=fillFaces,
+                        use_normals=True,
+                        use_data=True)
+        bm.to_mesh(mesh)
+        bm.free()
+        mesh.update()
+    return
+
+# 在数据层面应用对象的修改器，效果同object.convert
+# 非mesh对象（如curve）仍需调用convert
+def __applyModifierData(object:bpy.types.Object):
+    if len(object.modifiers) == 0 and object.type == 'MESH':
+        return
+    # 隐藏的对象不参与depsgraph求值，也回退到convert
+    if object.type != 'MESH' or not object.visible_get():
+        applyAllModifer(object)
+        return
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    objEval = object.evaluated_get(depsgraph)
+    newMesh = bpy.data.meshes.new_from_object(
+        objEval,
+        preserve_all_data_layers=True,
+        depsgraph=depsgraph)
+    trackObjectData(object)
+    # 先释放原数据的名称，以免新数据被添加.001后缀
+    meshName = object.data.name
+    object.data.name += '.backup'
+    newMesh.name = meshName
+    object.modifiers.clear()
+    tracer.addVerts(len(newMesh.vertices) - len(object.data.vertices))
+    object.data = newMesh
+    return
 
 # 寻找对象最外侧（远离原点）的面的中心点
 # 注意，返回的坐标基于root_obj为parent的local坐标系
@@ -1153,6 +1428,9 @@ def updateScene():
 # 刷新viewport，避免长时间卡死，并可见到建造过程
 def redrawViewport():
     updateScene()
+    # 250402 后台运行时没有窗口，无需刷新
+    if bpy.app.background:
+        return
 
     # 设置窗口视角
     lockView = bpy.context.scene.ACA_data.is_auto_viewall
@@ -1184,32 +1462,81 @@ def redrawViewport():
     if do:
         bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
 
+# 250402 定向清理无用数据
+# 原先每次都用orphans_purge扫描整个文件，场景中建筑越多越慢
+# 改为由营造过程登记可能成为孤立数据的mesh、curve、材质等，
+# 清理时仅检查这些登记过的数据，代价与重建的部分成正比
+# 登记表，以数据指针为键，避免重复登记
+orphanCandidates = {}
+
+# 登记可能成为孤立数据的datablock
+def trackData(*datablocks):
+    for datablock in datablocks:
+        if datablock == None: continue
+        try:
+            orphanCandidates[datablock.as_pointer()] = datablock
+        except ReferenceError:
+            continue
+    return
+
+# 登记对象引用的数据，在删除对象、替换对象数据之前调用
+# 包括mesh/curve数据、材质、几何节点组
+def trackObjectData(object:bpy.types.Object):
+    try:
+        trackData(object.data)
+        for slot in object.material_slots:
+            trackData(slot.material)
+        for mod in object.modifiers:
+            if mod.type == 'NODES':
+                trackData(mod.node_group)
+    except ReferenceError:
+        pass
+    return
+
+# 被删除的数据所引用的子数据，可能随之成为孤立数据
+def __getSubData(datablock):
+    subData = []
+    if isinstance(datablock,(bpy.types.Mesh,bpy.types.Curve)):
+        subData += [mat for mat in datablock.materials if mat != None]
+    return subData
+
 # 删除所有无用数据，以免拖累性能
+# 仅检查登记过的数据，用户数为0的批量删除
+# 删除后其引用的材质等可能也变为孤立数据，循环处理直到没有可删除的数据
 def delOrphan():
+    global orphanCandidates
+    candidates = orphanCandidates
+    orphanCandidates = {}
+    while len(candidates) > 0:
+        removeList = []
+        nextCandidates = {}
+        for datablock in candidates.values():
+            try:
+                if (datablock.users > 0
+                        or datablock.use_fake_user
+                        or datablock.library != None):
+                    continue
+                for subData in __getSubData(datablock):
+                    nextCandidates[subData.as_pointer()] = subData
+            except ReferenceError:
+                # 已被其他途径删除
+                continue
+            removeList.append(datablock)
+        if len(removeList) == 0:
+            break
+        bpy.data.batch_remove(removeList)
+        candidates = nextCandidates
+    return
+
+# 全量清理无用数据，扫描整个文件
+# 仅用于手工清理，营造过程中请使用delOrphan
+def purgeOrphan():
+    orphanCandidates.clear()
     bpy.ops.outliner.orphans_purge(
                 do_local_ids=True, 
                 do_linked_ids=True, 
                 do_recursive=True)
-    
-    # for block in bpy.data.collections:
-    #     if block.users == 0:
-    #         bpy.data.collections.remove(block)
-
-    # for block in bpy.data.objects:
-    #     if block.users == 0:
-    #         bpy.data.objects.remove(block)
-    
-    # for block in bpy.data.meshes:
-    #     if block.users == 0:
-    #         bpy.data.meshes.remove(block)
-    
-    # for block in bpy.data.curves:
-    #     if block.users == 0:
-    #         bpy.data.curves.remove(block)
-
-    # for block in bpy.data.materials:
-    #     if block.users == 0:
-    #         bpy.data.materials.remove(block)
+    return
 
     # for block in bpy.data.textures:
     #     if block.users == 0:
@@ -1349,7 +1676,7 @@ def addBezierByPoints(
         bevel_object.parent = root_obj
         # 设置大小
         bevel_object.scale = (width,height,0)
-        applyTransfrom(bevel_object,use_scale=True)
+        applyTransfrom(bevel_object,use_scale=True,update=False)
         updateScene()
         # 移动origin
         bpy.ops.object.mode_set(mode = 'EDIT')
@@ -1358,7 +1685,7 @@ def addBezierByPoints(
         bpy.ops.object.mode_set(mode = 'OBJECT')    
 
         # 将Plane Mesh转换为Curve，才能绑定到curve上
-        
+        trackObjectData(bevel_object)
         bpy.ops.object.convert(target='CURVE')
         # 翻转curve，否则会导致连檐的face朝向不对
         bpy.ops.object.editmode_toggle()
@@ -1461,6 +1788,7 @@ def addCurveByPoints(CurvePoints,
         bevel_object.parent = root_obj
         # 将Plane Mesh转换为Curve，才能绑定到curve上
         applyTransfrom(bevel_object,use_scale=True)
+        trackObjectData(bevel_object)
         bpy.ops.object.convert(target='CURVE')
         # 翻转curve，否则会导致连檐的face朝向不对
         bpy.ops.object.editmode_toggle()
@@ -1527,6 +1855,230 @@ def setGN_Input(mod:bpy.types.NodesModifier,
     mod[id] = value
     return
 
+# 读取mesh的几何数组
+# 使用foreach_get批量读取，避免逐个顶点/面的python循环
+# 返回dict，包括顶点坐标、loop顶点索引、面的loop起点、材质索引、平滑标识、UV、边
+# mesh：读取的mesh数据，默认为对象自身的mesh，也可传入求值后的mesh
+def getMeshArrays(object:bpy.types.Object,
+                  mesh:bpy.types.Mesh=None):
+    me:bpy.types.Mesh = object.data if mesh == None else mesh
+    vCount = len(me.vertices)
+    eCount = len(me.edges)
+    lCount = len(me.loops)
+    pCount = len(me.polygons)
+
+    co = np.empty(vCount*3, dtype=np.float32)
+    me.vertices.foreach_get('co', co)
+    edges = np.empty(eCount*2, dtype=np.int32)
+    me.edges.foreach_get('vertices', edges)
+    loopVerts = np.empty(lCount, dtype=np.int32)
+    me.loops.foreach_get('vertex_index', loopVerts)
+    loopEdges = np.empty(lCount, dtype=np.int32)
+    me.loops.foreach_get('edge_index', loopEdges)
+    loopStart = np.empty(pCount, dtype=np.int32)
+    me.polygons.foreach_get('loop_start', loopStart)
+    matIndex = np.empty(pCount, dtype=np.int32)
+    me.polygons.foreach_get('material_index', matIndex)
+    smooth = np.empty(pCount, dtype=bool)
+    me.polygons.foreach_get('use_smooth', smooth)
+    uv = None
+    if me.uv_layers.active != None:
+        uv = np.empty(lCount*2, dtype=np.float32)
+        me.uv_layers.active.data.foreach_get('uv', uv)
+    # 自动平滑产生的硬边
+    sharpEdge = None
+    attr = me.attributes.get('sharp_edge')
+    if attr != None and attr.domain == 'EDGE':
+        sharpEdge = np.empty(eCount, dtype=bool)
+        attr.data.foreach_get('value', sharpEdge)
+
+    return {
+        'co' : co.reshape(-1,3),
+        'edges' : edges.reshape(-1,2),
+        'loopVerts' : loopVerts,
+        'loopEdges' : loopEdges,
+        'loopStart' : loopStart,
+        'matIndex' : matIndex,
+        'smooth' : smooth,
+        'uv' : uv,
+        'sharpEdge' : sharpEdge,
+        # 以对象的材质槽为准，包括链接到对象的材质
+        'materials' : [slot.material for slot in object.material_slots],
+    }
+
+# 根据几何数组新建mesh
+# 250402 使用foreach_set一次性写入，替代逐个对象的复制与合并
+# 注意：blender 4.x中loop_total为只读，仅写入loop_start即可
+# edges/loopEdges：可选，传入时按原样写入边，以保留边上的属性（如硬边）
+def addMeshByArrays(name:str,
+                    co,
+                    loopVerts,
+                    loopStart,
+                    matIndex=None,
+                    smooth=None,
+                    uv=None,
+                    materials=None,
+                    edges=None,
+                    loopEdges=None,
+                    sharpEdge=None,
+                    ) -> bpy.types.Mesh:
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(len(co))
+    tracer.addVerts(len(co))
+    me.vertices.foreach_set('co',
+        np.ascontiguousarray(co, dtype=np.float32).ravel())
+    useEdges = edges is not None and loopEdges is not None
+    if useEdges:
+        me.edges.add(len(edges))
+        me.edges.foreach_set('vertices',
+            np.ascontiguousarray(edges, dtype=np.int32).ravel())
+    me.loops.add(len(loopVerts))
+    me.loops.foreach_set('vertex_index',
+        np.ascontiguousarray(loopVerts, dtype=np.int32))
+    if useEdges:
+        me.loops.foreach_set('edge_index',
+            np.ascontiguousarray(loopEdges, dtype=np.int32))
+    me.polygons.add(len(loopStart))
+    me.polygons.foreach_set('loop_start',
+        np.ascontiguousarray(loopStart, dtype=np.int32))
+    if materials != None:
+        for m in materials:
+            me.materials.append(m)
+    if matIndex is not None:
+        me.polygons.foreach_set('material_index',
+            np.ascontiguousarray(matIndex, dtype=np.int32))
+    if smooth is not None:
+        me.polygons.foreach_set('use_smooth',
+            np.ascontiguousarray(smooth, dtype=bool))
+    if uv is not None:
+        uvLayer = me.uv_layers.new(name='UVMap')
+        uvLayer.data.foreach_set('uv',
+            np.ascontiguousarray(uv, dtype=np.float32).ravel())
+    if useEdges and sharpEdge is not None:
+        attr = me.attributes.new('sharp_edge','BOOLEAN','EDGE')
+        attr.data.foreach_set('value',
+            np.ascontiguousarray(sharpEdge, dtype=bool))
+    me.update(calc_edges=not useEdges)
+    me.validate()
+    return me
+
+# 合并材质槽
+# 将多个mesh的材质列表合并为一个，相同材质只保留一份
+# 返回合并后的材质列表，以及每个mesh原材质槽到新材质槽的映射
+def mergeMaterialSlots(materialsList):
+    mergedMats = []
+    remapList = []
+    for materials in materialsList:
+        remap = []
+        for m in materials:
+            if m != None and m in mergedMats:
+                remap.append(mergedMats.index(m))
+            else:
+                mergedMats.append(m)
+                remap.append(len(mergedMats)-1)
+        # 防止空材质槽的mesh出现越界
+        if len(remap) == 0:
+            remap.append(0)
+        remapList.append(np.array(remap, dtype=np.int32))
+    return mergedMats,remapList
+
+# 按矩阵列表批量复制源对象，合并写入一个mesh对象
+# instanceList: [(sourceObj,[Matrix,...]),...]
+# 矩阵为相对parent的局部坐标，源对象的modifier需事先应用
+# uvCubeSize：按实例位置偏移UV，近似整体做cube投影的效果，避免每个实例贴图完全重复
+# 250402 替代海量的copySimplyObject+joinObjects，避免大量对象的创建和删除
+def addInstanceMesh(name:str,
+                    instanceList,
+                    parent:bpy.types.Object=None,
+                    uvCubeSize=None,
+                    ) -> bpy.types.Object:
+    # 读取源对象的几何数据
+    arrayList = []
+    for sourceObj,matrixList in instanceList:
+        arrayList.append(getMeshArrays(sourceObj))
+    mergedMats,remapList = mergeMaterialSlots(
+        [arrays['materials'] for arrays in arrayList])
+    # 如果有任一源对象带有UV，则所有对象都写入UV
+    useUV = any(arrays['uv'] is not None for arrays in arrayList)
+
+    coList,loopVertsList,loopStartList = [],[],[]
+    matIndexList,smoothList,uvList = [],[],[]
+    vOffset = 0
+    lOffset = 0
+    for n in range(len(instanceList)):
+        matrixList = instanceList[n][1]
+        count = len(matrixList)
+        if count == 0: continue
+        arrays = arrayList[n]
+        co = arrays['co']
+        vCount = len(co)
+        lCount = len(arrays['loopVerts'])
+
+        # 批量做矩阵变换：(K,4,4) x (N,4) -> (K,N,3)
+        mats = np.array([np.array(M) for M in matrixList],
+                        dtype=np.float64)
+        coH = np.hstack((co, np.ones((vCount,1))))
+        coNew = np.einsum('kij,nj->kni', mats, coH)[:,:,:3]
+        coList.append(coNew.reshape(-1,3))
+
+        # 索引按实例依次偏移
+        vShift = vOffset + np.arange(count, dtype=np.int32)*vCount
+        loopVertsList.append(
+            (arrays['loopVerts'][None,:] + vShift[:,None]).ravel())
+        lShift = lOffset + np.arange(count, dtype=np.int32)*lCount
+        loopStartList.append(
+            (arrays['loopStart'][None,:] + lShift[:,None]).ravel())
+
+        # 材质、平滑、UV直接平铺
+        remap = remapList[n]
+        matIndex = remap[np.clip(arrays['matIndex'],0,len(remap)-1)]
+        matIndexList.append(np.tile(matIndex, count))
+        smoothList.append(np.tile(arrays['smooth'], count))
+        if useUV:
+            uv = arrays['uv']
+            if uv is None:
+                uv = np.zeros(lCount*2, dtype=np.float32)
+            uv = np.tile(uv.reshape(-1,2), (count,1))
+            if uvCubeSize != None:
+                uvShift = mats[:,:2,3] / uvCubeSize
+                uv += np.repeat(uvShift, lCount, axis=0)
+            uvList.append(uv.ravel())
+
+        vOffset += vCount*count
+        lOffset += lCount*count
+
+    if len(coList) == 0:
+        return None
+
+    me = addMeshByArrays(
+        name=name,
+        co=np.concatenate(coList),
+        loopVerts=np.concatenate(loopVertsList),
+        loopStart=np.concatenate(loopStartList),
+        matIndex=np.concatenate(matIndexList),
+        smooth=np.concatenate(smoothList),
+        uv=np.concatenate(uvList) if useUV else None,
+        materials=mergedMats,
+    )
+    newObj = bpy.data.objects.new(name, me)
+    bpy.context.collection.objects.link(newObj)
+    if parent != None:
+        newObj.parent = parent
+    return newObj
+
+# 计算翻转面朝向时loop的新顺序
+# 负缩放的矩阵会使面的环绕方向反转，需要逆序各面的loop，效果同bmesh的normal_flip
+# 返回(顶点/UV的顺序,边的顺序)：顶点保持首个不变，其余逆序；边整体逆序
+def __getFlipLoopOrder(loopStart,lCount):
+    loopStart = np.asarray(loopStart,dtype=np.int64)
+    loopTotal = np.diff(np.append(loopStart,lCount))
+    start = np.repeat(loopStart,loopTotal)
+    total = np.repeat(loopTotal,loopTotal)
+    k = np.arange(lCount,dtype=np.int64) - start
+    vertOrder = np.where(k == 0,start,start + total - k)
+    edgeOrder = start + total - 1 - k
+    return vertOrder,edgeOrder
+
 # 合并对个对象
 # https://blender.stackexchange.com/questions/13986/how-to-join-objects-with-python
 # https://docs.blender.org/api/current/bpy.ops.html#overriding-context
@@ -1534,56 +2086,140 @@ def joinObjects(objList:List[bpy.types.Object],
                 newName=None,
                 baseObj=None,
                 cleanup=False):
-    if newName==None:
-        newName = objList[0].name
     # timeStart = time.time()
     
     # 1、选择可以合并的对象，抛弃None,empty等
-    # 与上面的循环要做分开，否则context的选择状态会打架
-    # todo：也可以用临时context来解决
-    bpy.ops.object.select_all(action='DESELECT')
+    joinList = []
     for ob in objList:
         # 不能为空对象
         if ob == None: continue
-        # 只处理实体对象，不考虑empty,camera,light等
-        if ob.type not in ('MESH','CURVE'):
-            continue
         try:
-            ob.select_set(True)
+            # 只处理实体对象，不考虑empty,camera,light等
+            if ob.type not in ('MESH','CURVE'):
+                continue
         except ReferenceError:
             # 传入的对象错误，直接忽略
             continue
-
-        # 将对象的mesh数据single化，避免影响场景中其他对象
-        if ob.data.users > 1:
-            ob.data = ob.data.copy()
-    if len(bpy.context.selected_objects) ==0:
+        if ob not in joinList:
+            joinList.append(ob)
+    if len(joinList) ==0:
         outputMsg("没有可以合并的对象")
         return None
+    if newName==None:
+        newName = joinList[0].name
 
     # 2、设置合并的Origin基准
     if baseObj == None:
-        bpy.context.view_layer.objects.active = objList[0]
-    else:
-        bpy.context.view_layer.objects.active = baseObj
-
-    # 3、应用了所有的modifier
-    bpy.ops.object.convert(target='MESH')
-    
-    # 4、合并对象
-    bpy.ops.object.join()
-    joinedObj = bpy.context.object
-    
+        baseObj = joinList[0]
+    if baseObj not in joinList:
+        joinList.insert(0,baseObj)
+    # 基准对象保留，需要为mesh对象，curve等先转换
+    if baseObj.type != 'MESH':
+        applyAllModifer(baseObj)
+
+    # 250402 在数据层面合并，替代convert+join
+    # 读取应用modifier后的几何数据，转换到基准对象的局部坐标，一次写入新mesh
+    # 3、读取各对象的几何数据（含modifier）
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    baseInv = np.array(baseObj.matrix_world.inverted(),dtype=np.float64)
+    arrayList = []
+    for ob in joinList:
+        if ob.type == 'MESH' and len(ob.modifiers) == 0:
+            arrays = getMeshArrays(ob)
+        else:
+            obEval = ob.evaluated_get(depsgraph)
+            arrays = getMeshArrays(ob,obEval.to_mesh())
+            obEval.to_mesh_clear()
+        arrays['matrix'] = baseInv @ np.array(ob.matrix_world,dtype=np.float64)
+        arrayList.append(arrays)
+
+    # 4、合并数组
+    mergedMats,remapList = mergeMaterialSlots(
+        [arrays['materials'] for arrays in arrayList])
+    useUV = any(arrays['uv'] is not None for arrays in arrayList)
+    useSharp = any(arrays['sharpEdge'] is not None for arrays in arrayList)
+    coList,edgeList,loopVertsList,loopEdgesList = [],[],[],[]
+    loopStartList,matIndexList,smoothList,uvList,sharpList = [],[],[],[],[]
+    vOffset = eOffset = lOffset = 0
+    for arrays,remap in zip(arrayList,remapList):
+        M = arrays['matrix']
+        co = arrays['co'].astype(np.float64)
+        coList.append(co @ M[:3,:3].T + M[:3,3])
+        lCount = len(arrays['loopVerts'])
+        loopVerts = arrays['loopVerts']
+        loopEdges = arrays['loopEdges']
+        uv = arrays['uv']
+        # 负缩放（如镜像的斗栱）需要翻转面朝向，否则合并后法线反向
+        if np.linalg.det(M[:3,:3]) < 0:
+            vertOrder,edgeOrder = __getFlipLoopOrder(
+                arrays['loopStart'],lCount)
+            loopVerts = loopVerts[vertOrder]
+            loopEdges = loopEdges[edgeOrder]
+            if uv is not None:
+                uv = uv.reshape(-1,2)[vertOrder].ravel()
+        edgeList.append(arrays['edges'] + vOffset)
+        loopVertsList.append(loopVerts + vOffset)
+        loopEdgesList.append(loopEdges + eOffset)
+        loopStartList.append(arrays['loopStart'] + lOffset)
+        matIndexList.append(
+            remap[np.clip(arrays['matIndex'],0,len(remap)-1)])
+        smoothList.append(arrays['smooth'])
+        eCount = len(arrays['edges'])
+        if useUV:
+            if uv is None:
+                uv = np.zeros(lCount*2, dtype=np.float32)
+            uvList.append(uv)
+        if useSharp:
+            sharp = arrays['sharpEdge']
+            if sharp is None:
+                sharp = np.zeros(eCount, dtype=bool)
+            sharpList.append(sharp)
+        vOffset += len(co)
+        eOffset += eCount
+        lOffset += lCount
+
+    # 5、写入新mesh，替换基准对象的数据
+    me = addMeshByArrays(
+        name=newName,
+        co=np.concatenate(coList),
+        loopVerts=np.concatenate(loopVertsList),
+        loopStart=np.concatenate(loopStartList),
+        matIndex=np.concatenate(matIndexList),
+        smooth=np.concatenate(smoothList),
+        uv=np.concatenate(uvList) if useUV else None,
+        materials=mergedMats,
+        edges=np.concatenate(edgeList),
+        loopEdges=np.concatenate(loopEdgesList),
+        sharpEdge=np.concatenate(sharpList) if useSharp else None,
+    )
+    # 合并顶点
+    if cleanup:
+        bm = bmesh.new()
+        bm.from_mesh(me)
+        bmesh.ops.remove_doubles(bm,verts=bm.verts,dist=0.0001)
+        bm.to_mesh(me)
+        bm.free()
+    # 合并后的网格替代了各源对象的网格
+    tracer.addVerts(len(me.vertices) - 2*vOffset)
+    trackObjectData(baseObj)
+    baseObj.modifiers.clear()
+    baseObj.data = me
+
+    # 6、删除其他对象，其子对象转交给基准对象，保持位置不变
+    removeList = [ob for ob in joinList if ob != baseObj]
+    for ob in removeList:
+        for child in ob.children:
+            if child in removeList: continue
+            matrix = child.matrix_world.copy()
+            child.parent = baseObj
+            child.matrix_world = matrix
+    for ob in removeList:
+        delObject(ob)
+
+    joinedObj = baseObj
     joinedObj.name = newName
     joinedObj.data.name = newName
 
-    # 5、合并顶点
-    if cleanup:
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action = 'SELECT')
-        bpy.ops.mesh.remove_doubles()
-        bpy.ops.object.mode_set( mode = 'OBJECT' )
-
     # 清理垃圾数据
     delOrphan()
 
@@ -1611,19 +2247,47 @@ def getRoot(object:bpy.types.Object):
             buildingObj = object
             bData = objData
         else:
-            buildingObj = getAcaParent(
-                    object,con.ACA_TYPE_BUILDING)
-            if buildingObj != None:
-                bData:data.ACA_data_obj = buildingObj.ACA_data
-            else:
+            # 250402 优先从缓存中获取，避免每次面板重绘都向上遍历
+            buildingObj = __lookupRoot(object)
+            if buildingObj == None:
+                buildingObj = getAcaParent(
+                        object,con.ACA_TYPE_BUILDING)
+            if buildingObj == None:
                 buildingObj = getAcaParent(
                     object,con.ACA_TYPE_YARDWALL
                 )
-                if buildingObj != None:
-                    bData:data.ACA_data_obj = buildingObj.ACA_data
+            if buildingObj != None:
+                bData:data.ACA_data_obj = buildingObj.ACA_data
+                rootCache[object.as_pointer()] = (
+                    object,object.parent,buildingObj)
 
     return buildingObj,bData,objData
 
+# 250402 构件到建筑根节点的缓存
+# 结构为{对象指针:(对象,父节点,建筑根节点)}
+rootCache = {}
+
+# 从缓存中查找建筑根节点，惰性校验
+# 对象或根节点已删除、对象的父节点已改变时，缓存失效
+def __lookupRoot(object:bpy.types.Object):
+    key = object.as_pointer()
+    cached = rootCache.get(key)
+    if cached == None:
+        return None
+    cachedObj,cachedParent,buildingObj = cached
+    try:
+        isValid = (cachedObj.name == object.name
+                   and object.parent == cachedParent
+                   and buildingObj.ACA_data.aca_type in (
+                       con.ACA_TYPE_BUILDING,
+                       con.ACA_TYPE_YARDWALL))
+    except ReferenceError:
+        isValid = False
+    if not isValid:
+        del rootCache[key]
+        return None
+    return buildingObj
+
 # 隐藏显示目录
 def hideLayer(context,name,isShow):
     # 查找对应的建筑根节点，以便能区分不同建筑的组件，互不干扰
@@ -1753,7 +2417,7 @@ def replaceObject(
 
     if delete:
         # 删除原对象
-        bpy.data.objects.remove(fromObj)
+        delObject(fromObj)
     else:
         # 隐藏原对象
         hideObj(fromObj)
@@ -1770,7 +2434,9 @@ def subdivideObject(object:bpy.types.Object,level=1):
     return object
 
 # 封装对象删除
+# 同时登记对象的数据，以便后续清理
 def delObject(object:bpy.types.Object):
+    trackObjectData(object)
     bpy.data.objects.remove(object)
     return
 
@@ -1803,16 +2469,87 @@ def changeParent(object:bpy.types.Object,
 
 # 清理重复的材质
 # https://blender.stackexchange.com/questions/55233/disable-material-duplication
-def cleanDupMat():
-    # 清理重复的材质
+# 250402 仅处理本次营造新建的对象，不再扫描整个场景
+# objects：待处理的对象，None时处理场景中的所有对象
+# byContent：是否按材质内容识别重复，可以合并名称不相关、但内容完全相同的材质
+def cleanDupMat(objects=None,byContent=False):
+    if objects == None:
+        objects = bpy.data.objects
     mats = bpy.data.materials
-    for obj in bpy.data.objects:
+    # 材质名称到规范材质的映射，每次清理只计算一次
+    canonicalMap = {}
+    # 材质内容哈希到规范材质的映射
+    hashMap = {}
+    for obj in objects:
         for slt in obj.material_slots:
-            part = slt.name.rpartition('.')
-            if part[2].isnumeric() and part[0] in mats:
-                slt.material = mats.get(part[0])
+            mat = slt.material
+            if mat == None: continue
+            name = mat.name
+            if name not in canonicalMap:
+                canonical = mat
+                part = name.rpartition('.')
+                if part[2].isnumeric() and part[0] in mats:
+                    canonical = mats.get(part[0])
+                if byContent:
+                    matHash = __getMatHash(canonical)
+                    canonical = hashMap.setdefault(matHash,canonical)
+                canonicalMap[name] = canonical
+            canonical = canonicalMap[name]
+            if canonical != mat:
+                # 被替换的重复材质可能成为孤立数据
+                trackData(mat)
+                slt.material = canonical
     return
 
+# 计算材质内容的哈希，用于识别名称不同但内容相同的材质
+# 比较节点类型、输入参数、贴图、连线
+def __getMatHash(mat:bpy.types.Material):
+    items = [tuple(mat.diffuse_color),mat.blend_method]
+    if mat.use_nodes and mat.node_tree != None:
+        for node in sorted(mat.node_tree.nodes,key=lambda n:n.name):
+            items.append((node.bl_idname,node.name))
+            for attr in ('image','node_tree','uv_map'):
+                value = getattr(node,attr,None)
+                if value != None:
+                    items.append(getattr(value,'name',value))
+            if getattr(node,'color_ramp',None) != None:
+                for element in node.color_ramp.elements:
+                    items.append((round(element.position,6),
+                                  tuple(element.color)))
+            for socket in node.inputs:
+                value = getattr(socket,'default_value',None)
+                if value == None or socket.is_linked: continue
+                try:
+                    value = tuple(value)
+                except TypeError:
+                    pass
+                items.append((socket.identifier,value))
+        for link in mat.node_tree.links:
+            items.append((link.from_node.name,link.from_socket.identifier,
+                          link.to_node.name,link.to_socket.identifier))
+    return hashlib.md5(repr(items).encode('utf-8')).hexdigest()
+
+# 获取会话水位，之后新建的数据，其session_uid都大于该值
+# 用于在营造结束后，识别本次营造新建的对象
+def getSessionWatermark():
+    tempMesh = bpy.data.meshes.new('ACA_watermark')
+    watermark = tempMesh.session_uid
+    bpy.data.meshes.remove(tempMesh)
+    return watermark
+
+# 获取水位之后新建的对象
+# 仅在营造中使用的目录（含子目录）中查找，不扫描整个文件
+# collNames：目录名称，见buildCollections
+def getNewObjects(watermark,collNames):
+    newObjects = {}
+    for collName in collNames:
+        coll = bpy.data.collections.get(collName)
+        if coll == None: continue
+        for obj in coll.all_objects:
+            if obj.session_uid > watermark:
+                newObjects[obj.name] = obj
+    return list(newObjects.values())
+
 # 将点投影到平面上
 # param point: 点的坐标，格式为 (x0, y0, z0)
 # param plane_coeffs: 平面的系数，格式为 (A, B, C, D)
@@ -1854,27 +2591,36 @@ def polar_angle_sort(points, reference_point):
 
 
 # 根据距离阈值合并点
-# param points: 点的列表，每个点是一个元组 (x, y, z)
+# param points: 点的列表，每个点是一个元组 (x, y) 或 (x, y, z)
 # param threshold: 合并的距离阈值
-# return: 合并后的点列表
+# return: 合并后的点列表，每组相近的点取平均
+# 250402 改用kdtree查找相近点，避免O(n²)的两两比较
 def merge_points(points, threshold):
+    points = np.asarray(points,dtype=np.float64)
+    count = len(points)
+    if count == 0:
+        return []
+    dim = points.shape[1]
+    co = np.zeros((count,3))
+    co[:,:dim] = points
+    tree = kdtree.KDTree(count)
+    for index in range(count):
+        tree.insert(co[index],index)
+    tree.balance()
+
     merged_points = []
-    for point in points:
-        merged = False
-        for i, merged_point in enumerate(merged_points):
-            # 计算当前点与已合并点的距离
-            distance = np.linalg.norm(np.array(point) - np.array(merged_point))
-            if distance < threshold:
-                # 如果距离小于阈值，则合并
-                merged_points[i] = tuple((np.array(point) + np.array(merged_point)) / 2)
-                merged = True
-                break
-        if not merged:
-            # 如果没有合并，则将当前点加入合并后的点列表
-            merged_points.append(point)
+    isMerged = np.zeros(count,dtype=bool)
+    for index in range(count):
+        if isMerged[index]: continue
+        group = [found[1] for found in tree.find_range(co[index],threshold)
+                 if not isMerged[found[1]]]
+        isMerged[group] = True
+        merged_points.append(tuple(points[group].mean(axis=0)))
     return merged_points
 
 # 将一组实体投影到一个平面，并返回组合的轮廓
+# 250402 改为向量化计算：批量读取顶点，一次矩阵运算完成变换和投影，
+# 用kdtree合并相近点，用二维凸包生成轮廓
 def unionProject(
         name = 'projectObj',
         projectNormal = Vector((0,0,1)),
@@ -1883,46 +2629,46 @@ def unionProject(
         insetThickness = 0,
 ):
     # 定义投影面Ax+By+Cz+D=0
-    A,B,C = projectNormal
-    # 常量为向量与原点做点积
-    D = -projectNormal.dot(projectCenter)
-    plane_coeffs = (A,B,C,D)
+    normal = np.array(projectNormal,dtype=np.float64)
+    center = np.array(projectCenter,dtype=np.float64)
 
-    # 收集实体的坐标点
-    vertices = []
-    
+    # 收集实体的坐标点，转换到世界坐标
+    coList = []
     for obj in objectList:
-        bm = bmesh.new()
-        bm.from_mesh(obj.data)
-        for v in bm.verts:
-            # 复制点，避免bm.free后v失效
-            updateScene()
-            vWorld = obj.matrix_world @ v.co
-            vertices.append(vWorld.copy())
-        bm.free() 
+        if obj.type != 'MESH': continue
+        count = len(obj.data.vertices)
+        if count == 0: continue
+        co = np.empty(count*3,dtype=np.float64)
+        obj.data.vertices.foreach_get('co',co)
+        matrix = np.array(obj.matrix_world)
+        coList.append(co.reshape(-1,3) @ matrix[:3,:3].T + matrix[:3,3])
+    if len(coList) == 0:
+        outputMsg("unionProject Failed: 没有可投影的顶点")
+        return None
+    vertices = np.concatenate(coList)
 
     # 投影到切面
-    vOnPlane = []
-    for v in vertices:
-        vNew = project_point_to_plane(
-            v,plane_coeffs)
-        v2D = ((vNew.x,vNew.y))
-        vOnPlane.append(v2D)
+    distance = (vertices - center) @ normal / normal.dot(normal)
+    vOnPlane = vertices - distance[:,None] * normal
+    v2D = vOnPlane[:,:2]
 
     # 点清理
     vMerged = merge_points(
-        points=vOnPlane,
+        points=v2D,
         threshold=0.001)
+    if len(vMerged) < 3:
+        outputMsg("unionProject Failed: 投影点不足以构成平面")
+        return None
 
-    # 点排序
-    reference_point = (projectCenter.x,projectCenter.y)
-    vSorted = polar_angle_sort(vMerged,reference_point)
+    # 二维凸包，返回按轮廓顺序排列的点序号
+    hullIndex = geometry.convex_hull_2d(vMerged)
 
     # 创建平面
     bm = bmesh.new()
     # 3D坐标转换
     verts3D = []
-    for v in vSorted:
+    for index in hullIndex:
+        v = vMerged[index]
         v3D = bm.verts.new(Vector((v[0],v[1],0)))
         verts3D.append(v3D)
     # 创建面
@@ -1942,12 +2688,12 @@ def unionProject(
     mesh = bpy.data.meshes.new(name)
     bm.to_mesh(mesh)
     bm.free()
+    tracer.addVerts(len(mesh.vertices))
     # 新建Object
     projectObj = bpy.data.objects.new(name, mesh)
     bpy.context.collection.objects.link(projectObj) 
 
-
-    return
+    return projectObj
 
 # 输出异常信息
 def logError(e):
@@ -2179,4 +2925,38 @@ def mirror45(obj:bpy.types.Object,p):
     obj.matrix_world = inverse_rotation_matrix @ obj.matrix_world
 
     # 将对象移回原来相对于 p 点的位置
-    obj.location += Vector(p)
\ No newline at end of file
+    obj.location += Vector(p)
+
+# 导出FBX
+# 导出当前选中的对象，可用于D5渲染器导入
+def exportFBX(filepath:str):
+    bpy.ops.export_scene.fbx(
+        filepath = filepath, 
+        check_existing=True,
+        use_selection = True,
+        mesh_smooth_type = 'FACE',
+        path_mode = 'COPY',
+        embed_textures = True,
+        colors_type='NONE'
+    )
+    return
+
+# 导出GLB
+# 导出当前选中的对象，推荐UE5导入
+# https://docs.blender.org/api/current/bpy.ops.export_scene.html#module-bpy.ops.export_scene
+def exportGLB(filepath:str):
+    bpy.ops.export_scene.gltf(
+        filepath=filepath, 
+        check_existing=True, 
+        use_selection=True,         # only select
+        use_visible=True,           # only visible
+        use_renderable=True,        # only renderable
+        export_apply=True,          # apply modifiers
+        export_animations=False,    # not export ani
+        export_skins=False,         # not export skin
+        export_morph=False,         # not export shapekey 
+        # not sure
+        # export_gn_mesh=False,     # Geometry Nodes Instances (Experimental), Export Geometry nodes instance meshes
+        # export_original_specular=False,  # Export original PBR Specular, Export original glTF PBR Specular, instead of Blender Principled Shader Specular
+    )
+    return